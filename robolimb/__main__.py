@@ -0,0 +1,169 @@
+""" Command-line interface.
+
+Subcommands:
+
+* ``monitor``: live terminal view of the digits status, current, feedback
+  age and frame rate, and of the rotator edge. The state cache, kept up to
+  date by the receive thread, is sampled at a fixed display rate, such that
+  redrawing never queries the bus.
+* ``record``: records all CAN traffic into a session file.
+* ``replay``: replays a trajectory saved with ``Trajectory.save``.
+* ``bench``: runs ``robolimb.bench``.
+
+Run with ``python -m robolimb --help``.
+"""
+
+import argparse
+import sys
+import time
+
+from can.interfaces.pcan import basic
+
+from .robolimb import FINGERS, STATUS, RoboLimbCAN
+from .state import N_DOF
+
+_NAMES = {f: name for name, f in FINGERS.items()}
+
+
+def _connect(args):
+    """Creates and starts a connection from the common arguments."""
+    kwargs = {}
+    if args.simulate:
+        from .simulator import SimulatedBus
+        kwargs['bus_class'] = SimulatedBus
+    hand = RoboLimbCAN(channel=getattr(basic, args.channel), **kwargs)
+    hand.start()
+    return hand
+
+
+def _run_for(duration):
+    """Sleeps for ``duration`` seconds, or until interrupted if ``None``."""
+    try:
+        if duration is None:
+            while True:
+                time.sleep(1.)
+        else:
+            time.sleep(duration)
+    except KeyboardInterrupt:
+        pass
+
+
+def monitor(hand, rate=10., duration=None, out=sys.stdout):
+    """Displays the cached hand state at a fixed rate.
+
+    Parameters
+    ----------
+    hand : RoboLimbCAN
+        Started connection. It is set listening, such that the cache follows
+        the feedback stream.
+    rate : float, optional (default: 10.)
+        Display refresh rate in Hz.
+    duration : float, optional (default: None)
+        Duration in seconds. If not provided, runs until interrupted.
+    out : file, optional (default: sys.stdout)
+        Terminal to draw on.
+    """
+    hand.listen()
+    period = 1. / rate
+    t_start = last = time.monotonic()
+    counts = hand.frame_counts_
+    next_frame = t_start
+    try:
+        while duration is None or last - t_start < duration:
+            next_frame += period
+            time.sleep(max(next_frame - time.monotonic(), 0.))
+            now = time.monotonic()
+            # Cached values only: listening, the properties do not query
+            state = hand.state_
+            new_counts = hand.frame_counts_
+            rates = (new_counts - counts) / (now - last)
+            counts, last = new_counts, now
+
+            lines = ["{:<8} {:<14} {:>9} {:>8} {:>9}".format(
+                'digit', 'status', 'current A', 'age ms', 'frames/s')]
+            for f in range(1, N_DOF + 1):
+                code = state.status[f - 1]
+                lines.append("{:<8} {:<14} {:>9.3f} {:>8.1f} {:>9.1f}".format(
+                    _NAMES[f], STATUS.get(code, 'unknown'),
+                    state.current[f - 1],
+                    (now - state.timestamp[f - 1]) * 1e3, rates[f]))
+            lines.append("rotator edge: {}   total: {:.1f} frames/s   "
+                         "shed: {}".format(state.rotator_edge, rates.sum(),
+                                           hand.shed_frames_))
+            # Cursor home and clear screen, then redraw
+            out.write("\x1b[H\x1b[J" + "\n".join(lines) + "\n")
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m robolimb',
+        description="Robo-limb command-line tools.")
+    parser.add_argument('--simulate', action='store_true',
+                        help="Connect to a simulated hand.")
+    parser.add_argument('--channel', default='PCAN_USBBUS1',
+                        help="PCAN channel name (default: PCAN_USBBUS1).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('monitor', help="Live view of the hand state.")
+    p.add_argument('--rate', type=float, default=10.,
+                   help="Display refresh rate in Hz.")
+    p.add_argument('--duration', type=float,
+                   help="Duration in seconds (default: until Ctrl-C).")
+
+    p = commands.add_parser('record', help="Record CAN traffic.")
+    p.add_argument('path', help="Session file.")
+    p.add_argument('--duration', type=float,
+                   help="Duration in seconds (default: until Ctrl-C).")
+
+    p = commands.add_parser('replay', help="Replay a trajectory.")
+    p.add_argument('path', help="Trajectory file (.npy).")
+    p.add_argument('--speed', type=float, default=1.,
+                   help="Playback speed (0.5-2).")
+    p.add_argument('--velocity-scale', type=float,
+                   help="Velocity factor (default: the speed).")
+
+    p = commands.add_parser('bench', help="Run the benchmarks.",
+                            add_help=False)
+    p.add_argument('args', nargs=argparse.REMAINDER,
+                   help="Arguments of python -m robolimb.bench.")
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        from .bench import main as bench
+        return bench(args.args + extra)
+    if extra:
+        parser.error("unrecognized arguments: " + " ".join(extra))
+
+    hand = _connect(args)
+    try:
+        if args.command == 'monitor':
+            monitor(hand, args.rate, args.duration)
+        elif args.command == 'record':
+            hand.record(args.path)
+            hand.listen()
+            t0 = time.monotonic()
+            _run_for(args.duration)
+            elapsed = time.monotonic() - t0
+            hand.stop_listening()
+            n_frames = hand.stop_recording()
+            print("Recorded {} frames in {:.1f} s.".format(n_frames,
+                                                           elapsed))
+        elif args.command == 'replay':
+            from .teach import Trajectory, replay
+            trajectory = Trajectory.load(args.path)
+            report = replay(hand, trajectory, args.speed,
+                            args.velocity_scale)
+            print("Replayed {} commands, timing error mean {:.3f} ms, "
+                  "max {:.3f} ms.".format(len(report.commands),
+                                          report.mean_error * 1e3,
+                                          report.max_error * 1e3))
+    finally:
+        hand.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
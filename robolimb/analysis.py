@@ -0,0 +1,298 @@
+""" Batch analysis of recorded sessions.
+
+Each session is decoded with the robolimb decoders and reduced to a fixed
+set of metrics: grip durations, per-digit stall times, current peaks and
+command-to-feedback latencies. Sessions are processed in parallel by a
+process pool and the per-session rows are streamed into one table, such
+that memory use does not grow with the number of sessions. CAN logs in
+other formats are first converted into a temporary session file, such that
+every session is read through a memory mapping rather than loaded at once.
+"""
+
+import contextlib
+import csv
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .importers import import_log
+from .protocol import MAX_STATUS, RX, TX
+from .robolimb import ACTIONS
+from .session import MAGIC, SessionReader
+from .state import N_DOF, Status
+
+# Feedback status acknowledging each action
+_REFLECTS = {
+    ACTIONS['close']: (Status.CLOSING, Status.STALLED_CLOSE),
+    ACTIONS['open']: (Status.OPENING, Status.STALLED_OPEN),
+    ACTIONS['stop']: (Status.STOP, Status.STALLED_CLOSE, Status.STALLED_OPEN)
+}
+_STALLED = {ACTIONS['close']: (Status.STALLED_CLOSE,),
+            ACTIONS['open']: (Status.STALLED_OPEN,)}
+
+METRICS = (['session', 'n_frames', 'duration', 'n_commands', 'n_grips',
+            'grip_duration_mean', 'grip_duration_max'] +
+           ['{}_{}'.format(name, d) for d in range(1, N_DOF + 1)
+            for name in ('current_peak', 'stall_time_mean',
+                         'latency_median', 'latency_max')])
+
+
+@contextlib.contextmanager
+def open_session(path):
+    """Opens a session file, or a CAN log converted into a temporary session
+    file.
+
+    Parameters
+    ----------
+    path : str
+        Session file, or a CAN log in one of the formats supported by
+        ``robolimb.importers``.
+
+    Yields
+    ------
+    reader : SessionReader
+        Reader of the session.
+    """
+    with open(path, 'rb') as f:
+        is_session = f.read(len(MAGIC)) == MAGIC
+    if is_session:
+        with SessionReader(path) as reader:
+            yield reader
+        return
+    tmpdir = tempfile.mkdtemp(prefix='.robolimb-')
+    try:
+        session_path = os.path.join(tmpdir, 'session.rls')
+        import_log(path, session_path)
+        with SessionReader(session_path) as reader:
+            yield reader
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def _columns(reader):
+    """Returns the memory-mapped columns used by the metrics and the frame
+    times."""
+    frames = {name: reader.column(name) for name in
+              ('finger', 'status', 'current', 'action', 'direction')}
+    frames['time'] = reader.timestamps()
+    return frames
+
+
+def load_frames(path):
+    """Loads the decoded frames of a session.
+
+    Parameters
+    ----------
+    path : str
+        Session file, or a CAN log in one of the formats supported by
+        ``robolimb.importers``.
+
+    Returns
+    -------
+    frames : dict
+        Arrays ``time``, ``direction``, ``finger``, ``status``, ``current``
+        and ``action``.
+    """
+    with open_session(path) as reader:
+        return {name: np.array(values)
+                for name, values in _columns(reader).items()}
+
+
+def first_response(cmd_time, fb_time, fb_match, next_cmd_time=None):
+    """Returns the delay from each command to the first matching feedback.
+
+    Parameters
+    ----------
+    cmd_time : numpy.ndarray
+        Sorted command times.
+    fb_time : numpy.ndarray
+        Sorted feedback times.
+    fb_match : numpy.ndarray of bool
+        Feedback frames that reflect the commands.
+    next_cmd_time : numpy.ndarray, optional (default: None)
+        Time of the command following each command. Responses arriving after
+        it are discarded.
+
+    Returns
+    -------
+    delay : numpy.ndarray
+        Delay per command in seconds, NaN when there is no response.
+    """
+    t = fb_time[fb_match]
+    i = np.searchsorted(t, cmd_time, side='left')
+    delay = np.full(len(cmd_time), np.nan)
+    ok = i < len(t)
+    delay[ok] = t[i[ok]] - cmd_time[ok]
+    if next_cmd_time is not None:
+        delay[cmd_time + delay > next_cmd_time] = np.nan
+    return delay
+
+
+def _grips(frames, fb):
+    """Returns the durations of grips, i.e. of the periods during which at
+    least one digit is moving, measured from the command starting them."""
+    t = frames['time'][fb]
+    finger = frames['finger'][fb].astype(np.int64)
+    status = frames['status'][fb]
+    if len(t) == 0:
+        return np.empty(0)
+    moving = (status == Status.OPENING) | (status == Status.CLOSING)
+    # Forward-fill the moving flag of each digit over all feedback rows
+    rows = np.arange(len(t))
+    flags = np.zeros((len(t), N_DOF), dtype=bool)
+    for d in range(1, N_DOF + 1):
+        idx = np.where(finger == d, rows, -1)
+        idx = np.maximum.accumulate(idx)
+        valid = idx >= 0
+        flags[valid, d - 1] = moving[idx[valid]]
+    any_moving = flags.any(axis=1).astype(np.int8)
+    edges = np.diff(np.concatenate([[0], any_moving, [0]]))
+    starts = np.where(edges == 1)[0]
+    ends = np.where(edges == -1)[0]
+    ends = ends[ends < len(t)]
+    starts = starts[:len(ends)]
+
+    cmd_t = frames['time'][(frames['direction'] == TX) &
+                           (frames['action'] > 0)]
+    start_t = t[starts]
+    i = np.searchsorted(cmd_t, start_t, side='right') - 1
+    anchor = np.where(i >= 0, cmd_t[np.clip(i, 0, None)], start_t)
+    return t[ends] - anchor
+
+
+def analyze_session(path):
+    """Computes the standard metrics of a session.
+
+    Parameters
+    ----------
+    path : str
+        Session file or CAN log.
+
+    Returns
+    -------
+    metrics : dict
+        One value per name in ``METRICS``, as plain Python numbers.
+        Undefined values are NaN.
+    """
+    with open_session(path) as reader:
+        return _metrics(os.path.basename(path), _columns(reader))
+
+
+def _metrics(session, frames):
+    """Computes the metrics of the frames of a session. See
+    ``analyze_session``."""
+    t = frames['time']
+    # Sessions recorded before query responses were told apart from
+    # feedback hold invalid status codes
+    fb = (frames['direction'] == RX) & (frames['finger'] > 0) & \
+        (frames['status'] >= 0) & (frames['status'] <= MAX_STATUS)
+    cmd = (frames['direction'] == TX) & (frames['finger'] > 0) & \
+        (frames['action'] >= 0)
+
+    row = dict.fromkeys(METRICS, np.nan)
+    row['session'] = session
+    row['n_frames'] = len(t)
+    row['duration'] = float(t[-1] - t[0]) if len(t) else 0.
+    row['n_commands'] = int(cmd.sum())
+
+    grips = _grips(frames, fb)
+    row['n_grips'] = len(grips)
+    if len(grips):
+        row['grip_duration_mean'] = float(grips.mean())
+        row['grip_duration_max'] = float(grips.max())
+
+    for d in range(1, N_DOF + 1):
+        fb_d = fb & (frames['finger'] == d)
+        cmd_d = cmd & (frames['finger'] == d)
+        if fb_d.any():
+            row['current_peak_{}'.format(d)] = \
+                float(np.nanmax(frames['current'][fb_d]))
+        if not cmd_d.any():
+            continue
+        fb_t = t[fb_d]
+        fb_status = frames['status'][fb_d]
+        cmd_t = t[cmd_d]
+        cmd_action = frames['action'][cmd_d]
+        next_t = np.append(cmd_t[1:], np.inf)
+
+        latency, stall = [], []
+        for action, reflects in _REFLECTS.items():
+            sel = cmd_action == action
+            if not sel.any():
+                continue
+            latency.append(first_response(
+                cmd_t[sel], fb_t, np.isin(fb_status, reflects), next_t[sel]))
+            if action in _STALLED:
+                stall.append(first_response(
+                    cmd_t[sel], fb_t, np.isin(fb_status, _STALLED[action]),
+                    next_t[sel]))
+        latency = np.concatenate(latency)
+        if np.isfinite(latency).any():
+            row['latency_median_{}'.format(d)] = float(np.nanmedian(latency))
+            row['latency_max_{}'.format(d)] = float(np.nanmax(latency))
+        stall = np.concatenate(stall) if stall else np.empty(0)
+        if np.isfinite(stall).any():
+            row['stall_time_mean_{}'.format(d)] = float(np.nanmean(stall))
+    return row
+
+
+def iter_batch(paths, processes=None, chunksize=1):
+    """Analyzes sessions in parallel and yields their metrics as they
+    complete.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        Session files or CAN logs.
+    processes : int, optional (default: None)
+        Number of worker processes. If not provided, one per CPU core.
+    chunksize : int, optional (default: 1)
+        Number of sessions sent to a worker at a time.
+
+    Yields
+    ------
+    metrics : dict
+        Metrics of one session, in completion order.
+    """
+    with multiprocessing.Pool(processes) as pool:
+        for row in pool.imap_unordered(analyze_session, paths, chunksize):
+            yield row
+
+
+def run_batch(paths, out, processes=None, chunksize=1):
+    """Analyzes sessions in parallel and writes one row per session to a
+    CSV file.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        Session files or CAN logs.
+    out : str
+        Path of the CSV file.
+    processes : int, optional (default: None)
+        Number of worker processes. If not provided, one per CPU core.
+    chunksize : int, optional (default: 1)
+        Number of sessions sent to a worker at a time.
+
+    Returns
+    -------
+    n_sessions : int
+        Number of analyzed sessions.
+    """
+    n = 0
+    with open(out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=METRICS)
+        writer.writeheader()
+        for row in iter_batch(paths, processes, chunksize):
+            writer.writerow(row)
+            n += 1
+    return n
+
+
+def load_table(path):
+    """Loads a CSV file written by ``run_batch`` as a structured array."""
+    return np.genfromtxt(path, delimiter=',', names=True, dtype=None,
+                         encoding='utf-8')
@@ -0,0 +1,144 @@
+""" Coalescing of feedback frames into complete hand-state cycles.
+
+The hand sends one feedback frame per digit and cycle. Frames can be
+duplicated or reordered, and a consumer that falls behind finds a backlog of
+many cycles in the receive queue. Only the newest frame of each digit
+matters for the current state: the assembler keeps it and sheds the older
+ones, counting them. A cycle is complete once every digit has reported since
+the previous cycle; if some digits stay silent, a partial cycle is emitted
+once the cycle has lasted longer than a timeout, with the last known values
+of the missing digits, such that consumers get a state in bounded time.
+"""
+
+import collections
+import time
+
+import numpy as np
+
+from .state import N_DOF, UNKNOWN
+
+Cycle = collections.namedtuple('Cycle', ['status', 'current', 'rotator_edge',
+                                         'timestamp', 'complete', 'missing'])
+Cycle.__doc__ = """Snapshot of the hand state.
+
+status : numpy.ndarray
+    Status code per digit, ``UNKNOWN`` (-1) for digits without feedback.
+current : numpy.ndarray
+    Motor current per digit in Amps.
+rotator_edge : bool or None
+    ``True`` when the thumb rotator is fully palmar or lateral.
+timestamp : numpy.ndarray
+    Time of the feedback per digit in seconds of ``time.monotonic()``.
+complete : bool
+    ``True`` if every digit reported during the cycle.
+missing : tuple of int
+    Finger IDs of the digits that did not report.
+"""
+
+
+class FeedbackAssembler(object):
+    """ Keeps the newest feedback per digit and assembles cycles.
+
+    Parameters
+    ----------
+    timeout : float, optional (default: 0.05)
+        Time in seconds after the start of a cycle, i.e. the previous cycle
+        or ``reset()``, after which a partial cycle is emitted.
+
+    Attributes
+    ----------
+    shed_ : int
+        Number of frames discarded because a newer frame of the same digit
+        was available, or because they were older than the stored one.
+    cycles_ : int
+        Number of complete cycles emitted.
+    partial_ : int
+        Number of partial cycles emitted.
+    """
+
+    def __init__(self, timeout=0.05):
+        self.timeout = timeout
+        self.__status = np.full(N_DOF, UNKNOWN, dtype=np.int8)
+        self.__current = np.full(N_DOF, np.nan)
+        self.__timestamp = np.full(N_DOF, np.nan)
+        self.__edge = None
+        self.reset()
+        self.shed_ = 0
+        self.cycles_ = 0
+        self.partial_ = 0
+
+    def reset(self, now=None):
+        """Starts a new cycle, e.g. after the receive queue has been
+        reset. Stored values are kept."""
+        self.__fresh = np.zeros(N_DOF, dtype=bool)
+        self.__start = time.monotonic() if now is None else now
+
+    @property
+    def complete(self):
+        """``True`` if every digit reported during the current cycle."""
+        return bool(self.__fresh.all())
+
+    def add(self, finger, status, current, edge, timestamp):
+        """Adds feedback frames in order of arrival.
+
+        Parameters
+        ----------
+        finger, status, current, edge, timestamp : numpy.ndarray
+            Decoded feedback frames, see ``robolimb.protocol.decode``.
+
+        Returns
+        -------
+        rows : numpy.ndarray
+            Indices of the frames that were kept, at most one per digit.
+        """
+        n = len(finger)
+        if not n:
+            return np.zeros(0, dtype=np.intp)
+        # Latest frame of each digit in the batch
+        digits, first = np.unique(finger[::-1], return_index=True)
+        rows = n - 1 - first
+        i = digits.astype(np.intp) - 1
+        # Reordered frames older than the stored ones are dropped; NaN
+        # (no feedback yet) fails the comparison
+        newer = ~(timestamp[rows] < self.__timestamp[i])
+        rows, i = rows[newer], i[newer]
+        self.shed_ += n - len(rows) + int(self.__fresh[i].sum())
+
+        self.__status[i] = status[rows]
+        self.__current[i] = current[rows]
+        self.__timestamp[i] = timestamp[rows]
+        rotator = i == N_DOF - 1
+        if rotator.any():
+            self.__edge = bool(edge[rows[rotator][0]])
+        self.__fresh[i] = True
+        return np.sort(rows)
+
+    def cycle(self, now=None):
+        """Returns the assembled cycle, if complete or timed out.
+
+        Parameters
+        ----------
+        now : float, optional (default: None)
+            Current time. If not provided, ``time.monotonic()`` is used.
+
+        Returns
+        -------
+        cycle : Cycle or None
+            Assembled cycle, ``None`` if the cycle is neither complete nor
+            timed out. A new cycle is started after each returned one.
+        """
+        if now is None:
+            now = time.monotonic()
+        complete = bool(self.__fresh.all())
+        if not complete and now - self.__start < self.timeout:
+            return None
+        missing = tuple(int(f) + 1 for f in np.flatnonzero(~self.__fresh))
+        cycle = Cycle(self.__status.copy(), self.__current.copy(),
+                      self.__edge, self.__timestamp.copy(), complete,
+                      missing)
+        if complete:
+            self.cycles_ += 1
+        else:
+            self.partial_ += 1
+        self.reset(now)
+        return cycle
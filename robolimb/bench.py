@@ -0,0 +1,298 @@
+""" Benchmarks of the command scheduler and of the receive path.
+
+Scheduler jitter: commands are scheduled at a fixed period and the lateness
+of each write, relative to its due time, is measured while the process is
+loaded with garbage-collection pressure and, optionally, CPU-bound processes.
+The benchmark is run once with the default scheduling and once with a
+``RealtimePolicy``, which shows the effect of the policy on the machine at
+hand. No hand is required; frames are written to a null bus.
+
+Receive allocations: a queue of feedback frames is read once frame by frame
+with ``poll_feedback`` and once in bulk with ``drain``, and the memory
+allocated per frame is measured. Frames are served from memory by a bus
+with the copying behavior of ``PCANBasic``.
+
+Run with ``python -m robolimb.bench --help``.
+"""
+
+import argparse
+import contextlib
+import ctypes
+import gc
+import multiprocessing
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+from can.interfaces.pcan.basic import (PCAN_ERROR_OK, PCAN_ERROR_QRCVEMPTY,
+                                       TPCANMsg, TPCANTimestamp)
+
+from .drain import FRAME_DTYPE, frame_buffer
+from .protocol import FEEDBACK_BASE_ID
+from .realtime import RealtimePolicy
+from .robolimb import RoboLimbCAN
+from .scheduler import CommandScheduler
+from .state import N_DOF, Status
+
+
+def _spin(stop):
+    """CPU load process."""
+    while not stop.is_set():
+        pass
+
+
+def _churn(stop):
+    """Allocates short-lived reference cycles to trigger collections."""
+    while not stop.is_set():
+        for _ in range(1000):
+            a = []
+            a.append(a)
+        time.sleep(0.0005)
+
+
+def scheduler_jitter(policy=None, n=500, period=0.005, heap=300000,
+                     cpu_load=0):
+    """Measures the lateness of periodic commands.
+
+    Parameters
+    ----------
+    policy : RealtimePolicy, optional (default: None)
+        Policy applied to the scheduler thread. Garbage collection is frozen
+        before and disabled during the measurement when the policy says so.
+    n : int, optional (default: 500)
+        Number of commands.
+    period : float, optional (default: 0.005)
+        Command period in seconds.
+    heap : int, optional (default: 300000)
+        Number of long-lived objects kept alive, which makes full garbage
+        collections expensive.
+    cpu_load : int, optional (default: 0)
+        Number of CPU-bound processes running during the measurement.
+
+    Returns
+    -------
+    stats : dict
+        Mean, median, 99th percentile and maximum lateness in
+        milliseconds.
+    """
+    live = [{'i': i} for i in range(heap)]
+    stop = multiprocessing.Event()
+    loads = [multiprocessing.Process(target=_spin, args=(stop,), daemon=True)
+             for _ in range(cpu_load)]
+    loads.append(threading.Thread(target=_churn, args=(stop,), daemon=True))
+    for load in loads:
+        load.start()
+
+    scheduler = CommandScheduler(lambda can_msg: None,
+                                 None if policy is None else policy.apply)
+    scheduler.start()
+    if policy is not None:
+        policy.freeze()
+    try:
+        critical = contextlib.nullcontext() if policy is None \
+            else policy.critical()
+        with critical:
+            t0 = time.monotonic() + 0.05
+            cmds = [scheduler.submit(None, delay=t0 + k * period -
+                                     time.monotonic()) for k in range(n)]
+            for cmd in cmds:
+                cmd.wait()
+    finally:
+        scheduler.stop()
+        stop.set()
+        for load in loads:
+            load.join()
+        if policy is not None and hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+    del live
+
+    lateness = np.array([cmd.sent - cmd.due for cmd in cmds]) * 1e3
+    return {'mean': lateness.mean(),
+            'median': np.median(lateness),
+            'p99': np.percentile(lateness, 99),
+            'max': lateness.max()}
+
+
+def compare(policy, **kwargs):
+    """Runs the benchmark without and with a policy.
+
+    Parameters
+    ----------
+    policy : RealtimePolicy
+        Policy to evaluate.
+    kwargs : dict
+        Additional arguments passed to ``scheduler_jitter``.
+
+    Returns
+    -------
+    results : dict
+        Statistics for ``'default'`` and ``'realtime'``.
+    """
+    return {'default': scheduler_jitter(None, **kwargs),
+            'realtime': scheduler_jitter(policy, **kwargs)}
+
+
+class _MemoryBus(object):
+    """Bus serving preloaded raw frames. ``Read`` allocates new structures
+    like ``PCANBasic.Read``; ``read_into`` copies into the given ones."""
+
+    def __init__(self):
+        self.frames = frame_buffer(0)
+        self.position = 0
+
+    def load(self, frames):
+        self.frames = frames
+        self.position = 0
+
+    def Initialize(self, **kwargs):
+        return PCAN_ERROR_OK
+
+    def Uninitialize(self, Channel):
+        return PCAN_ERROR_OK
+
+    def Reset(self, Channel):
+        return PCAN_ERROR_OK
+
+    def Write(self, Channel, MessageBuffer):
+        return PCAN_ERROR_OK
+
+    def Read(self, Channel):
+        msg, ts = TPCANMsg(), TPCANTimestamp()
+        return self.read_into(Channel, msg, ts), msg, ts
+
+    def read_into(self, Channel, msg, timestamp):
+        if self.position == len(self.frames):
+            return PCAN_ERROR_QRCVEMPTY
+        src = self.frames.ctypes.data + self.position * FRAME_DTYPE.itemsize
+        ctypes.memmove(ctypes.addressof(msg), src, ctypes.sizeof(msg))
+        ctypes.memmove(ctypes.addressof(timestamp),
+                       src + FRAME_DTYPE.fields['timestamp'][1],
+                       ctypes.sizeof(timestamp))
+        self.position += 1
+        return PCAN_ERROR_OK
+
+
+def _feedback_frames(n):
+    """Returns ``n`` feedback frames cycling over the digits, 1 ms apart."""
+    frames = frame_buffer(n)
+    k = np.arange(n)
+    frames['msg']['ID'] = FEEDBACK_BASE_ID + 1 + k % N_DOF
+    frames['msg']['LEN'] = 4
+    frames['msg']['DATA'][:, 1] = Status.OPENING
+    frames['msg']['DATA'][:, 3] = k % 64
+    micros = k * 1000
+    frames['timestamp']['millis'] = micros // 1000
+    return frames
+
+
+def drain_allocations(n_frames=20000, batch=1024):
+    """Measures the memory allocated per received frame.
+
+    Parameters
+    ----------
+    n_frames : int, optional (default: 20000)
+        Number of queued feedback frames.
+    batch : int, optional (default: 1024)
+        Size of the buffer passed to ``drain``.
+
+    Returns
+    -------
+    stats : dict
+        For ``'poll_feedback'`` and ``'drain'``: peak traced bytes per frame
+        (``peak``), bytes still allocated per frame after the reads
+        (``retained``), objects tracked by the garbage collector per frame
+        (``objects``), generation-0 collections triggered (``collections``)
+        and read time per frame in microseconds (``time``).
+    """
+    bus = _MemoryBus()
+    hand = RoboLimbCAN(profile=None, bus_class=lambda: bus)
+    hand.start()
+    frames = _feedback_frames(n_frames)
+    buf = frame_buffer(batch)
+    readers = {'poll_feedback': hand.poll_feedback,
+               'drain': lambda: hand.drain(buf)}
+    results = {}
+    try:
+        for name, read in readers.items():
+            # Warm-up, such that caches and lazy imports are not counted
+            bus.load(frames[:2 * batch])
+            while len(read()):
+                pass
+
+            bus.load(frames)
+            t0 = time.perf_counter()
+            while len(read()):
+                pass
+            elapsed = time.perf_counter() - t0
+
+            bus.load(frames)
+            gc.collect()
+            collections = gc.get_stats()[0]['collections']
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            objects = len(gc.get_objects())
+            start, _ = tracemalloc.get_traced_memory()
+            out = []
+            while True:
+                # Results are kept until the end, as a consumer would
+                out.append(read())
+                if not len(out[-1]):
+                    break
+            current, peak = tracemalloc.get_traced_memory()
+            objects = len(gc.get_objects()) - objects
+            tracemalloc.stop()
+            collections = gc.get_stats()[0]['collections'] - collections
+            del out
+            results[name] = {'peak': (peak - start) / n_frames,
+                             'retained': (current - start) / n_frames,
+                             'objects': objects / n_frames,
+                             'collections': collections,
+                             'time': elapsed / n_frames * 1e6}
+    finally:
+        hand.stop()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m robolimb.bench',
+        description="Scheduler jitter with and without a real-time policy, "
+                    "or receive-path allocations.")
+    parser.add_argument('--cpus', type=int, nargs='+',
+                        help="CPU cores the scheduler thread is pinned to.")
+    parser.add_argument('--priority', type=int,
+                        help="SCHED_FIFO priority (1-99).")
+    parser.add_argument('-n', type=int, default=500,
+                        help="Number of commands.")
+    parser.add_argument('--period', type=float, default=0.005,
+                        help="Command period in seconds.")
+    parser.add_argument('--cpu-load', type=int, default=0,
+                        help="Number of CPU-bound load processes.")
+    parser.add_argument('--allocations', action='store_true',
+                        help="Measure receive-path allocations instead.")
+    args = parser.parse_args(argv)
+
+    if args.allocations:
+        results = drain_allocations()
+        print("Per frame      {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            'peak B', 'kept B', 'objects', 'gc runs', 'time us'))
+        for name, stats in results.items():
+            print("{:<14} {peak:8.1f} {retained:8.1f} {objects:8.2f} "
+                  "{collections:8d} {time:8.2f}".format(name, **stats))
+        return
+
+    policy = RealtimePolicy(cpus=args.cpus, priority=args.priority)
+    results = compare(policy, n=args.n, period=args.period,
+                      cpu_load=args.cpu_load)
+    print("Lateness (ms)  {:>8} {:>8} {:>8} {:>8}".format(
+        'mean', 'median', 'p99', 'max'))
+    for name, stats in results.items():
+        print("{:<14} {mean:8.3f} {median:8.3f} {p99:8.3f} {max:8.3f}".format(
+            name, **stats))
+    for setting, reason in policy.errors_.items():
+        print("Not applied: {} ({})".format(setting, reason))
+
+
+if __name__ == '__main__':
+    main()
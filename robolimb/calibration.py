@@ -0,0 +1,146 @@
+""" Automated calibration of digit travel times.
+
+Each digit is swept over a grid of velocities. For every velocity, the digit
+is closed and opened again, and the time until feedback reports it stalled is
+measured. A travel-time model ``t = a + b / velocity`` is then fitted per
+digit and direction, and stored as the profile of the device.
+"""
+
+import time
+
+import numpy as np
+
+from .profile import DeviceProfile
+from .robolimb import ACTIONS, N_DOF
+from .state import Status
+
+VELOCITIES = (50, 100, 150, 200, 250, 297)
+
+_STALLED = {ACTIONS['close']: Status.STALLED_CLOSE,
+            ACTIONS['open']: Status.STALLED_OPEN}
+
+
+def time_to_stall(hand, finger, action, velocity, timeout=5., poll=0.01):
+    """Moves a digit and measures the time until it is reported stalled.
+
+    Parameters
+    ----------
+    hand : RoboLimbCAN
+        Hand connection.
+    finger : int
+        Finger ID.
+    action : int
+        Action code (1: close, 2: open).
+    velocity : int
+        Velocity. Allowed range is (10,297).
+    timeout : float, optional (default: 5.)
+        Maximum time to wait in seconds.
+    poll : float, optional (default: 0.01)
+        Polling period of the feedback in seconds, which bounds the
+        resolution of the measurement.
+
+    Returns
+    -------
+    duration : float
+        Time in seconds from the command to the first feedback reporting the
+        digit stalled, NaN on timeout.
+    """
+    command = hand.close_finger if action == ACTIONS['close'] \
+        else hand.open_finger
+    target = _STALLED[action]
+    t0 = time.monotonic()
+    command(finger, velocity)
+    while time.monotonic() - t0 < timeout:
+        time.sleep(poll)
+        state = hand.get_state(max_age=poll)
+        if state.status[finger - 1] == target:
+            return state.timestamp[finger - 1] - t0
+    return float('nan')
+
+
+def fit_travel_time(velocities, durations):
+    """Fits ``t = a + b / velocity`` by least squares.
+
+    Parameters
+    ----------
+    velocities : array-like
+        Velocities.
+    durations : array-like
+        Measured travel times in seconds. NaN values are ignored.
+
+    Returns
+    -------
+    a, b : float
+        Model coefficients.
+    """
+    v = np.asarray(velocities, dtype=float)
+    t = np.asarray(durations, dtype=float)
+    valid = np.isfinite(t)
+    if valid.sum() < 2:
+        raise ValueError("At least two valid measurements are required.")
+    X = np.column_stack([np.ones(valid.sum()), 1. / v[valid]])
+    (a, b), _, _, _ = np.linalg.lstsq(X, t[valid], rcond=None)
+    return float(a), float(b)
+
+
+def calibrate(hand, velocities=VELOCITIES, fingers=None, timeout=5.,
+              poll=0.01, save=True, directory=None):
+    """Calibrates the travel times of a device.
+
+    The hand is opened first. Fingers are calibrated with the rotator left
+    where it is, and the rotator is calibrated with all fingers open.
+
+    Parameters
+    ----------
+    hand : RoboLimbCAN
+        Started hand connection.
+    velocities : sequence of int, optional (default: VELOCITIES)
+        Velocity grid.
+    fingers : sequence of int, optional (default: None)
+        Finger IDs to calibrate. If not provided, all digits are calibrated.
+    timeout : float, optional (default: 5.)
+        Maximum travel time in seconds.
+    poll : float, optional (default: 0.01)
+        Polling period of the feedback in seconds.
+    save : boolean, optional (default: True)
+        If ``True``, the profile becomes the profile of ``hand`` and is saved
+        under the device serial number. It is not saved if the serial number
+        query times out.
+    directory : str, optional (default: None)
+        Profile directory. If not provided, ``PROFILE_DIR`` is used.
+
+    Returns
+    -------
+    profile : DeviceProfile
+        Fitted profile. Digits and directions with less than two valid
+        measurements keep the default model.
+    durations : numpy.ndarray
+        Measured travel times with shape ``(len(fingers), 2,
+        len(velocities))``, for closing and opening respectively.
+    """
+    fingers = list(range(1, N_DOF + 1)) if fingers is None else list(fingers)
+    actions = (ACTIONS['close'], ACTIONS['open'])
+    durations = np.full((len(fingers), len(actions), len(velocities)),
+                        np.nan)
+
+    hand.open_all()
+    time.sleep(timeout)
+    for i, f in enumerate(fingers):
+        for k, v in enumerate(velocities):
+            for j, action in enumerate(actions):
+                durations[i, j, k] = time_to_stall(hand, f, action, v,
+                                                   timeout, poll)
+
+    # A failed digit or query must not discard the measurements of the sweep
+    coefficients = {}
+    for i, f in enumerate(fingers):
+        for j, action in enumerate(actions):
+            if np.isfinite(durations[i, j]).sum() >= 2:
+                coefficients[(f, action)] = fit_travel_time(velocities,
+                                                            durations[i, j])
+    profile = DeviceProfile(hand.get_serial_number(timeout=1.), coefficients)
+    if save:
+        hand.profile_ = profile
+        if profile.serial is not None:
+            profile.save(directory)
+    return profile, durations
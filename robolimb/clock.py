@@ -0,0 +1,152 @@
+""" Conversion of PCAN hardware timestamps to the host clock.
+
+The adapter stamps every received frame with its own microsecond clock. A
+frame can only be read by the host after it has been stamped, so the smallest
+observed difference between host read time and hardware time is the best
+estimate of the clock offset. Minima are collected over consecutive windows
+and a straight line is fitted through them, which corrects for the drift
+between the two oscillators.
+"""
+
+import collections
+import time
+
+import numpy as np
+
+
+def hw_seconds(timestamp):
+    """Returns a PCAN timestamp in seconds.
+
+    Parameters
+    ----------
+    timestamp : pcan definition
+        ``TPCANTimestamp`` structure.
+
+    Returns
+    -------
+    seconds : float
+        Hardware time in seconds.
+    """
+    micros = (timestamp.micros + 1000 * timestamp.millis +
+              0x100000000 * 1000 * timestamp.millis_overflow)
+    return micros * 1e-6
+
+
+class HardwareClock(object):
+    """ Maps hardware timestamps to ``time.monotonic()``.
+
+    Parameters
+    ----------
+    window : float, optional (default: 1.)
+        Duration in seconds of hardware time over which the minimum offset
+        is taken.
+    n_windows : int, optional (default: 30)
+        Number of window minima used for the drift fit.
+
+    Attributes
+    ----------
+    offset_ : float or None
+        Current estimate of host minus hardware time (in seconds).
+    drift_ : float
+        Current estimate of the relative drift between the clocks.
+    """
+
+    def __init__(self, window=1., n_windows=30):
+        self.window = window
+        self.n_windows = n_windows
+        self.reset()
+
+    def reset(self):
+        """Discards all observations, e.g. after the adapter has been
+        re-initialized."""
+        self.__minima = collections.deque(maxlen=self.n_windows)
+        self.__window_start = None
+        self.__window_min = None
+        self.__last_hw = None
+        self.__ref = 0.
+        self.offset_ = None
+        self.drift_ = 0.
+
+    def convert(self, hw_time, host_time=None):
+        """Adds an observation and returns the hardware time on the host
+        clock.
+
+        Parameters
+        ----------
+        hw_time : float
+            Hardware timestamp (in seconds).
+        host_time : float, optional (default: None)
+            Host time at which the frame was read. If not provided, the
+            current ``time.monotonic()`` is used.
+
+        Returns
+        -------
+        time : float
+            Time of the frame in seconds of ``time.monotonic()``.
+        """
+        if host_time is None:
+            host_time = time.monotonic()
+        if self.__last_hw is not None and hw_time < self.__last_hw:
+            # Hardware clock restarted
+            self.reset()
+        self.__last_hw = hw_time
+        self.__observe(hw_time, host_time - hw_time)
+        estimate = hw_time + self.offset_ + self.drift_ * (hw_time -
+                                                           self.__ref)
+        return min(estimate, host_time)
+
+    def convert_array(self, hw_times, host_time=None):
+        """Converts the hardware timestamps of frames read in one batch.
+
+        Only the last frame is observed: all frames were read at about the
+        same host time, so the latest one bounds the offset most tightly.
+
+        Parameters
+        ----------
+        hw_times : numpy.ndarray
+            Hardware timestamps (in seconds) in order of arrival.
+        host_time : float, optional (default: None)
+            Host time at which the batch was read. If not provided, the
+            current ``time.monotonic()`` is used.
+
+        Returns
+        -------
+        times : numpy.ndarray
+            Times of the frames in seconds of ``time.monotonic()``.
+        """
+        if host_time is None:
+            host_time = time.monotonic()
+        if not len(hw_times):
+            return np.empty(0)
+        if self.__last_hw is not None and hw_times[0] < self.__last_hw:
+            self.reset()
+        self.__last_hw = float(hw_times[-1])
+        self.__observe(self.__last_hw, host_time - self.__last_hw)
+        estimate = hw_times + self.offset_ + self.drift_ * (hw_times -
+                                                            self.__ref)
+        return np.minimum(estimate, host_time)
+
+    def __observe(self, hw_time, offset):
+        """Updates the window minima and the fitted offset and drift."""
+        if self.__window_start is None:
+            self.__window_start = hw_time
+        elif hw_time - self.__window_start >= self.window:
+            self.__minima.append(self.__window_min)
+            self.__window_start = hw_time
+            self.__window_min = None
+        if self.__window_min is not None and offset >= self.__window_min[1]:
+            return
+        self.__window_min = (hw_time, offset)
+
+        points = list(self.__minima) + [self.__window_min]
+        n = len(points)
+        mean_t = sum(p[0] for p in points) / n
+        mean_o = sum(p[1] for p in points) / n
+        var = sum((p[0] - mean_t) ** 2 for p in points)
+        if n > 1 and var > 0:
+            self.drift_ = sum((p[0] - mean_t) * (p[1] - mean_o)
+                              for p in points) / var
+        else:
+            self.drift_ = 0.
+        self.__ref = mean_t
+        self.offset_ = mean_o
@@ -0,0 +1,58 @@
+""" Detection of and recovery from adapter and bus failures.
+
+PCAN functions report the state of the channel in their return status. Bus
+off, hardware and network handle errors (e.g. the adapter was unplugged) and
+initialization errors cannot be recovered from without re-initializing the
+channel; all other codes, such as empty or overrun queues and bus warnings,
+leave the channel usable.
+
+``RoboLimbCAN`` checks the status of its reads and writes, and, when
+supervised, polls the channel status. After a failure, the channel is
+re-initialized with exponential backoff, message filters and the quick grip
+are restored and the state cache is rebuilt from the first complete feedback
+cycle. Each outage is reported with its measured downtime.
+"""
+
+import collections
+
+from can.interfaces.pcan.basic import (
+    PCAN_ERROR_BUSOFF, PCAN_ERROR_ILLCLIENT, PCAN_ERROR_ILLHANDLE,
+    PCAN_ERROR_ILLHW, PCAN_ERROR_ILLNET, PCAN_ERROR_INITIALIZE,
+    PCAN_ERROR_NODRIVER)
+
+# Status bits that each mean a failure on their own
+_FAILURE_BITS = PCAN_ERROR_BUSOFF | PCAN_ERROR_INITIALIZE | PCAN_ERROR_NODRIVER
+# Handle errors are encoded in a 3-bit field rather than as separate flags
+_HANDLE_FAILURES = (PCAN_ERROR_ILLHW, PCAN_ERROR_ILLNET, PCAN_ERROR_ILLCLIENT)
+
+Outage = collections.namedtuple('Outage', ['status', 'detected', 'restored',
+                                           'downtime', 'attempts'])
+Outage.__doc__ = """Connection failure and recovery.
+
+status : int
+    PCAN status code that revealed the failure.
+detected : float
+    Time of the detection, in seconds of ``time.monotonic()``.
+restored : float
+    Time at which the state cache was resynchronized, in seconds of
+    ``time.monotonic()``.
+downtime : float
+    Time in seconds from detection to resynchronization.
+attempts : int
+    Number of initialization attempts.
+"""
+
+
+def is_failure(status):
+    """Returns ``True`` if a PCAN status code requires re-initializing the
+    channel."""
+    return bool(status & _FAILURE_BITS) or \
+        (status & PCAN_ERROR_ILLHANDLE) in _HANDLE_FAILURES
+
+
+def backoff(initial, maximum):
+    """Yields exponentially increasing delays, capped at ``maximum``."""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(2 * delay, maximum)
@@ -0,0 +1,132 @@
+""" Bulk reads of the receive queue without per-frame allocation.
+
+``PCANBasic.Read`` allocates a new message and timestamp structure on every
+call, and the frames then typically end up in lists of tuples. Under
+sustained feedback, this churn dominates the CPU time of the receive path
+and triggers garbage collections.
+
+``BulkReader`` instead reads every frame into one preallocated message and
+timestamp structure, passed by reference to the driver, and copies the raw
+bytes into consecutive rows of a caller-provided NumPy buffer. Frames are
+then decoded in bulk with ``robolimb.protocol``.
+"""
+
+import ctypes
+
+import numpy as np
+from can.interfaces.pcan.basic import PCAN_ERROR_OK, TPCANMsg, TPCANTimestamp
+
+FRAME_DTYPE = np.dtype([
+    ('msg', np.dtype(TPCANMsg)),
+    ('timestamp', np.dtype(TPCANTimestamp)),
+    ('time', np.float64)
+])
+
+_MSG_SIZE = ctypes.sizeof(TPCANMsg)
+_TS_OFFSET = FRAME_DTYPE.fields['timestamp'][1]
+_TS_SIZE = ctypes.sizeof(TPCANTimestamp)
+
+
+def frame_buffer(size):
+    """Returns a zeroed buffer of ``size`` raw frames."""
+    return np.zeros(size, dtype=FRAME_DTYPE)
+
+
+def frame_hw_seconds(frames):
+    """Returns the hardware timestamps of raw frames in seconds."""
+    ts = frames['timestamp']
+    micros = (ts['micros'].astype(np.float64) +
+              1000. * ts['millis'].astype(np.float64) +
+              0x100000000 * 1000. * ts['millis_overflow'].astype(np.float64))
+    return micros * 1e-6
+
+
+class BulkReader(object):
+    """ Drains the receive queue of a channel into NumPy buffers.
+
+    The driver is called directly with references to preallocated
+    structures. Bus objects other than ``PCANBasic`` may implement
+    ``read_into(Channel, msg, timestamp)``, which fills the given structures
+    and returns the status; otherwise ``Read`` is used, which allocates.
+
+    Parameters
+    ----------
+    bus : PCANBasic
+        Initialized bus.
+    channel : pcan definition
+        CAN channel.
+
+    Attributes
+    ----------
+    status_ : int
+        Status of the last read, ``PCAN_ERROR_QRCVEMPTY`` once the queue has
+        been drained.
+    """
+
+    def __init__(self, bus, channel):
+        self.bus = bus
+        self.channel = channel
+        self.status_ = PCAN_ERROR_OK
+        self.__msg = TPCANMsg()
+        self.__ts = TPCANTimestamp()
+        self.__msg_addr = ctypes.addressof(self.__msg)
+        self.__ts_addr = ctypes.addressof(self.__ts)
+        dll = getattr(bus, '_PCANBasic__m_dllBasic', None)
+        if dll is not None:
+            read = dll.CAN_Read
+            msg_ref = ctypes.byref(self.__msg)
+            ts_ref = ctypes.byref(self.__ts)
+            self.__read = lambda: read(channel, msg_ref, ts_ref)
+        elif hasattr(bus, 'read_into'):
+            read_into = bus.read_into
+            msg, ts = self.__msg, self.__ts
+            self.__read = lambda: read_into(channel, msg, ts)
+        else:
+            self.__read = self.__read_copy
+
+    def read(self, out, start=0):
+        """Reads queued frames into a buffer until the queue is empty or the
+        buffer is full.
+
+        Parameters
+        ----------
+        out : numpy.ndarray
+            Contiguous buffer of ``FRAME_DTYPE``.
+        start : int, optional (default: 0)
+            First row to fill.
+
+        Returns
+        -------
+        n_frames : int
+            Number of frames read into ``out[start:start + n_frames]``. The
+            ``time`` field is left to the caller.
+        """
+        if out.dtype != FRAME_DTYPE or not out.flags.c_contiguous:
+            raise ValueError("A contiguous buffer of FRAME_DTYPE is "
+                             "required.")
+        read = self.__read
+        memmove = ctypes.memmove
+        msg_addr, ts_addr = self.__msg_addr, self.__ts_addr
+        stride = FRAME_DTYPE.itemsize
+        dst = out.ctypes.data + start * stride
+        end = out.ctypes.data + len(out) * stride
+        n = 0
+        status = PCAN_ERROR_OK
+        while dst < end:
+            status = read()
+            if status != PCAN_ERROR_OK:
+                break
+            memmove(dst, msg_addr, _MSG_SIZE)
+            memmove(dst + _TS_OFFSET, ts_addr, _TS_SIZE)
+            dst += stride
+            n += 1
+        self.status_ = status
+        return n
+
+    def __read_copy(self):
+        """Reads with ``Read`` and copies into the preallocated structures."""
+        status, msg, ts = self.bus.Read(self.channel)
+        if status == PCAN_ERROR_OK:
+            ctypes.memmove(self.__msg_addr, ctypes.addressof(msg), _MSG_SIZE)
+            ctypes.memmove(self.__ts_addr, ctypes.addressof(ts), _TS_SIZE)
+        return status
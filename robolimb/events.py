@@ -0,0 +1,267 @@
+""" State-change events dispatched from the receive path.
+
+Every processed feedback frame is compared with the previous state of its
+digit, and events are generated only on change: status transitions, thumb
+rotator edge changes, current threshold crossings and quick grip changes.
+Losses and restorations of the connection are dispatched as well.
+
+Events are handed over to each subscriber through a bounded queue, which is
+a constant-time, non-blocking operation for the receive path. When a
+subscriber falls behind, its oldest events are dropped and counted, so that
+a slow subscriber can never stall frame processing. Callbacks run on one
+thread per subscriber.
+"""
+
+import collections
+import threading
+import traceback
+
+from .state import N_DOF, UNKNOWN, Status
+
+STATUS = 'status'
+EDGE = 'edge'
+CURRENT = 'current'
+QUICK_GRIP = 'quick_grip'
+LINK = 'link'
+KINDS = (STATUS, EDGE, CURRENT, QUICK_GRIP, LINK)
+
+Event = collections.namedtuple('Event', ['kind', 'finger', 'old', 'new',
+                                         'timestamp'])
+Event.__doc__ = """State-change event.
+
+kind : str
+    One of ``'status'``, ``'edge'``, ``'current'``, ``'quick_grip'`` or
+    ``'link'``.
+finger : int or None
+    Finger ID, ``None`` for quick grip and link changes.
+old, new : object
+    Previous and new value: ``Status`` codes, rotator edge flags, currents
+    (in Amps), quick grip names or connection flags. ``old`` is ``None``
+    when unknown.
+timestamp : float
+    Time of the frame that caused the event, in seconds of
+    ``time.monotonic()``.
+"""
+
+
+class Subscription(object):
+    """ Bounded event queue of one subscriber.
+
+    Parameters
+    ----------
+    callback : callable, optional (default: None)
+        Function called with each ``Event`` on a dedicated thread. If not
+        provided, events are retrieved with ``get``.
+    kinds : sequence of str, optional (default: None)
+        Event kinds of interest. If not provided, all kinds are delivered
+        (current crossings only when ``threshold`` is set).
+    fingers : sequence of int, optional (default: None)
+        Finger IDs of interest. If not provided, all digits.
+    threshold : float, optional (default: None)
+        Current (in Amps) whose crossings, in either direction, generate
+        ``'current'`` events.
+    maxsize : int, optional (default: 256)
+        Queue capacity. When full, the oldest event is dropped.
+
+    Attributes
+    ----------
+    dropped : int
+        Number of events dropped because the subscriber fell behind.
+    """
+
+    def __init__(self, callback=None, kinds=None, fingers=None,
+                 threshold=None, maxsize=256):
+        self.callback = callback
+        self.kinds = frozenset(KINDS if kinds is None else kinds)
+        self.fingers = frozenset(range(1, N_DOF + 1) if fingers is None
+                                 else fingers)
+        self.threshold = threshold
+        self.dropped = 0
+        self.__queue = collections.deque(maxlen=maxsize)
+        self.__cond = threading.Condition()
+        self.__closed = False
+        self.__above = [None] * N_DOF
+        self.__thread = None
+        if callback is not None:
+            self.__thread = threading.Thread(target=self.__run,
+                                             name='robolimb-events',
+                                             daemon=True)
+            self.__thread.start()
+
+    def __len__(self):
+        """Number of queued events."""
+        return len(self.__queue)
+
+    def get(self, timeout=None):
+        """Returns the next event.
+
+        Parameters
+        ----------
+        timeout : float, optional (default: None)
+            Maximum time to wait in seconds. If not provided, waits
+            indefinitely.
+
+        Returns
+        -------
+        event : Event or None
+            Next event, ``None`` on timeout or when closed.
+        """
+        with self.__cond:
+            if not self.__queue and not self.__closed:
+                self.__cond.wait(timeout)
+            return self.__queue.popleft() if self.__queue else None
+
+    def close(self):
+        """Stops the delivery of events."""
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+        if self.__thread is not None and \
+                self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def _put(self, event):
+        """Queues an event without blocking."""
+        if event.kind not in self.kinds or (
+                event.finger is not None and event.finger not in self.fingers):
+            return
+        with self.__cond:
+            if len(self.__queue) == self.__queue.maxlen:
+                self.dropped += 1
+            self.__queue.append(event)
+            self.__cond.notify()
+
+    def _current(self, finger, old, new, timestamp):
+        """Queues an event if the current crossed the threshold."""
+        if self.threshold is None:
+            return
+        above = new >= self.threshold
+        prev, self.__above[finger - 1] = self.__above[finger - 1], above
+        if prev is not None and prev != above:
+            self._put(Event(CURRENT, finger, old, new, timestamp))
+
+    def __run(self):
+        """Callback thread loop."""
+        while True:
+            event = self.get()
+            if event is None:
+                return
+            try:
+                self.callback(event)
+            except Exception:
+                traceback.print_exc()
+
+
+class EventDispatcher(object):
+    """ Edge-detects state changes and fans them out to subscribers. """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__subscriptions = ()
+        self.__status = [UNKNOWN] * N_DOF
+        self.__current = [None] * N_DOF
+        self.__edge = None
+        self.__grip = None
+
+    def subscribe(self, *args, **kwargs):
+        """Registers a subscriber. Arguments are passed to
+        ``Subscription``.
+
+        Returns
+        -------
+        subscription : Subscription
+            Subscription handle.
+        """
+        sub = Subscription(*args, **kwargs)
+        with self.__lock:
+            self.__subscriptions += (sub,)
+        return sub
+
+    def unsubscribe(self, subscription):
+        """Removes and closes a subscriber."""
+        with self.__lock:
+            self.__subscriptions = tuple(
+                s for s in self.__subscriptions if s is not subscription)
+        subscription.close()
+
+    def close(self):
+        """Removes and closes all subscribers."""
+        with self.__lock:
+            subscriptions, self.__subscriptions = self.__subscriptions, ()
+        for sub in subscriptions:
+            sub.close()
+
+    @property
+    def active(self):
+        """``True`` if there are subscriptions."""
+        return bool(self.__subscriptions)
+
+    def feedback(self, finger, status, current, thumb_edge, timestamp):
+        """Processes the feedback of one digit.
+
+        Parameters
+        ----------
+        finger : int
+            Finger ID.
+        status : int
+            Status code.
+        current : float
+            Motor current (in Amps).
+        thumb_edge : bool or None
+            Thumb rotator edge. Only used when ``finger`` is 6.
+        timestamp : float
+            Time of the feedback, in seconds of ``time.monotonic()``.
+        """
+        i = finger - 1
+        old_status, self.__status[i] = self.__status[i], status
+        old_current, self.__current[i] = self.__current[i], current
+        subscriptions = self.__subscriptions
+        if not subscriptions:
+            if finger == N_DOF:
+                self.__edge = thumb_edge
+            return
+
+        events = []
+        if status != old_status:
+            events.append(Event(STATUS, finger,
+                                None if old_status == UNKNOWN
+                                else Status(old_status),
+                                Status(status), timestamp))
+        if finger == N_DOF and thumb_edge != self.__edge:
+            events.append(Event(EDGE, finger, self.__edge, thumb_edge,
+                                timestamp))
+            self.__edge = thumb_edge
+        for sub in subscriptions:
+            for event in events:
+                sub._put(event)
+            sub._current(finger, old_current, current, timestamp)
+
+    def quick_grip(self, grip, timestamp):
+        """Processes a quick grip change.
+
+        Parameters
+        ----------
+        grip : str
+            Quick grip name.
+        timestamp : float
+            Time of the change, in seconds of ``time.monotonic()``.
+        """
+        old, self.__grip = self.__grip, grip
+        if grip != old:
+            event = Event(QUICK_GRIP, None, old, grip, timestamp)
+            for sub in self.__subscriptions:
+                sub._put(event)
+
+    def link(self, connected, timestamp):
+        """Processes a loss or restoration of the connection.
+
+        Parameters
+        ----------
+        connected : bool
+            ``True`` once the connection is restored.
+        timestamp : float
+            Time of the change, in seconds of ``time.monotonic()``.
+        """
+        event = Event(LINK, None, not connected, connected, timestamp)
+        for sub in self.__subscriptions:
+            sub._put(event)
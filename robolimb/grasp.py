@@ -0,0 +1,215 @@
+""" Closed-loop, current-limited grasping.
+
+The firmware only reports a digit as ``stalled close`` once its own current
+threshold has been exceeded, and the status reaches the host with some delay.
+When grasping fragile objects at high velocity, this overshoots the grip
+force. The grasp below closes the selected digits while inspecting the motor
+current of every feedback frame, and stops each digit as soon as its current,
+or the rate of change of its current, crosses a threshold.
+
+The loop runs in a dedicated thread that only drains the receive queue and
+issues stop commands through the preempting path of the command scheduler.
+The reaction latency, from the feedback frame crossing the threshold to the
+stop frame being written, is measured for every digit.
+"""
+
+import contextlib
+import threading
+import time
+from collections import namedtuple
+
+from .scheduler import LatencyStats
+from .state import Status
+
+Contact = namedtuple('Contact', ['finger', 'reason', 'current', 'slope',
+                                 'crossing', 'detected', 'sent', 'latency'])
+Contact.__doc__ = """Outcome of the grasp for one digit.
+
+finger : int
+    Finger ID.
+reason : str
+    ``'current'`` or ``'slope'`` when a threshold was crossed, ``'stalled'``
+    when the firmware stalled the digit first, ``'timeout'`` or
+    ``'cancelled'`` otherwise.
+current : float
+    Motor current of the frame that stopped the digit (in Amps).
+slope : float
+    Rate of change of the current of that frame (in Amps per second), NaN
+    when unknown.
+crossing : float
+    Receive time of that frame, in seconds of ``time.monotonic()``.
+detected : float
+    Time at which the loop processed the frame.
+sent : float
+    Time at which the stop frame was written, NaN when no stop was sent.
+latency : float
+    Reaction latency ``sent - crossing`` in seconds, NaN when no stop was
+    sent.
+"""
+
+_NAN = float('nan')
+
+
+class CurrentLimitedGrasp(object):
+    """ Closes digits until a current limit is reached.
+
+    Parameters
+    ----------
+    hand : RoboLimbCAN
+        Started hand connection.
+    fingers : sequence of int, optional (default: (1, 2, 3, 4, 5))
+        Finger IDs to close.
+    velocity : int, optional (default: None)
+        Closing velocity. Allowed range is (10,297). If not provided, the
+        default velocity of ``hand`` is used.
+    threshold : float, optional (default: 1.)
+        Current (in Amps) at which a digit is stopped.
+    slope : float, optional (default: None)
+        Rate of change of the current (in Amps per second) at which a digit
+        is stopped. If not provided, only the current threshold is used.
+    blanking : float, optional (default: 0.05)
+        Time in seconds after the close commands during which the thresholds
+        are ignored, such that the motor inrush current does not stop the
+        digits.
+    timeout : float, optional (default: 5.)
+        Maximum duration of the grasp in seconds. Digits still closing are
+        stopped afterwards.
+
+    Attributes
+    ----------
+    contacts_ : dict
+        ``Contact`` per finger ID of the latest grasp.
+    latency_ : LatencyStats
+        Crossing-to-stop latency statistics over all grasps.
+
+    Notes
+    -----
+    The grasp consumes all feedback frames of the connection. The hand
+    status should not be queried from other threads while it is running.
+
+    When the connection has a ``RealtimePolicy``, it is applied to the grasp
+    thread and garbage collection is disabled during the loop.
+    """
+
+    def __init__(self, hand, fingers=(1, 2, 3, 4, 5), velocity=None,
+                 threshold=1., slope=None, blanking=0.05, timeout=5.):
+        self.hand = hand
+        self.fingers = fingers
+        self.velocity = velocity
+        self.threshold = threshold
+        self.slope = slope
+        self.blanking = blanking
+        self.timeout = timeout
+        self.contacts_ = {}
+        self.latency_ = LatencyStats()
+        self.__cancel = threading.Event()
+        self.__thread = None
+
+    def run(self):
+        """Performs the grasp in the calling thread.
+
+        Returns
+        -------
+        contacts : dict
+            ``Contact`` per finger ID.
+        """
+        hand = self.hand
+        self.__cancel.clear()
+        velocity = hand.def_vel if self.velocity is None else self.velocity
+        policy = getattr(hand, 'realtime', None)
+        with contextlib.ExitStack() as stack:
+            if policy is not None:
+                stack.enter_context(policy.critical())
+            stops = self.__loop(velocity)
+
+        contacts = {}
+        for f, reason, current, slope, crossing, detected, cmd in stops:
+            sent = latency = _NAN
+            if cmd is not None and cmd.wait(1.):
+                sent = cmd.sent
+                latency = sent - crossing
+                if reason in ('current', 'slope'):
+                    self.latency_.add(latency)
+            contacts[f] = Contact(f, reason, current, slope, crossing,
+                                  detected, sent, latency)
+        self.contacts_ = contacts
+        return contacts
+
+    def __loop(self, velocity):
+        """Control loop. Returns the stops issued per digit."""
+        hand = self.hand
+        active = set(self.fingers)
+        last = {}
+        stops = []
+
+        # Discard stale feedback such that every frame below is fresh
+        hand.poll_feedback()
+        t0 = time.monotonic()
+        for f in self.fingers:
+            hand.close_finger(f, velocity)
+        deadline = t0 + self.timeout
+
+        while active:
+            now = time.monotonic()
+            if now >= deadline or self.__cancel.is_set():
+                reason = 'cancelled' if self.__cancel.is_set() else 'timeout'
+                for f in sorted(active):
+                    current, slope, t = last.get(f, (_NAN, _NAN, _NAN))
+                    stops.append((f, reason, current, slope, t, now,
+                                  hand.stop_finger(f)))
+                break
+            for fb in hand.poll_feedback(timeout=min(0.01, deadline - now)):
+                f = fb.finger_id
+                if f not in active:
+                    continue
+                prev = last.get(f)
+                slope = _NAN
+                if prev is not None and fb.timestamp > prev[2]:
+                    slope = (fb.current - prev[0]) / (fb.timestamp - prev[2])
+                last[f] = (fb.current, slope, fb.timestamp)
+                if fb.timestamp - t0 < self.blanking:
+                    continue
+
+                if fb.current >= self.threshold:
+                    reason = 'current'
+                elif self.slope is not None and slope >= self.slope:
+                    reason = 'slope'
+                elif fb.status == Status.STALLED_CLOSE:
+                    reason = 'stalled'
+                else:
+                    continue
+                # The firmware has already stopped stalled digits
+                cmd = None if reason == 'stalled' else hand.stop_finger(f)
+                stops.append((f, reason, fb.current, slope, fb.timestamp,
+                              time.monotonic(), cmd))
+                active.discard(f)
+        return stops
+
+    def start(self):
+        """Performs the grasp in a dedicated thread."""
+        self.__thread = threading.Thread(target=self.__run,
+                                         name='robolimb-grasp', daemon=True)
+        self.__thread.start()
+
+    def wait(self, timeout=None):
+        """Waits for a grasp started with ``start`` to finish.
+
+        Returns
+        -------
+        contacts : dict or None
+            ``Contact`` per finger ID, ``None`` if the grasp is still
+            running.
+        """
+        self.__thread.join(timeout)
+        return None if self.__thread.is_alive() else self.contacts_
+
+    def __run(self):
+        """Grasp thread entry point."""
+        policy = getattr(self.hand, 'realtime', None)
+        if policy is not None:
+            policy.apply()
+        self.run()
+
+    def cancel(self):
+        """Stops all digits still closing and ends the grasp."""
+        self.__cancel.set()
@@ -0,0 +1,286 @@
+""" Importers for standard CAN log formats.
+
+Logs recorded with other tools are streamed in chunks and decoded with the
+same decoders as live operation (``robolimb.protocol``). Text formats are
+parsed a block of bytes at a time: a compiled regular expression extracts the
+fields of all lines in the block, and hexadecimal fields are converted with
+NumPy lookup tables rather than per line. Memory use is therefore bounded by
+the block size, regardless of the log size.
+
+The regular expression still returns one tuple of fields per line, which
+only lives until the block has been converted to arrays; the per-frame
+Python objects are limited to these tuples. BLF files are read frame by
+frame with python-can.
+
+Supported formats are
+
+* ``candump``: SocketCAN ``candump -l`` log files (``.log``) and the
+  ``candump`` console output with absolute or relative timestamps (``-t a``,
+  ``z`` or ``A``). Console lines without timestamp are skipped. Delta
+  timestamps (``-t d``) cannot be told apart from relative ones and are not
+  supported,
+* ``asc``: Vector ASCII logs (``.asc``),
+* ``trc``: PCAN-View trace files (``.trc``), versions 1.x, 2.0 and 2.1,
+* ``blf``: Vector binary logs (``.blf``), read with python-can.
+"""
+
+import os
+import re
+
+import numpy as np
+
+from .protocol import RX, TX, decode, is_command
+from .session import SessionWriter
+
+BLOCK_SIZE = 1 << 23
+
+_HEX = np.full(256, 0xFF, dtype=np.uint8)
+for _i, _c in enumerate(b'0123456789abcdef'):
+    _HEX[_c] = _i
+    _HEX[ord(chr(_c).upper())] = _i
+
+_CANDUMP_LOG = re.compile(
+    rb'^\s*\((\d+\.\d+)\)\s+\S+\s+([0-9A-Fa-f]{1,8})#([0-9A-Fa-f]*)',
+    re.MULTILINE)
+_CANDUMP_CONSOLE = re.compile(
+    rb'^\s*\((\d+\.\d+)\)\s+\S+\s+([0-9A-Fa-f]{1,8})\s+\[(\d)\]\s+'
+    rb'((?:[0-9A-Fa-f]{2} ?)*)', re.MULTILINE)
+_ASC = re.compile(
+    rb'^\s*(\d+\.\d+)\s+\d+\s+([0-9A-Fa-f]{1,8})x?\s+(Rx|Tx)\s+d\s+(\d)\s+'
+    rb'((?:[0-9A-Fa-f]{2} ?)*)', re.MULTILINE)
+_TRC1 = re.compile(
+    rb'^\s*\d+\)\s+(\d+\.\d+)\s+(Rx|Tx)\s+([0-9A-Fa-f]{1,8})\s+(\d)\s+'
+    rb'((?:[0-9A-Fa-f]{2} ?)*)', re.MULTILINE)
+# Version 2.1 adds a bus column and a reserved column before the DLC
+_TRC2 = re.compile(
+    rb'^\s*\d+\s+(\d+\.\d+)\s+DT\s+(?:\d+\s+)?([0-9A-Fa-f]{1,8})\s+'
+    rb'(Rx|Tx)\s+(?:-\s+)?(\d)\s+((?:[0-9A-Fa-f]{2} ?)*)', re.MULTILINE)
+
+FORMATS = {'.log': 'candump', '.asc': 'asc', '.trc': 'trc', '.blf': 'blf'}
+
+
+def _hex_values(strings):
+    """Converts an array of hexadecimal byte strings to integers."""
+    s = np.asarray(strings, dtype=bytes)
+    if s.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    digits = _HEX[s.view(np.uint8).reshape(len(s), -1)].astype(np.int64)
+    valid = digits != 0xFF
+    # Strings are left-aligned and NUL-padded: weight digits from the right
+    n = valid.sum(axis=1, keepdims=True)
+    power = n - 1 - np.arange(digits.shape[1])
+    return np.where(valid, digits << (4 * np.clip(power, 0, None)),
+                    0).sum(axis=1)
+
+
+def _hex_bytes(strings, spaced):
+    """Converts an array of hexadecimal data strings to a byte matrix.
+
+    Parameters
+    ----------
+    strings : sequence of bytes
+        Data strings, either contiguous (``'0004001A'``) or with bytes
+        separated by single spaces (``'00 04 00 1A'``).
+    spaced : bool
+        ``True`` for space-separated strings.
+
+    Returns
+    -------
+    data : numpy.ndarray, shape (n_frames, 8)
+        Data bytes, zero-padded.
+    """
+    s = np.asarray(strings, dtype=bytes)
+    data = np.zeros((len(s), 8), dtype=np.uint8)
+    if s.size == 0 or s.itemsize == 0:
+        return data
+    chars = s.view(np.uint8).reshape(len(s), -1)
+    step = 3 if spaced else 2
+    for k in range(8):
+        if step * k + 1 >= chars.shape[1]:
+            break
+        hi = _HEX[chars[:, step * k]]
+        lo = _HEX[chars[:, step * k + 1]]
+        valid = (hi != 0xFF) & (lo != 0xFF)
+        data[:, k] = np.where(valid, (hi << 4) | lo, 0)
+    return data
+
+
+def _direction(ids, markers=None):
+    """Returns frame directions from Rx/Tx markers or, when not available,
+    inferred from the CAN IDs of commands and queries."""
+    if markers is not None:
+        return np.where(np.asarray(markers) == b'Tx', TX, RX).astype(np.uint8)
+    tx = is_command(ids) | (ids == 0x301) | (ids == 0x302)
+    return np.where(tx, TX, RX).astype(np.uint8)
+
+
+def _blocks(path, block_size):
+    """Yields blocks of complete lines of a text file."""
+    with open(path, 'rb') as f:
+        rest = b''
+        while True:
+            block = f.read(block_size)
+            if not block:
+                if rest:
+                    yield rest
+                return
+            block = rest + block
+            cut = block.rfind(b'\n') + 1
+            if cut == 0:
+                rest = block
+                continue
+            rest = block[cut:]
+            yield block[:cut]
+
+
+def _parse_text(block, fmt):
+    """Parses a block of text lines into frame arrays."""
+    markers = None
+    if fmt == 'candump':
+        rows = _CANDUMP_LOG.findall(block)
+        if rows:
+            t, ids, data = zip(*rows)
+            dlc = np.char.str_len(np.array(data)) // 2
+            data = _hex_bytes(data, spaced=False)
+        else:
+            rows = _CANDUMP_CONSOLE.findall(block)
+            if not rows:
+                return None
+            t, ids, dlc, data = zip(*rows)
+            data = _hex_bytes(data, spaced=True)
+        t = np.array(t).astype(np.float64)
+    elif fmt == 'asc':
+        rows = _ASC.findall(block)
+        if not rows:
+            return None
+        t, ids, markers, dlc, data = zip(*rows)
+        t = np.array(t).astype(np.float64)
+        data = _hex_bytes(data, spaced=True)
+    elif fmt == 'trc':
+        rows = _TRC1.findall(block)
+        if rows:
+            t, markers, ids, dlc, data = zip(*rows)
+        else:
+            rows = _TRC2.findall(block)
+            if not rows:
+                return None
+            t, ids, markers, dlc, data = zip(*rows)
+        # Trace times are in milliseconds
+        t = np.array(t).astype(np.float64) * 1e-3
+        data = _hex_bytes(data, spaced=True)
+    else:
+        raise ValueError("Unknown format: {}".format(fmt))
+    ids = _hex_values(ids)
+    dlc = np.array(dlc).astype(np.uint8)
+    return t, ids, dlc, data, _direction(ids, markers)
+
+
+def _blf_chunks(path, chunk_size):
+    """Yields frame arrays read from a BLF file with python-can."""
+    import can
+    t, ids, data, direction = [], [], [], []
+
+    def chunk():
+        d = np.zeros((len(data), 8), dtype=np.uint8)
+        for i, b in enumerate(data):
+            d[i, :len(b)] = bytearray(b)[:8]
+        dlc = np.array([min(len(b), 8) for b in data], dtype=np.uint8)
+        return (np.array(t, dtype=np.float64), np.array(ids, dtype=np.int64),
+                dlc, d, np.array(direction, dtype=np.uint8))
+
+    for msg in can.BLFReader(path):
+        if msg.is_error_frame or msg.is_remote_frame:
+            continue
+        t.append(msg.timestamp)
+        ids.append(msg.arbitration_id)
+        data.append(msg.data)
+        direction.append(RX if msg.is_rx else TX)
+        if len(t) == chunk_size:
+            yield chunk()
+            t, ids, data, direction = [], [], [], []
+    if t:
+        yield chunk()
+
+
+def detect_format(path):
+    """Returns the log format from the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError("Unknown log format: {}".format(path))
+    return FORMATS[ext]
+
+
+def iter_frames(path, fmt=None, block_size=BLOCK_SIZE):
+    """Streams a CAN log in chunks of decoded frames.
+
+    Parameters
+    ----------
+    path : str
+        Path of the log file.
+    fmt : str, optional (default: None)
+        One of ``'candump'``, ``'asc'``, ``'trc'`` or ``'blf'``. If not
+        provided, the format is detected from the file extension.
+    block_size : int, optional (default: BLOCK_SIZE)
+        Number of bytes parsed at a time (text formats) or approximate
+        number of bytes per chunk (BLF).
+
+    Yields
+    ------
+    frames : dict
+        Arrays ``time``, ``id``, ``dlc``, ``data`` (n_frames x 8),
+        ``direction`` and ``decoded``, the latter as returned by
+        ``protocol.decode``.
+    """
+    fmt = detect_format(path) if fmt is None else fmt
+    if fmt == 'blf':
+        chunks = _blf_chunks(path, max(1, block_size // 64))
+    else:
+        chunks = (_parse_text(block, fmt)
+                  for block in _blocks(path, block_size))
+    for chunk in chunks:
+        if chunk is None or len(chunk[0]) == 0:
+            continue
+        t, ids, dlc, data, direction = chunk
+        yield {
+            'time': t,
+            'id': ids,
+            'dlc': dlc,
+            'data': data,
+            'direction': direction,
+            'decoded': decode(ids, data, direction)
+        }
+
+
+def import_log(path, session_path, fmt=None, block_size=BLOCK_SIZE,
+               **kwargs):
+    """Converts a CAN log into a session file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the log file.
+    session_path : str
+        Path of the session file to write.
+    fmt : str, optional (default: None)
+        Log format. If not provided, it is detected from the file extension.
+    block_size : int, optional (default: BLOCK_SIZE)
+        Number of bytes parsed at a time.
+    kwargs : dict
+        Additional arguments passed to ``robolimb.session.SessionWriter``.
+
+    Returns
+    -------
+    n_frames : int
+        Number of imported frames.
+    """
+    fmt = detect_format(path) if fmt is None else fmt
+    metadata = dict(kwargs.pop('metadata', None) or {})
+    metadata.setdefault('source', os.path.basename(path))
+    metadata.setdefault('format', fmt)
+    n = 0
+    with SessionWriter(session_path, metadata=metadata, **kwargs) as writer:
+        for frames in iter_frames(path, fmt, block_size):
+            writer.extend(frames['time'], frames['id'], frames['data'],
+                          frames['direction'], frames['dlc'])
+            n += len(frames['time'])
+    return n
@@ -0,0 +1,238 @@
+""" Command-to-feedback latency measurement.
+
+Every motor command written to the bus is matched to the first subsequent
+feedback frame of its digit that reflects it: ``'closing'`` or ``'stalled
+close'`` after a close command, ``'opening'`` or ``'stalled open'`` after an
+open command and ``'stop'`` or a stalled status after a stop. The delay is
+the actuation latency of the command, as seen from the host. A command that
+is followed by another command of the same digit before any reflecting
+feedback is counted as unanswered.
+
+``RoboLimbCAN`` feeds its correlator from the write and receive paths, and
+the same engine replays recorded sessions with ``correlate``.
+"""
+
+import threading
+
+import numpy as np
+
+from .protocol import RX, TX
+from .state import N_DOF, Status
+
+# Indexed by the action codes of ``robolimb.ACTIONS``
+ACTION_NAMES = ('stop', 'close', 'open')
+
+# Feedback status acknowledging each action, indexed by [action, status]
+_REFLECTS = np.zeros((len(ACTION_NAMES), len(Status)), dtype=bool)
+for _action, _statuses in enumerate((
+        (Status.STOP, Status.STALLED_CLOSE, Status.STALLED_OPEN),
+        (Status.CLOSING, Status.STALLED_CLOSE),
+        (Status.OPENING, Status.STALLED_OPEN))):
+    _REFLECTS[_action, list(_statuses)] = True
+
+
+class LatencyCorrelator(object):
+    """ Online matching of motor commands to the feedback reflecting them.
+
+    Parameters
+    ----------
+    size : int, optional (default: 1024)
+        Number of latencies kept per digit and action for the distribution
+        statistics. Counts include all matched commands.
+
+    Attributes
+    ----------
+    unanswered_ : numpy.ndarray
+        Number of commands superseded before any reflecting feedback, per
+        digit (index 0 for the thumb) and action.
+    """
+
+    def __init__(self, size=1024):
+        if size < 1:
+            raise ValueError("The number of kept latencies must be positive.")
+        self.size = size
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears pending commands and latencies."""
+        with self.__lock:
+            self.__pending = np.full(N_DOF, np.nan)
+            self.__action = np.zeros(N_DOF, dtype=np.intp)
+            self.__samples = np.full((N_DOF, len(ACTION_NAMES), self.size),
+                                     np.nan)
+            self.__counts = np.zeros((N_DOF, len(ACTION_NAMES)),
+                                     dtype=np.int64)
+            self.unanswered_ = np.zeros((N_DOF, len(ACTION_NAMES)),
+                                        dtype=np.int64)
+
+    def command(self, finger, action, timestamp):
+        """Registers a motor command written to the bus.
+
+        Parameters
+        ----------
+        finger : int
+            Finger ID.
+        action : int
+            Action code.
+        timestamp : float
+            Write time in seconds.
+        """
+        if not 0 <= action < len(ACTION_NAMES):
+            return
+        i = finger - 1
+        with self.__lock:
+            if not np.isnan(self.__pending[i]):
+                self.unanswered_[i, self.__action[i]] += 1
+            self.__pending[i] = timestamp
+            self.__action[i] = action
+
+    def feedback(self, finger, status, timestamp):
+        """Matches a feedback frame against the pending command of its
+        digit.
+
+        Returns
+        -------
+        latency : float or None
+            Latency of the command reflected by the frame, ``None`` if the
+            frame does not reflect a pending command.
+        """
+        i = finger - 1
+        with self.__lock:
+            t = self.__pending[i]
+            # NaN when nothing is pending fails the comparison
+            if not timestamp >= t or \
+                    not 0 <= status < len(Status) or \
+                    not _REFLECTS[self.__action[i], status]:
+                return None
+            self.__add(i, timestamp - t)
+            return timestamp - t
+
+    def feedback_array(self, fingers, statuses, timestamps):
+        """Matches feedback frames, in order of arrival, against the pending
+        commands.
+
+        Parameters
+        ----------
+        fingers, statuses, timestamps : numpy.ndarray
+            Finger ID, status code and receive time of each frame.
+
+        Returns
+        -------
+        n_matched : int
+            Number of commands matched.
+        """
+        with self.__lock:
+            if np.isnan(self.__pending).all() or not len(fingers):
+                return 0
+            fingers = np.asarray(fingers, dtype=np.intp)
+            statuses = np.asarray(statuses, dtype=np.intp)
+            valid = (fingers >= 1) & (fingers <= N_DOF) & (statuses >= 0) & \
+                (statuses < len(Status))
+            rows = np.flatnonzero(valid)
+            digit = fingers[rows] - 1
+            t = self.__pending[digit]
+            match = (timestamps[rows] >= t) & \
+                _REFLECTS[self.__action[digit], statuses[rows]]
+            rows, digit = rows[match], digit[match]
+            # First reflecting frame of each digit
+            digit, first = np.unique(digit, return_index=True)
+            for i, k in zip(digit.tolist(), rows[first].tolist()):
+                self.__add(i, float(timestamps[k]) - self.__pending[i])
+            return len(digit)
+
+    def __add(self, i, latency):
+        """Stores the latency of the pending command of digit ``i``. The
+        lock must be held."""
+        a = self.__action[i]
+        self.__samples[i, a, self.__counts[i, a] % self.size] = latency
+        self.__counts[i, a] += 1
+        self.__pending[i] = np.nan
+
+    def latencies(self, finger, action):
+        """Returns the kept latencies of a digit and action, in seconds and
+        in no particular order.
+
+        Parameters
+        ----------
+        finger : int
+            Finger ID.
+        action : str
+            One of ``['open', 'close', 'stop']``.
+        """
+        a = ACTION_NAMES.index(action)
+        with self.__lock:
+            n = min(self.__counts[finger - 1, a], self.size)
+            return self.__samples[finger - 1, a, :n].copy()
+
+    def stats(self):
+        """Returns the latency distribution per digit and action.
+
+        Returns
+        -------
+        stats : dict
+            For each finger ID, a dictionary with one entry per action:
+            number of matched and unanswered commands, and mean, median,
+            90th and 99th percentile and maximum of the kept latencies (in
+            seconds, NaN without any).
+        """
+        with self.__lock:
+            samples = self.__samples.copy()
+            counts = self.__counts.copy()
+            unanswered = self.unanswered_.copy()
+        stats = {}
+        for i in range(N_DOF):
+            stats[i + 1] = {}
+            for a, name in enumerate(ACTION_NAMES):
+                x = samples[i, a, :min(counts[i, a], self.size)]
+                if len(x):
+                    p50, p90, p99 = np.percentile(x, [50, 90, 99]).tolist()
+                    mean, max_ = float(x.mean()), float(x.max())
+                else:
+                    mean = p50 = p90 = p99 = max_ = np.nan
+                stats[i + 1][name] = {
+                    'count': int(counts[i, a]),
+                    'unanswered': int(unanswered[i, a]),
+                    'mean': mean, 'median': p50, 'p90': p90, 'p99': p99,
+                    'max': max_}
+        return stats
+
+
+def correlate(path, size=1024):
+    """Measures the command-to-feedback latencies of a recording.
+
+    Parameters
+    ----------
+    path : str
+        Session file, or a CAN log in one of the formats supported by
+        ``robolimb.importers``.
+    size : int, optional (default: 1024)
+        Number of latencies kept per digit and action.
+
+    Returns
+    -------
+    correlator : LatencyCorrelator
+        Correlator fed with all commands and feedback of the recording.
+    """
+    from .analysis import load_frames
+    frames = load_frames(path)
+    order = np.argsort(frames['time'], kind='stable')
+    t = frames['time'][order]
+    direction = frames['direction'][order]
+    finger = frames['finger'][order]
+    action = frames['action'][order]
+    status = frames['status'][order]
+    correlator = LatencyCorrelator(size)
+    # Runs of received frames are matched at once, commands one by one
+    tx = np.flatnonzero((direction == TX) & (finger > 0) &
+                        (action >= 0))
+    rx = (direction == RX) & (finger > 0)
+    bounds = np.concatenate([[0], tx, [len(t)]])
+    for k in range(len(bounds) - 1):
+        start = bounds[k]
+        if k:
+            correlator.command(int(finger[start]), int(action[start]),
+                               float(t[start]))
+        rows = start + np.flatnonzero(rx[start:bounds[k + 1]])
+        correlator.feedback_array(finger[rows], status[rows], t[rows])
+    return correlator
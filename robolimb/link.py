@@ -0,0 +1,112 @@
+""" Characterization of the CAN link to the hand.
+
+Timeouts and cache freshness bounds depend on the link: the feedback period
+of the digits, the round-trip time of queries and the latency of the write
+path (scheduler wake-up and ``Write`` call). ``RoboLimbCAN.start(probe=True)``
+measures them during a short probe and derives its settings with ``tune``:
+
+* ``cycle_timeout``: a feedback cycle is given twice the slowest feedback
+  period, including its jitter, to complete.
+* ``max_age``: a cached status younger than the slowest feedback period is
+  as recent as the result of a query.
+* ``query_timeout``: four times the slowest measured round-trip time.
+* ``schedule_lead``: ten times the slowest measured write latency, such that
+  all commands of a schedule are queued before the first one is due.
+"""
+
+import collections
+
+import numpy as np
+
+from .state import N_DOF
+
+CYCLE_MARGIN = 2.
+QUERY_MARGIN = 4.
+LEAD_MARGIN = 10.
+# Lower bounds of the tuned settings in seconds
+MIN_QUERY_TIMEOUT = 0.01
+MIN_SCHEDULE_LEAD = 0.002
+
+LinkProfile = collections.namedtuple(
+    'LinkProfile', ['feedback_period', 'feedback_jitter', 'query_rtt',
+                    'query_rtt_max', 'write_latency', 'write_latency_max'])
+LinkProfile.__doc__ = """Measured link characteristics, in seconds.
+
+feedback_period : numpy.ndarray
+    Median interval between feedback frames per digit, NaN for digits with
+    less than two frames.
+feedback_jitter : numpy.ndarray
+    99th percentile of the intervals minus their median, per digit.
+query_rtt, query_rtt_max : float
+    Median and maximum time from writing a query to receiving its response,
+    NaN without any response.
+write_latency, write_latency_max : float
+    Median and maximum time from queueing a command to its write returning.
+"""
+
+
+def measure(fingers, times, rtt, write_latency):
+    """Summarizes probe measurements.
+
+    Parameters
+    ----------
+    fingers, times : numpy.ndarray
+        Finger ID and receive time of the feedback frames, in order of
+        arrival.
+    rtt : array-like
+        Query round-trip times.
+    write_latency : array-like
+        Write-path latencies.
+
+    Returns
+    -------
+    link : LinkProfile
+        Link characteristics.
+    """
+    period = np.full(N_DOF, np.nan)
+    jitter = np.full(N_DOF, np.nan)
+    for d in range(1, N_DOF + 1):
+        intervals = np.diff(times[fingers == d])
+        if len(intervals):
+            period[d - 1] = np.median(intervals)
+            jitter[d - 1] = np.percentile(intervals, 99) - period[d - 1]
+    rtt = np.asarray(rtt, dtype=float)
+    write_latency = np.asarray(write_latency, dtype=float)
+    rtt_median, rtt_max = (np.median(rtt), rtt.max()) if len(rtt) \
+        else (np.nan, np.nan)
+    write_median, write_max = (np.median(write_latency),
+                               write_latency.max()) if len(write_latency) \
+        else (np.nan, np.nan)
+    return LinkProfile(period, jitter, float(rtt_median), float(rtt_max),
+                       float(write_median), float(write_max))
+
+
+def tune(link):
+    """Derives connection settings from link characteristics.
+
+    Settings whose measurements are missing (e.g. no feedback or no query
+    response during the probe) are left out.
+
+    Parameters
+    ----------
+    link : LinkProfile
+        Link characteristics.
+
+    Returns
+    -------
+    settings : dict
+        Values of ``cycle_timeout``, ``max_age``, ``query_timeout`` and
+        ``schedule_lead`` in seconds.
+    """
+    settings = {}
+    if np.isfinite(link.feedback_period).any():
+        settings['max_age'] = float(np.nanmax(link.feedback_period))
+        settings['cycle_timeout'] = CYCLE_MARGIN * float(
+            np.nanmax(link.feedback_period + link.feedback_jitter))
+    if np.isfinite(link.query_rtt_max):
+        settings['query_timeout'] = max(QUERY_MARGIN * link.query_rtt_max,
+                                        MIN_QUERY_TIMEOUT)
+    if np.isfinite(link.write_latency_max):
+        settings['schedule_lead'] = max(
+            LEAD_MARGIN * link.write_latency_max, MIN_SCHEDULE_LEAD)
+    return settings
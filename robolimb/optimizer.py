@@ -0,0 +1,301 @@
+""" Monte-Carlo optimization of grip timings.
+
+A grip is described by a ``Template``: a sequence of phases, each a group of
+motor commands issued together, whose start times are the parameters to
+tune. The delays of ``examples/grips.py`` serve as starting points.
+
+Candidate timings are evaluated with ``robolimb.simulator.simulate`` over
+many executions with randomized digit speeds, command latencies and
+feedback delays. An execution is correct when every required digit ends up
+stalled in its target direction and the thumb is clear of the fingers
+whenever the rotator moves. The cross-entropy method searches for the
+timings minimizing a high quantile of the completion time, where incorrect
+executions count as never completing; candidates are evaluated in parallel
+by a process pool.
+"""
+
+import collections
+import json
+import multiprocessing
+
+import numpy as np
+
+from .planner import Plan, Step
+from .robolimb import ACTIONS
+from .simulator import simulate
+from .state import Status
+
+_OPEN, _CLOSE, _STOP = ACTIONS['open'], ACTIONS['close'], ACTIONS['stop']
+
+Phase = collections.namedtuple('Phase', ['name', 'commands'])
+Phase.__doc__ = """Group of commands issued together.
+
+name : str
+    Phase name.
+commands : tuple
+    ``(finger, action)`` pairs.
+"""
+
+Template = collections.namedtuple('Template', ['phases', 'timings',
+                                               'required', 'initial'])
+Template.__doc__ = """Parametrized grip.
+
+phases : tuple of Phase
+    Phases of the grip.
+timings : tuple of float
+    Hand-tuned start time of each phase in seconds.
+required : dict
+    Final status per finger ID for the grip to be complete.
+initial : tuple of float
+    Digit positions the grip starts from.
+"""
+
+Result = collections.namedtuple('Result', ['plan', 'timings', 'success',
+                                           'completion', 'baseline'])
+Result.__doc__ = """Optimized grip.
+
+plan : Plan
+    Optimized commands, executable with ``GripPlanner.run``. The duration is
+    the completion time quantile.
+timings : tuple of float
+    Optimized start time of each phase in seconds.
+success : float
+    Fraction of correct executions.
+completion : float
+    Completion time quantile in seconds.
+baseline : float
+    Completion time quantile of the hand-tuned timings in seconds.
+"""
+
+_FINGERS = (1, 2, 3, 4, 5)
+_OPEN_HAND = (0., 0., 0., 0., 0., 0.)
+_OPEN_PALMAR = (0., 0., 0., 0., 0., 1.)
+
+# Grips of examples/grips.py with their hand-tuned delays
+TEMPLATES = {
+    'cylindrical': Template(
+        (Phase('preshape', tuple((f, _OPEN) for f in _FINGERS)),
+         Phase('rotate', ((6, _CLOSE),)),
+         Phase('fingers', tuple((f, _CLOSE) for f in (2, 3, 4, 5))),
+         Phase('thumb', ((1, _CLOSE),))),
+        (0., 0.2, 1.5, 1.5),
+        {f: Status.STALLED_CLOSE for f in range(1, 7)},
+        _OPEN_HAND),
+    'lateral': Template(
+        (Phase('preshape', tuple((f, _OPEN) for f in (1, 2, 3))),
+         Phase('rotate', ((6, _OPEN),)),
+         Phase('fingers', tuple((f, _CLOSE) for f in (2, 3, 4, 5))),
+         Phase('thumb', ((1, _CLOSE),))),
+        (0., 0.2, 0.3, 1.5),
+        {1: Status.STALLED_CLOSE, 2: Status.STALLED_CLOSE,
+         3: Status.STALLED_CLOSE, 4: Status.STALLED_CLOSE,
+         5: Status.STALLED_CLOSE, 6: Status.STALLED_OPEN},
+        _OPEN_PALMAR),
+    'tripod': Template(
+        (Phase('preshape', tuple((f, _OPEN) for f in (1, 2, 3))),
+         Phase('hold', tuple((f, _STOP) for f in (1, 2, 3))),
+         Phase('rotate', ((4, _CLOSE), (5, _CLOSE), (6, _CLOSE))),
+         Phase('grasp', tuple((f, _CLOSE) for f in (1, 2, 3)))),
+        (0., 0.1, 0.1, 1.5),
+        {f: Status.STALLED_CLOSE for f in range(1, 7)},
+        _OPEN_HAND),
+    'tripod_ext': Template(
+        (Phase('preshape', tuple((f, _OPEN) for f in _FINGERS)),
+         Phase('hold', tuple((f, _STOP) for f in (2, 3, 4, 5))),
+         Phase('rotate', ((6, _CLOSE),)),
+         Phase('grasp', tuple((f, _CLOSE) for f in (1, 2, 3)))),
+        (0., 0.1, 0.1, 1.5),
+        {f: Status.STALLED_CLOSE for f in (1, 2, 3, 6)},
+        _OPEN_HAND)
+}
+
+
+def template_steps(template, timings, velocity=297):
+    """Returns the commands of a template for given phase start times.
+
+    Returns
+    -------
+    steps : list of Step
+        Commands sorted by time.
+    """
+    steps = [Step(float(t), f, action, velocity)
+             for phase, t in zip(template.phases, timings)
+             for f, action in phase.commands]
+    return sorted(steps, key=lambda s: (s.time, s.finger))
+
+
+def evaluate(template, timings, n_trials=1000, velocity=297, profile=None,
+             quantile=0.95, seed=None, **kwargs):
+    """Simulates a grip and scores its timings.
+
+    Parameters
+    ----------
+    template : Template
+        Grip template.
+    timings : sequence of float
+        Start time of each phase in seconds.
+    n_trials : int, optional (default: 1000)
+        Number of simulated executions.
+    velocity : int, optional (default: 297)
+        Velocity of all commands.
+    profile : DeviceProfile, optional (default: None)
+        Nominal travel times. If not provided, default timings are used.
+    quantile : float, optional (default: 0.95)
+        Quantile of the completion time that is reported.
+    seed : int, optional (default: None)
+        Seed of the random generator.
+    kwargs : dict
+        Additional arguments passed to ``robolimb.simulator.simulate``.
+
+    Returns
+    -------
+    success : float
+        Fraction of correct executions.
+    completion : float
+        Completion time quantile in seconds, where incorrect executions
+        never complete. Infinite when ``success < quantile``.
+    """
+    steps = template_steps(template, timings, velocity)
+    result = simulate(steps, n_trials, profile, template.initial, seed=seed,
+                      **kwargs)
+    ok = ~result.violation
+    for f, status in template.required.items():
+        ok &= result.status[:, f - 1] == status
+    required = [f - 1 for f in template.required]
+    completion = np.where(ok, result.detected[:, required].max(axis=1),
+                          np.inf)
+    # Order statistic rather than interpolation, which is undefined for inf
+    k = min(int(np.ceil(quantile * n_trials)), n_trials) - 1
+    return float(ok.mean()), float(np.sort(completion)[max(k, 0)])
+
+
+def _evaluate(args):
+    """Pool worker."""
+    template, timings, kwargs = args
+    return evaluate(template, timings, **kwargs)
+
+
+def optimize(template, n_trials=1000, population=32, elite=0.25,
+             iterations=15, sd=0.2, max_time=3., processes=None,
+             velocity=297, profile=None, quantile=0.95, seed=0, **kwargs):
+    """Searches the phase timings minimizing the completion time of a grip.
+
+    Parameters
+    ----------
+    template : Template or str
+        Grip template, or the name of one of ``TEMPLATES``.
+    n_trials : int, optional (default: 1000)
+        Number of simulated executions per candidate.
+    population : int, optional (default: 32)
+        Number of candidates per iteration.
+    elite : float, optional (default: 0.25)
+        Fraction of the best candidates that the next iteration samples
+        around.
+    iterations : int, optional (default: 15)
+        Number of iterations.
+    sd : float, optional (default: 0.2)
+        Initial standard deviation of the phase times in seconds.
+    max_time : float, optional (default: 3.)
+        Latest allowed phase start in seconds.
+    processes : int, optional (default: None)
+        Number of worker processes. If not provided, one per CPU core.
+    velocity : int, optional (default: 297)
+        Velocity of all commands.
+    profile : DeviceProfile, optional (default: None)
+        Nominal travel times. If not provided, default timings are used.
+    quantile : float, optional (default: 0.95)
+        Completion time quantile to minimize. At least this fraction of the
+        executions must be correct.
+    seed : int, optional (default: 0)
+        Seed of the random generators.
+    kwargs : dict
+        Additional arguments passed to ``robolimb.simulator.simulate``.
+
+    Returns
+    -------
+    result : Result
+        Optimized grip.
+    """
+    if isinstance(template, str):
+        template = TEMPLATES[template]
+    rng = np.random.default_rng(seed)
+    options = dict(kwargs, n_trials=n_trials, velocity=velocity,
+                   profile=profile, quantile=quantile)
+    mean = np.array(template.timings, dtype=float)
+    std = np.full(len(mean), sd)
+    std[0] = 0.
+    best = mean.copy()
+    n_elite = max(2, int(round(elite * population)))
+
+    with multiprocessing.Pool(processes) as pool:
+        for k in range(iterations):
+            candidates = np.clip(rng.normal(mean, std,
+                                            (population, len(mean))),
+                                 0., max_time)
+            candidates[0] = best
+            # Common random numbers: all candidates of an iteration face the
+            # same simulated executions
+            opts = dict(options, seed=seed + k)
+            scores = pool.map(_evaluate, [(template, tuple(c), opts)
+                                          for c in candidates])
+            # Rank by completion time, then by fraction of correct trials
+            order = sorted(range(population),
+                           key=lambda i: (scores[i][1], -scores[i][0]))
+            elites = candidates[order[:n_elite]]
+            mean = elites.mean(axis=0)
+            std = np.maximum(elites.std(axis=0), 1e-3)
+            std[0] = 0.
+            best = candidates[order[0]]
+
+    # Final estimates on executions not used by the search
+    final_seed = seed + iterations
+    success, completion = evaluate(template, best, seed=final_seed,
+                                   **options)
+    _, baseline = evaluate(template, template.timings, seed=final_seed,
+                           **options)
+    timings = tuple(round(float(t), 3) for t in best)
+    target = {f: 1. if status == Status.STALLED_CLOSE else 0.
+              for f, status in template.required.items()}
+    plan = Plan(template_steps(template, timings, velocity), completion,
+                target)
+    return Result(plan, timings, success, completion, baseline)
+
+
+def save_grips(results, path):
+    """Writes optimized grips to a JSON file.
+
+    Parameters
+    ----------
+    results : dict
+        ``Result`` per grip name.
+    path : str
+        Path of the JSON file.
+    """
+    grips = {}
+    for name, result in results.items():
+        plan = result.plan
+        grips[name] = {
+            'steps': [list(step) for step in plan.steps],
+            'duration': plan.duration,
+            'target': {str(f): q for f, q in plan.target.items()},
+            'timings': list(result.timings),
+            'success': result.success,
+            'baseline': result.baseline
+        }
+    with open(path, 'w') as f:
+        json.dump(grips, f, indent=2)
+
+
+def load_grips(path):
+    """Reads optimized grips written by ``save_grips``.
+
+    Returns
+    -------
+    plans : dict
+        ``Plan`` per grip name, executable with ``GripPlanner.run``.
+    """
+    with open(path) as f:
+        grips = json.load(f)
+    return {name: Plan([Step(*step) for step in g['steps']], g['duration'],
+                       {int(f): q for f, q in g['target'].items()})
+            for name, g in grips.items()}
@@ -0,0 +1,322 @@
+""" Direct grip-to-grip transitions.
+
+The planner takes the estimated digit configuration of the hand and a target
+grip, and computes the per-digit commands and delays that reach the grip
+pre-shape in minimal time, without opening the hand in between. Digit
+positions are expressed as fractions of the travel range, from 0 (fully
+open) to 1 (fully closed); for the thumb rotator, 0 is lateral and 1 is
+palmar.
+
+The ordering encoded in ``RoboLimbCAN.open_all`` and
+``RoboLimbCAN.close_all`` is respected: when the rotator moves, opening
+digits (including the thumb, which has to clear the fingers) lead the
+rotator, and closing digits follow it.
+"""
+
+import collections
+import time
+
+from .robolimb import ACTIONS, N_DOF
+from .state import Status
+
+Grip = collections.namedtuple('Grip', ['preshape', 'grasp'])
+Grip.__doc__ = """Grip definition.
+
+preshape : dict
+    Target position per finger ID. Digits that are not listed are left
+    unchanged.
+grasp : dict
+    Action per finger ID executed after the pre-shape to grasp an object.
+"""
+
+Step = collections.namedtuple('Step', ['time', 'finger', 'action',
+                                       'velocity'])
+Plan = collections.namedtuple('Plan', ['steps', 'duration', 'target'])
+
+_OPEN, _CLOSE, _STOP = ACTIONS['open'], ACTIONS['close'], ACTIONS['stop']
+
+# Pre-shapes and grasps of examples/grips.py, starting from an open hand
+GRIPS = {
+    'open': Grip({1: 0., 2: 0., 3: 0., 4: 0., 5: 0.}, {}),
+    'cylindrical': Grip({1: 0., 2: 0., 3: 0., 4: 0., 5: 0., 6: 1.},
+                        {1: _CLOSE, 2: _CLOSE, 3: _CLOSE, 4: _CLOSE,
+                         5: _CLOSE}),
+    'lateral': Grip({1: 0., 2: 1., 3: 1., 4: 1., 5: 1., 6: 0.},
+                    {1: _CLOSE}),
+    'tripod': Grip({1: 0., 2: 0., 3: 0., 4: 1., 5: 1., 6: 1.},
+                   {1: _CLOSE, 2: _CLOSE, 3: _CLOSE}),
+    'tripod_ext': Grip({1: 0., 2: 0., 3: 0., 4: 0., 5: 0., 6: 1.},
+                       {1: _CLOSE, 2: _CLOSE, 3: _CLOSE}),
+    'pinch': Grip({1: 0., 2: 0., 3: 1., 4: 1., 5: 1., 6: 0.9},
+                  {1: _CLOSE, 2: _CLOSE, 3: _CLOSE}),
+    'pinch_ext': Grip({1: 0., 2: 0., 3: 0., 4: 0., 5: 0., 6: 0.9},
+                      {1: _CLOSE, 2: _CLOSE}),
+    'pointer': Grip({1: 0., 2: 0., 6: 0.},
+                    {1: _CLOSE, 3: _CLOSE, 4: _CLOSE, 5: _CLOSE}),
+    'thumbs_up': Grip({1: 1., 2: 1., 3: 1., 4: 1., 5: 1., 6: 0.},
+                      {1: _OPEN}),
+    'horns': Grip({1: 0., 2: 0., 6: 0.},
+                  {1: _CLOSE, 3: _CLOSE, 4: _CLOSE})
+}
+
+# Positions closer than this are considered equal
+TOLERANCE = 0.05
+
+
+def configuration(state):
+    """Estimates digit positions from a hand state.
+
+    Parameters
+    ----------
+    state : HandState
+        Hand state.
+
+    Returns
+    -------
+    positions : dict
+        Position per finger ID. Only digits stalled at either end have a
+        known position; all others are ``None``.
+    """
+    positions = {}
+    for f in range(1, N_DOF + 1):
+        code = state.status[f - 1]
+        if code == Status.STALLED_OPEN:
+            positions[f] = 0.
+        elif code == Status.STALLED_CLOSE:
+            positions[f] = 1.
+        else:
+            positions[f] = None
+    return positions
+
+
+class GripPlanner(object):
+    """ Plans and executes direct transitions between grips.
+
+    Parameters
+    ----------
+    hand : RoboLimbCAN
+        Hand connection.
+    velocity : int, optional (default: None)
+        Velocity used for all commands. If not provided, the default
+        velocity of the hand will be used.
+    grips : dict, optional (default: None)
+        Grip definitions. If not provided, ``GRIPS`` is used.
+    travel_time : callable, optional (default: None)
+        Function of ``(finger, action, velocity)`` returning the full travel
+        time of a digit in seconds. If not provided, the timing profile of
+        the hand is used.
+    cache_size : int, optional (default: 256)
+        Maximum number of cached plans.
+
+    Attributes
+    ----------
+    positions_ : dict
+        Digit positions reached by the last executed plan.
+    """
+
+    def __init__(self, hand, velocity=None, grips=None, travel_time=None,
+                 cache_size=256):
+        self.hand = hand
+        self.velocity = hand.def_vel if velocity is None else int(velocity)
+        self.grips = GRIPS if grips is None else grips
+        self.travel_time = travel_time
+        self.cache_size = cache_size
+        self.positions_ = {}
+        self.__cache = collections.OrderedDict()
+
+    def configuration(self, max_age=None):
+        """Returns the estimated digit positions.
+
+        Digits stalled at either end take their position from the feedback.
+        Other digits keep the position reached by the last executed plan, as
+        long as their status is ``stop``.
+
+        Parameters
+        ----------
+        max_age : float, optional (default: None)
+            Maximum age (in seconds) of the cached status. If not provided,
+            the ``max_age`` attribute of the hand is used.
+        """
+        state = self.hand.get_state(max_age)
+        positions = configuration(state)
+        for f, pos in positions.items():
+            if pos is None and state.status[f - 1] == Status.STOP:
+                positions[f] = self.positions_.get(f)
+        return positions
+
+    def plan(self, grip, source, grasp=False):
+        """Computes the commands that take the hand from ``source`` to
+        ``grip``.
+
+        Parameters
+        ----------
+        grip : str
+            Target grip.
+        source : dict
+            Position per finger ID, ``None`` for unknown positions.
+        grasp : boolean, optional (default: False)
+            If ``True``, the grasp phase is appended to the pre-shape.
+
+        Returns
+        -------
+        plan : Plan
+            Named tuple of steps, total duration in seconds and target
+            positions. Each step holds the time of the command relative to
+            the start of the plan, finger ID, action and velocity.
+        """
+        if grip not in self.grips:
+            raise ValueError("The specified grip is invalid.")
+        profile = self.hand.profile_
+        key = (tuple(None if source.get(f) is None else round(source[f], 2)
+                     for f in range(1, N_DOF + 1)), grip, grasp, id(profile))
+        try:
+            self.__cache.move_to_end(key)
+            return self.__cache[key]
+        except KeyError:
+            pass
+        plan = self.__plan(self.grips[grip], source, grasp, profile)
+        self.__cache[key] = plan
+        if len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last=False)
+        return plan
+
+    def execute(self, grip, grasp=False, wait=True, max_age=None):
+        """Moves the hand directly into a grip.
+
+        Parameters
+        ----------
+        grip : str
+            Target grip.
+        grasp : boolean, optional (default: False)
+            If ``True``, the grasp phase is executed after the pre-shape.
+        wait : boolean, optional (default: True)
+            If ``True``, blocks until the plan is expected to be complete.
+        max_age : float, optional (default: None)
+            Maximum age (in seconds) of the cached status used to estimate
+            the current configuration.
+
+        Returns
+        -------
+        plan : Plan
+            Executed plan.
+        """
+        with self.hand.trace_span('grip ' + grip):
+            plan = self.plan(grip, self.configuration(max_age), grasp)
+            return self.run(plan, wait)
+
+    def run(self, plan, wait=True):
+        """Issues the commands of a plan.
+
+        Parameters
+        ----------
+        plan : Plan
+            Plan, e.g. as returned by ``plan`` or by
+            ``robolimb.optimizer.optimize``.
+        wait : boolean, optional (default: True)
+            If ``True``, blocks until the plan is expected to be complete.
+
+        Returns
+        -------
+        plan : Plan
+            Executed plan.
+        """
+        commands = {_OPEN: self.hand.open_finger,
+                    _CLOSE: self.hand.close_finger}
+        with self.hand.trace_span('issue'):
+            for step in plan.steps:
+                if step.action == _STOP:
+                    self.hand.stop_finger(step.finger, delay=step.time)
+                else:
+                    commands[step.action](step.finger, step.velocity,
+                                          delay=step.time)
+        self.positions_.update(plan.target)
+        if wait:
+            with self.hand.trace_span('wait'):
+                time.sleep(plan.duration)
+        return plan
+
+    def __plan(self, grip, source, grasp, profile):
+        """Computes a plan. See ``plan``."""
+        self.__travel_time = profile.travel_time if self.travel_time is None \
+            else self.travel_time
+        steps = []
+        target = dict(grip.preshape)
+        moves = {f: q for f, q in target.items()
+                 if not _reached(source.get(f), q)}
+
+        rotator_moves = N_DOF in moves
+        # The thumb has to be clear of the fingers while the rotator moves
+        clear_thumb = rotator_moves and source.get(1) != 0.
+        opening = [f for f, q in moves.items()
+                   if f != N_DOF and _direction(source.get(f), q) == _OPEN]
+        t_rotator = t_closing = 0.
+        if rotator_moves:
+            delay = profile.rotator_delay(
+                _direction(source.get(N_DOF), moves[N_DOF]), self.velocity)
+            if opening or clear_thumb:
+                t_rotator = delay
+            t_closing = t_rotator + delay
+
+        duration = 0.
+        if clear_thumb and 1 not in opening:
+            # Open the thumb first and close it again after the rotator
+            steps.append(Step(0., 1, _OPEN, self.velocity))
+            source = dict(source)
+            source[1] = 0.
+            q = target.setdefault(1, 0.)
+            if _reached(0., q):
+                moves.pop(1, None)
+            else:
+                moves[1] = q
+        for f, q in sorted(moves.items()):
+            if f == N_DOF:
+                start = t_rotator
+            elif _direction(source.get(f), q) == _OPEN:
+                start = 0.
+            else:
+                start = t_closing
+            end = self.__move(steps, f, source.get(f), q, start)
+            duration = max(duration, end)
+
+        if grasp:
+            start = duration
+            for f, action in sorted(grip.grasp.items()):
+                steps.append(Step(start, f, action, self.velocity))
+                end = start + self.__travel_time(f, action, self.velocity)
+                duration = max(duration, end)
+                target[f] = 1. if action == _CLOSE else 0.
+
+        steps.sort(key=lambda s: (s.time, s.finger))
+        return Plan(steps, duration, target)
+
+    def __move(self, steps, finger, p, q, start):
+        """Appends the steps moving a digit from ``p`` to ``q`` and returns
+        the time at which the digit is expected to arrive."""
+        v = self.velocity
+        if p is None and q not in (0., 1.):
+            # Unknown position: go to the nearest end first
+            end = round(q)
+            action = _CLOSE if end == 1. else _OPEN
+            steps.append(Step(start, finger, action, v))
+            start += self.__travel_time(finger, action, v)
+            p = end
+        action = _direction(p, q)
+        steps.append(Step(start, finger, action, v))
+        travel = self.__travel_time(finger, action, v)
+        if q in (0., 1.):
+            return start + travel * (1. if p is None else abs(q - p))
+        end = start + travel * abs(q - p)
+        steps.append(Step(end, finger, _STOP, v))
+        return end
+
+
+def _reached(p, q):
+    """Returns ``True`` if position ``p`` is within tolerance of ``q``."""
+    return p is not None and abs(p - q) < TOLERANCE
+
+
+def _direction(p, q):
+    """Returns the action moving a digit from ``p`` towards ``q``."""
+    if p is None:
+        return _CLOSE if q >= 0.5 else _OPEN
+    return _CLOSE if q > p else _OPEN
@@ -0,0 +1,142 @@
+""" Per-device timing profiles.
+
+A profile holds a travel-time model per digit and direction,
+
+    t(velocity) = a + b / velocity,
+
+where ``t`` is the time in seconds for a full travel from one end to the
+other. Profiles are measured with ``robolimb.calibration.calibrate`` and
+stored as JSON files named after the device serial number.
+"""
+
+import json
+import os
+
+from .state import N_DOF
+
+PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.robolimb', 'profiles')
+
+# Action codes as in ``ACTIONS``
+_CLOSE = 1
+_OPEN = 2
+
+# Full travel times in seconds at velocity 297 assumed without calibration
+DEFAULT_TRAVEL_TIME = {1: 1., 2: 1., 3: 1., 4: 1., 5: 1., 6: 1.3}
+
+# Fraction of the rotator travel after which the fingers can follow it. With
+# the default travel time, this gives 0.5 s at velocity 297.
+ROTATOR_DELAY_FRACTION = 0.5 / DEFAULT_TRAVEL_TIME[N_DOF]
+
+
+def profile_path(serial, directory=None):
+    """Returns the path of the profile file of a device."""
+    directory = PROFILE_DIR if directory is None else directory
+    return os.path.join(directory, '{}.json'.format(serial))
+
+
+class DeviceProfile(object):
+    """ Travel-time model of a device.
+
+    Parameters
+    ----------
+    serial : str, optional (default: None)
+        Device serial number.
+    coefficients : dict, optional (default: None)
+        Coefficients ``(a, b)`` per ``(finger, action)`` pair, where
+        ``action`` is the action code (1: close, 2: open). Missing pairs use
+        the default model.
+    """
+
+    def __init__(self, serial=None, coefficients=None):
+        self.serial = serial
+        self.coefficients = {}
+        for finger in range(1, N_DOF + 1):
+            for action in (_CLOSE, _OPEN):
+                self.coefficients[(finger, action)] = (
+                    0., DEFAULT_TRAVEL_TIME[finger] * 297.)
+        if coefficients is not None:
+            self.coefficients.update(coefficients)
+
+    def travel_time(self, finger, action, velocity):
+        """Returns the full travel time of a digit.
+
+        Parameters
+        ----------
+        finger : int
+            Finger ID.
+        action : int
+            Action code (1: close, 2: open).
+        velocity : int
+            Velocity. Allowed range is (10,297).
+
+        Returns
+        -------
+        time : float
+            Travel time in seconds.
+        """
+        a, b = self.coefficients[(finger, action)]
+        return a + b / velocity
+
+    def rotator_delay(self, action, velocity):
+        """Returns the delay in seconds between thumb rotator and finger
+        commands when moving all digits at the specified velocity."""
+        return ROTATOR_DELAY_FRACTION * self.travel_time(N_DOF, action,
+                                                         velocity)
+
+    def to_dict(self):
+        """Returns the profile as a JSON-serializable dictionary."""
+        return {
+            'serial': self.serial,
+            'coefficients': [[f, action, a, b] for (f, action), (a, b)
+                             in sorted(self.coefficients.items())]
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """Creates a profile from a dictionary created by ``to_dict``."""
+        coefficients = {(int(f), int(action)): (float(a), float(b))
+                        for f, action, a, b in d['coefficients']}
+        return cls(d.get('serial'), coefficients)
+
+    def save(self, directory=None):
+        """Writes the profile to the profile file of the device.
+
+        Parameters
+        ----------
+        directory : str, optional (default: None)
+            Profile directory. If not provided, ``PROFILE_DIR`` is used.
+
+        Returns
+        -------
+        path : str
+            Path of the written file.
+        """
+        if self.serial is None:
+            raise ValueError("Cannot save a profile without serial number.")
+        path = profile_path(self.serial, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+def load_profile(serial, directory=None):
+    """Loads the profile of a device.
+
+    Parameters
+    ----------
+    serial : str
+        Device serial number.
+    directory : str, optional (default: None)
+        Profile directory. If not provided, ``PROFILE_DIR`` is used.
+
+    Returns
+    -------
+    profile : DeviceProfile or None
+        Device profile, or ``None`` if the device has not been calibrated.
+    """
+    path = profile_path(serial, directory)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return DeviceProfile.from_dict(json.load(f))
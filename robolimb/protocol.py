@@ -0,0 +1,113 @@
+""" Vectorized decoding of robo-limb CAN frames.
+
+Refer to the robo-limb manual for the message formats. Motor commands are
+sent with IDs 0x101-0x106 and feedback is received with IDs 0x401-0x406, one
+per digit. The serial number response shares ID 0x402 with feedback; it is
+told apart by its second byte, which is not a valid status code. The
+functions below decode arrays of frames at once, such that recorded traffic
+can be processed without one Python object per frame.
+"""
+
+import numpy as np
+
+from .state import N_DOF, Status
+
+COMMAND_BASE_ID = 0x100
+FEEDBACK_BASE_ID = 0x400
+
+# See p. 11 of robo-limb manual for conversion to Amps
+CURRENT_SCALE = 21.825
+
+MAX_STATUS = int(max(Status))
+
+# Frame direction
+RX = 0
+TX = 1
+
+DECODED_DTYPE = np.dtype([
+    ('finger', np.int8),
+    ('status', np.int8),
+    ('current', np.float32),
+    ('edge', np.int8),
+    ('action', np.int8),
+    ('velocity', np.int16)
+])
+
+
+def current_amps(high, low):
+    """Returns the motor current in Amps from the two current bytes of a
+    feedback message."""
+    return ((high << 8) | low) / CURRENT_SCALE
+
+
+def is_feedback(ids, data=None):
+    """Returns a mask of feedback frames.
+
+    Parameters
+    ----------
+    ids : array-like, shape (n_frames,)
+        CAN IDs.
+    data : array-like, shape (n_frames, >=2), optional (default: None)
+        CAN data bytes. If provided, frames whose status byte is not a valid
+        status code (i.e. query responses) are excluded.
+    """
+    ids = np.asarray(ids)
+    mask = (ids > FEEDBACK_BASE_ID) & (ids <= FEEDBACK_BASE_ID + N_DOF)
+    if data is not None:
+        mask &= np.asarray(data)[:, 1] <= MAX_STATUS
+    return mask
+
+
+def is_command(ids):
+    """Returns a mask of motor command frames."""
+    ids = np.asarray(ids)
+    return (ids > COMMAND_BASE_ID) & (ids <= COMMAND_BASE_ID + N_DOF)
+
+
+def decode(ids, data, direction=None):
+    """Decodes arrays of CAN frames.
+
+    Parameters
+    ----------
+    ids : array-like, shape (n_frames,)
+        CAN IDs.
+    data : array-like, shape (n_frames, >=4)
+        CAN data bytes.
+    direction : array-like, shape (n_frames,), optional (default: None)
+        Frame direction (``RX`` or ``TX``). If provided, feedback is only
+        decoded for received frames and commands only for transmitted ones.
+
+    Returns
+    -------
+    decoded : numpy.ndarray
+        Structured array with fields ``finger``, ``status``, ``current``,
+        ``edge``, ``action`` and ``velocity``. Fields that do not apply to a
+        frame are -1 (NaN for ``current``).
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    data = np.asarray(data, dtype=np.int64)
+    out = np.empty(ids.shape[0], dtype=DECODED_DTYPE)
+    out['finger'] = -1
+    out['status'] = -1
+    out['current'] = np.nan
+    out['edge'] = -1
+    out['action'] = -1
+    out['velocity'] = -1
+
+    fb = is_feedback(ids, data)
+    cmd = is_command(ids)
+    if direction is not None:
+        direction = np.asarray(direction)
+        fb &= direction == RX
+        cmd &= direction == TX
+
+    out['finger'][fb] = ids[fb] - FEEDBACK_BASE_ID
+    out['status'][fb] = data[fb, 1]
+    out['current'][fb] = current_amps(data[fb, 2], data[fb, 3])
+    rot = fb & (ids == FEEDBACK_BASE_ID + N_DOF)
+    out['edge'][rot] = data[rot, 0] != 0
+
+    out['finger'][cmd] = ids[cmd] - COMMAND_BASE_ID
+    out['action'][cmd] = data[cmd, 1]
+    out['velocity'][cmd] = (data[cmd, 2] << 8) | data[cmd, 3]
+    return out
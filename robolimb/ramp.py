@@ -0,0 +1,125 @@
+""" Velocity ramp profiles streamed to the digits.
+
+A motor command sets the velocity of a digit at once. A ramp instead
+re-issues the same motor command at a fixed update rate with a velocity that
+changes gradually, either linearly or along an S-curve whose acceleration is
+zero at both ends. Profiles of all six digits are computed at once into a
+frame schedule: a ``robolimb.teach.Trajectory`` holding one command per
+digit and update, where the velocity actually changes.
+
+Schedules are played back with ``robolimb.teach.replay``, i.e. through the
+command scheduler thread, which reports the write time of every command
+against the schedule.
+"""
+
+import numpy as np
+
+from .robolimb import ACTIONS
+from .state import N_DOF
+from .teach import MAX_VELOCITY, MIN_VELOCITY, TRAJECTORY_DTYPE, Trajectory
+
+SHAPES = ('linear', 'scurve')
+
+
+def ramp_shape(u, shape='scurve'):
+    """Maps normalized time to normalized velocity change.
+
+    Parameters
+    ----------
+    u : numpy.ndarray
+        Normalized time, between 0 and 1.
+    shape : str, optional (default: 'scurve')
+        ``'linear'``, or ``'scurve'`` for a quintic whose first and second
+        derivatives vanish at both ends.
+
+    Returns
+    -------
+    s : numpy.ndarray
+        Normalized velocity change, between 0 and 1.
+    """
+    if shape == 'linear':
+        return u
+    if shape == 'scurve':
+        return u ** 3 * (10. - 15. * u + 6. * u ** 2)
+    raise ValueError("Shape must be one of {}.".format(SHAPES))
+
+
+def ramp(actions, start_velocity=MIN_VELOCITY, end_velocity=MAX_VELOCITY,
+         duration=0.5, rate=50., shape='scurve'):
+    """Computes the frame schedule of velocity ramps.
+
+    Velocities can be given per digit, such that digits ramp up and down
+    concurrently with different profiles. Velocities below ``MIN_VELOCITY``
+    (10) are raised to it, except an end velocity of 0, which stops the
+    digit at the end of its ramp.
+
+    Parameters
+    ----------
+    actions : dict
+        Action (``'open'`` or ``'close'``) per finger ID.
+    start_velocity, end_velocity : int or array-like, optional
+        Velocity at the start and end of the ramps, per digit if an array
+        of length 6 (default: 10 and 297).
+    duration : float or array-like, optional (default: 0.5)
+        Duration of the ramps in seconds, per digit if an array of length 6.
+    rate : float, optional (default: 50.)
+        Number of velocity updates per second.
+    shape : str, optional (default: 'scurve')
+        Profile shape, see ``ramp_shape``.
+
+    Returns
+    -------
+    schedule : Trajectory
+        Commands sorted by time, then finger. The end velocity of each digit
+        is sent at the end of its ramp.
+    """
+    if rate <= 0:
+        raise ValueError("The update rate must be positive.")
+    active = np.zeros(N_DOF, dtype=bool)
+    action = np.zeros(N_DOF, dtype=np.int8)
+    for finger, name in actions.items():
+        if name not in ('open', 'close'):
+            raise ValueError("Ramps are only defined for 'open' and 'close'.")
+        active[finger - 1] = True
+        action[finger - 1] = ACTIONS[name]
+    start = np.broadcast_to(np.asarray(start_velocity, float), N_DOF)
+    end = np.broadcast_to(np.asarray(end_velocity, float), N_DOF)
+    duration = np.broadcast_to(np.asarray(duration, float), N_DOF)
+    if np.any(duration[active] <= 0):
+        raise ValueError("Ramp durations must be positive.")
+    duration = np.where(active, duration, 1.)
+
+    # Update ticks until the end of the longest ramp; the first tick at or
+    # after the end of a ramp is moved to its end
+    n = int(np.ceil(duration[active].max() * rate - 1e-9)) + 1 \
+        if active.any() else 0
+    t = np.arange(n) / rate
+    t_digit = np.minimum(t[:, None], duration[None, :])
+    velocity = start + (end - start) * ramp_shape(t_digit / duration, shape)
+    velocity = np.clip(np.rint(velocity), MIN_VELOCITY,
+                       MAX_VELOCITY).astype(np.int16)
+
+    # Only send an update when the velocity changes, and none after the end
+    # of each ramp
+    changed = np.ones_like(velocity, dtype=bool)
+    changed[1:] = velocity[1:] != velocity[:-1]
+    send = changed & (t[:, None] - 1. / rate < duration[None, :] - 1e-9) & \
+        active
+    tick, digit = np.nonzero(send)
+
+    stop = active & (end == 0)
+    n_cmds = len(tick) + int(stop.sum())
+    commands = np.empty(n_cmds, dtype=TRAJECTORY_DTYPE)
+    commands['time'][:len(tick)] = t_digit[tick, digit]
+    commands['finger'][:len(tick)] = digit + 1
+    commands['action'][:len(tick)] = action[digit]
+    commands['velocity'][:len(tick)] = velocity[tick, digit]
+    stopped = np.flatnonzero(stop)
+    commands['time'][len(tick):] = duration[stopped]
+    commands['finger'][len(tick):] = stopped + 1
+    commands['action'][len(tick):] = ACTIONS['stop']
+    commands['velocity'][len(tick):] = 0
+    # Stops come after the last velocity update of their digit
+    order = np.lexsort((commands['action'] == ACTIONS['stop'],
+                        commands['finger'], commands['time']))
+    return Trajectory(commands[order])
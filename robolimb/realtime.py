@@ -0,0 +1,121 @@
+""" Real-time scheduling policy for the internal threads.
+
+On loaded controllers, threads running at normal priority are delayed by
+other processes, and all Python threads are paused by garbage collections.
+A ``RealtimePolicy`` is applied by each internal thread (command scheduler,
+receive thread, control loops) when it starts:
+
+* CPU affinity pins the thread to dedicated cores,
+* ``SCHED_FIFO`` gives it precedence over normal processes,
+* the garbage collector is frozen once the connection is set up, such that
+  long-lived objects are no longer scanned, and can be disabled for the
+  duration of control loops.
+
+Each setting is optional and is skipped, rather than raising an error, when
+the platform does not support it or the process lacks the privileges (e.g.
+``CAP_SYS_NICE`` for ``SCHED_FIFO``). The settings that could not be applied
+are reported in ``errors_``.
+"""
+
+import contextlib
+import gc
+import os
+import threading
+
+
+class RealtimePolicy(object):
+    """ Scheduling policy of the internal threads.
+
+    Parameters
+    ----------
+    cpus : sequence of int, optional (default: None)
+        CPU cores the threads are pinned to. If not provided, the affinity
+        is left unchanged.
+    priority : int, optional (default: None)
+        ``SCHED_FIFO`` priority (1-99). If not provided, the threads keep the
+        default scheduling policy.
+    gc_freeze : boolean, optional (default: True)
+        If ``True``, all objects existing when the connection is started are
+        moved to the permanent generation of the garbage collector.
+    gc_disable : boolean, optional (default: True)
+        If ``True``, the garbage collector is disabled while control loops
+        (``critical`` blocks) run.
+
+    Attributes
+    ----------
+    applied_ : dict
+        Settings applied per thread name.
+    errors_ : dict
+        Reason per setting that could not be applied.
+    """
+
+    def __init__(self, cpus=None, priority=None, gc_freeze=True,
+                 gc_disable=True):
+        self.cpus = cpus
+        self.priority = priority
+        self.gc_freeze = gc_freeze
+        self.gc_disable = gc_disable
+        self.applied_ = {}
+        self.errors_ = {}
+        self.__lock = threading.Lock()
+        self.__critical = 0
+        self.__gc_was_enabled = False
+
+    def apply(self):
+        """Applies the policy to the calling thread.
+
+        Returns
+        -------
+        applied : list of str
+            Settings that were applied.
+        """
+        applied = []
+        if self.cpus is not None:
+            try:
+                # On Linux, pid 0 refers to the calling thread
+                os.sched_setaffinity(0, self.cpus)
+                applied.append('affinity')
+            except (AttributeError, OSError, ValueError) as e:
+                self.errors_['affinity'] = str(e) or type(e).__name__
+        if self.priority is not None:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO,
+                                      os.sched_param(self.priority))
+                applied.append('fifo')
+            except (AttributeError, OSError, ValueError) as e:
+                self.errors_['fifo'] = str(e) or type(e).__name__
+        with self.__lock:
+            self.applied_[threading.current_thread().name] = applied
+        return applied
+
+    def freeze(self):
+        """Collects garbage and freezes all existing objects, if enabled.
+        Called once the connection is set up."""
+        if not self.gc_freeze:
+            return
+        if not hasattr(gc, 'freeze'):
+            self.errors_['gc_freeze'] = "Requires Python >= 3.7."
+            return
+        gc.collect()
+        gc.freeze()
+
+    @contextlib.contextmanager
+    def critical(self):
+        """Context manager disabling the garbage collector, if enabled,
+        while a control loop runs. Blocks may be nested and used from
+        several threads; the collector is restored after the last one."""
+        if not self.gc_disable:
+            yield
+            return
+        with self.__lock:
+            if self.__critical == 0:
+                self.__gc_was_enabled = gc.isenabled()
+                gc.disable()
+            self.__critical += 1
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.__critical -= 1
+                if self.__critical == 0 and self.__gc_was_enabled:
+                    gc.enable()
@@ -1,12 +1,33 @@
+import contextlib
+import queue
 import threading
+import time
+from collections import namedtuple
+
+import numpy as np
 
 from can.interfaces.pcan.basic import (PCANBasic, PCAN_USBBUS1, PCAN_BAUD_1M,
                                        PCAN_TYPE_ISA, PCAN_ERROR_QRCVEMPTY,
                                        PCAN_ERROR_OK, TPCANMsg,
-                                       PCAN_MESSAGE_STANDARD)
+                                       PCAN_MESSAGE_STANDARD,
+                                       PCAN_MODE_STANDARD)
+
+from .assembler import FeedbackAssembler
+from .clock import HardwareClock, hw_seconds
+from .connection import Outage, backoff as backoff_delays, is_failure
+from .drain import BulkReader, frame_buffer, frame_hw_seconds
+from .events import EventDispatcher
+from .latency import ACTION_NAMES, LatencyCorrelator
+from .link import measure as measure_link, tune as tune_link
+from .profile import DeviceProfile, load_profile
+from .protocol import (COMMAND_BASE_ID, FEEDBACK_BASE_ID, MAX_STATUS, RX,
+                       TX, current_amps, decode, is_feedback)
+from .scheduler import CommandScheduler
+from .state import (N_DOF, Status, HandState, OPEN_DONE, CLOSE_DONE,
+                    STOP_DONE)
+from .trace import RECEIVE, SCHEDULER, Tracer
 
 # Refer to robo-limb manual for definition of number codes below
-N_DOF = 6
 FINGERS = {
     'thumb': 1,
     'index': 2,
@@ -22,13 +43,16 @@ ACTIONS = {
     'open': 2
 }
 
-STATUS = {
-    0: 'stop',
-    1: 'closing',
-    2: 'opening',
-    3: 'stalled close',
-    4: 'stalled open'
-}
+DRAIN_BUFFER_SIZE = 1024
+RESYNC_TIMEOUT = 1.
+PROBE_DURATION = 0.25
+PROBE_QUERIES = 5
+PROBE_QUERY_TIMEOUT = 0.1
+
+STATUS = {s.value: s.label for s in Status}
+
+Feedback = namedtuple(
+    'Feedback', ['finger_id', 'status', 'thumb_edge', 'current', 'timestamp'])
 
 QUICK_GRIPS = {
     'normal': '00',
@@ -64,6 +88,33 @@ class RoboLimbCAN(object):
         CAN input-output port.
     interrupt : int, optional (default: 3)
         CAN interrupt handler.
+    max_age : float, optional (default: 0.)
+        Maximum age in seconds of the cached digit status used by the status
+        properties and by finger commands with ``update=True``. The bus is
+        only queried when the cached status is older. With the default, the
+        status is queried on every access.
+    profile : DeviceProfile or str or None, optional (default: 'auto')
+        Timing profile of the device. With ``'auto'``, the profile stored
+        under the device serial number is loaded on ``start()``, if the
+        device has been calibrated. With ``None``, default timings are used.
+    realtime : RealtimePolicy, optional (default: None)
+        Scheduling policy (CPU affinity, ``SCHED_FIFO`` priority, garbage
+        collection) applied to the internal threads. See
+        ``robolimb.realtime``.
+    bus_class : callable, optional (default: PCANBasic)
+        Class implementing the ``PCANBasic`` interface, instantiated on
+        ``start()``. For instance, ``robolimb.simulator.SimulatedBus`` runs
+        the connection against a simulated hand.
+    cycle_timeout : float, optional (default: 0.1)
+        Maximum time in seconds to wait for feedback from every digit when
+        the status is queried. Digits that do not report in time keep their
+        cached status.
+    query_timeout : float, optional (default: None)
+        Maximum time in seconds to wait for query responses when no timeout
+        is given. With the default, queries wait indefinitely.
+    schedule_lead : float, optional (default: 0.05)
+        Time in seconds between scheduling commands with
+        ``robolimb.teach.replay`` and the first one being due.
 
     Attributes
     ----------
@@ -73,11 +124,46 @@ class RoboLimbCAN(object):
         Finger currents.
     rotator_edge_ : bool
         ``True`` when rotator is fully palmar or lateral.
+    finger_timestamp_ : list
+        Hardware receive time of the latest feedback per digit.
+    finger_age_ : list
+        Age in seconds of the cached status per digit.
     is_moving_ : bool
         ``True`` if at least one digit is opening or closing.
+    state_ : HandState
+        Hand state with integer status codes.
+    profile_ : DeviceProfile
+        Timing profile in use, loaded on ``start()`` for calibrated devices.
+    stop_latency_ : dict
+        Enqueue-to-wire latency statistics of stop commands.
+    tracing_ : bool
+        ``True`` while a timeline is recorded, see ``trace``.
+    command_latency_ : dict
+        Latency from each motor command to the first feedback reflecting it,
+        per digit and action.
+    frame_counts_ : numpy.ndarray
+        Number of frames received per digit, indexed by finger ID. Index 0
+        counts all other frames.
+    pending_commands_ : int
+        Number of queued and scheduled commands.
+    shed_frames_ : int
+        Number of feedback frames discarded in favor of newer frames of the
+        same digit.
+    connected_ : bool
+        ``False`` from the detection of an adapter or bus failure until the
+        connection is restored.
+    outages_ : list of Outage
+        Failures recovered from by ``reconnect``, with their downtime.
+    link_ : LinkProfile or None
+        Link characteristics measured by ``start(probe=True)``, see
+        ``robolimb.link``.
 
     Notes
     -----
+    All commands are written by a single scheduler thread. Stop commands
+    cancel any pending or delayed command for the same digits and are sent
+    ahead of all other commands.
+
     There seems to be an issue with the current values provided by the hand.
     """
 
@@ -87,34 +173,116 @@ class RoboLimbCAN(object):
                  b_rate=PCAN_BAUD_1M,
                  hw_type=PCAN_TYPE_ISA,
                  io_port=0x3BC,
-                 interrupt=3):
+                 interrupt=3,
+                 max_age=0.,
+                 profile='auto',
+                 realtime=None,
+                 bus_class=PCANBasic,
+                 cycle_timeout=0.1,
+                 query_timeout=None,
+                 schedule_lead=0.05):
+        self.__started = False
         self.def_vel = def_vel
         self.channel = channel
         self.b_rate = b_rate
         self.hw_type = hw_type
         self.io_port = io_port
         self.interrupt = interrupt
+        self.max_age = max_age
+        self.profile = profile
+        self.profile_ = profile if isinstance(profile, DeviceProfile) \
+            else DeviceProfile()
+        self.realtime = realtime
+        self.bus_class = bus_class
+        self.cycle_timeout = cycle_timeout
+        self.query_timeout = query_timeout
+        self.schedule_lead = schedule_lead
+        self.link_ = None
+
+        self.__state = HandState()
+        self.__clock = HardwareClock()
+        self.__state_writer = None
+        self.__recorder = None
+        self.__teacher = None
+        self.__tracer = None
+        self.__trace_status = None
+        self.__events = EventDispatcher()
+        self.__listener = None
+        self.__listening = False
+        self.__responses = queue.Queue(maxsize=16)
+        self.__frames = frame_buffer(DRAIN_BUFFER_SIZE)
+        self.__assembler = FeedbackAssembler(cycle_timeout)
+        self.__drain_lock = threading.Lock()
+        self.__frame_counts = np.zeros(N_DOF + 1, dtype=np.int64)
+        self.__latency = LatencyCorrelator()
+        self.__filters = []
+        self.__grip = None
+        self.__failure = None
+        self.__failure_lock = threading.Lock()
+        self.__failed = threading.Event()
+        self.__reconnect_lock = threading.Lock()
+        self.__halt = threading.Event()
+        self.__supervisor = None
+        self.outages_ = []
+
+    def start(self, probe=False):
+        """Starts the CAN BUS connection.
 
-        self.__finger_status = [None] * N_DOF
-        self.__finger_current = [None] * N_DOF
-        self.__rotator_edge = None
-
-    def start(self):
-        """Starts the CAN BUS connection."""
-        self.bus = PCANBasic()
-        self.bus.Initialize(
-            Channel=self.channel,
-            Btr0Btr1=self.b_rate,
-            HwType=self.hw_type,
-            IOPort=self.io_port,
-            Interrupt=self.interrupt)
+        Parameters
+        ----------
+        probe : boolean or float, optional (default: False)
+            When set to ``True``, the feedback period, query round-trip time
+            and write latency are measured during ``PROBE_DURATION`` seconds,
+            or during the given number of seconds, and stored in ``link_``.
+            ``cycle_timeout``, ``max_age``, ``query_timeout`` and
+            ``schedule_lead`` are then derived from them, see
+            ``robolimb.link.tune``.
+        """
+        self.__clock.reset()
+        self.bus = self.bus_class()
+        self.__started = True
+        self.__check(self.__initialize())
+        self.__reader = BulkReader(self.bus, self.channel)
+        self.__scheduler = CommandScheduler(
+            self.__write, None if self.realtime is None
+            else self.realtime.apply)
+        self.__scheduler.tracer = self.__tracer
+        self.__scheduler.start()
+        if probe is not False:
+            self.link_ = self.__probe(
+                PROBE_DURATION if probe is True else float(probe))
+            for name, value in tune_link(self.link_).items():
+                setattr(self, name, value)
+            self.__assembler.timeout = self.cycle_timeout
+        if self.profile == 'auto':
+            serial = self.get_serial_number(
+                timeout=1. if self.query_timeout is None
+                else self.query_timeout)
+            profile = None if serial is None else load_profile(serial)
+            if profile is not None:
+                self.profile_ = profile
+        if self.realtime is not None:
+            self.realtime.freeze()
 
     def stop(self):
         """Stops reading incoming CAN messages and shuts down the
         connection."""
+        if not self.__started:
+            return
+        self.__started = False
+        self.stop_supervising()
+        self.stop_listening()
+        self.__events.close()
+        with self.__drain_lock:
+            if self.__state_writer is not None:
+                self.__state_writer.close()
+                self.__state_writer = None
+        self.__scheduler.stop()
+        self.stop_recording()
         self.bus.Uninitialize(Channel=self.channel)
 
-    def open_finger(self, finger, velocity=None, force=True, update=True):
+    def open_finger(self, finger, velocity=None, force=True, update=True,
+                    delay=0.):
         """Opens digit at specified velocity.
 
         Parameters
@@ -127,29 +295,36 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``opening`` or ``stalled
             open``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
+        delay : float, optional (default: 0.)
+            Time in seconds after which the command is sent.
+
+        Returns
+        -------
+        command : Command or None
+            Handle of the queued command, ``None`` if it was not sent.
         """
         velocity = self.def_vel if velocity is None else int(velocity)
         finger = self.__get_finger_id(finger)
         if force:
             send_command = True
         else:
-            if update:
-                self.__update_fingers()
-            ok_status = ['opening', 'stalled open']
-            if self.__finger_status[finger - 1] in ok_status:
-                send_command = False
-            else:
-                send_command = True
+            self.__refresh(update, [finger])
+            send_command = not self.__state.has_status(finger, OPEN_DONE)
 
         if send_command:
-            self.__motor_command(finger, ACTIONS['open'], velocity)
+            return self.__motor_command(finger, ACTIONS['open'], velocity,
+                                        delay)
+        return None
 
-    def close_finger(self, finger, velocity=None, force=True, update=True):
+    def close_finger(self, finger, velocity=None, force=True, update=True,
+                     delay=0.):
         """Closes digit at specified velocity.
 
         Parameters
@@ -162,29 +337,35 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``closing`` or ``stalled
             close``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
+        delay : float, optional (default: 0.)
+            Time in seconds after which the command is sent.
+
+        Returns
+        -------
+        command : Command or None
+            Handle of the queued command, ``None`` if it was not sent.
         """
         velocity = self.def_vel if velocity is None else int(velocity)
         finger = self.__get_finger_id(finger)
         if force:
             send_command = True
         else:
-            if update:
-                self.__update_fingers()
-            ok_status = ['closing', 'stalled close']
-            if self.__finger_status[finger - 1] in ok_status:
-                send_command = False
-            else:
-                send_command = True
+            self.__refresh(update, [finger])
+            send_command = not self.__state.has_status(finger, CLOSE_DONE)
 
         if send_command:
-            self.__motor_command(finger, ACTIONS['close'], velocity)
+            return self.__motor_command(finger, ACTIONS['close'], velocity,
+                                        delay)
+        return None
 
-    def stop_finger(self, finger, force=True, update=True):
+    def stop_finger(self, finger, force=True, update=True, delay=0.):
         """Stops digit movement.
 
         Parameters
@@ -194,28 +375,37 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``stop`` or ``stalled
             open`` or ``stalled close``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
+        delay : float, optional (default: 0.)
+            Time in seconds after which the command is sent. Delayed stop
+            commands are queued like any other command and do not preempt
+            pending commands.
+
+        Returns
+        -------
+        command : Command or None
+            Handle of the queued stop command, ``None`` if it was not sent.
         """
         finger = self.__get_finger_id(finger)
         if force:
             send_command = True
         else:
-            if update:
-                self.__update_fingers()
-            ok_status = ['stalled open', 'stalled close', 'stop']
-            if self.__finger_status[finger - 1] in ok_status:
-                send_command = False
-            else:
-                send_command = True
+            self.__refresh(update, [finger])
+            send_command = not self.__state.has_status(finger, STOP_DONE)
 
-        if send_command:
-            self.__motor_command(finger, ACTIONS['stop'], 297)
+        if not send_command:
+            return None
+        if delay > 0:
+            return self.__motor_command(finger, ACTIONS['stop'], 297, delay)
+        return self.__stop_command([finger])[0]
 
-    def open_fingers(self, velocity=None, force=True, update=True):
+    def open_fingers(self, velocity=None, force=True, update=True, delay=0.):
         """Opens all digits except thumb rotator at specified velocity.
 
         Parameters
@@ -226,23 +416,28 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``opening`` or ``stalled
             open``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
+        delay : float, optional (default: 0.)
+            Time in seconds after which the command is sent.
 
         Notes
         -----
-        When ```update`` is ``True``, the finger status in queried once for all
-        fingers before any finger specific commands are issued. The serial
-        finger commands are then issued with ``update=False``.
+        When ```update`` is not ``False``, the finger status in queried once
+        for all fingers before any finger specific commands are issued. The
+        serial finger commands are then issued with ``update=False``.
         """
         velocity = self.def_vel if velocity is None else int(velocity)
-        if not force and update:
-            self.__update_fingers()
+        if not force:
+            self.__refresh(update)
 
-        [self.open_finger(i, velocity, force, False) for i in range(1, N_DOF)]
+        [self.open_finger(i, velocity, force, False, delay)
+         for i in range(1, N_DOF)]
 
     def open_all(self, velocity=None, force=True, update=True):
         """Opens all digits including thumb rotator at specified velocity.
@@ -255,29 +450,29 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``opening`` or ``stalled
             open``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
 
         Notes
         -----
-        When ```update`` is ``True``, the finger status in queried once for all
-        fingers before any finger specific commands are issued. The serial
-        finger commands are then issued with ``update=False``.
+        When ```update`` is not ``False``, the finger status in queried once
+        for all fingers before any finger specific commands are issued. The
+        serial finger commands are then issued with ``update=False``.
         """
         velocity = self.def_vel if velocity is None else int(velocity)
-        if not force and update:
-            self.__update_fingers()
+        if not force:
+            self.__refresh(update)
 
         self.open_fingers(velocity=velocity, force=force, update=False)
-        threading.Timer(
-            0.5,
-            self.open_finger,
-            [6, velocity, force, False]).start()
+        delay = self.profile_.rotator_delay(ACTIONS['open'], velocity)
+        self.open_finger(6, velocity, force, False, delay=delay)
 
-    def close_fingers(self, velocity=None, force=True, update=True):
+    def close_fingers(self, velocity=None, force=True, update=True, delay=0.):
         """Closes all digits except thumb rotator at specified velocity.
 
         Parameters
@@ -288,23 +483,28 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``closing`` or ``stalled
             close``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
+        delay : float, optional (default: 0.)
+            Time in seconds after which the command is sent.
 
         Notes
         -----
-        When ```update`` is ``True``, the finger status in queried once for all
-        fingers before any finger specific commands are issued. The serial
-        finger commands are then issued with ``update=False``.
+        When ```update`` is not ``False``, the finger status in queried once
+        for all fingers before any finger specific commands are issued. The
+        serial finger commands are then issued with ``update=False``.
         """
         velocity = self.def_vel if velocity is None else int(velocity)
-        if not force and update:
-            self.__update_fingers()
+        if not force:
+            self.__refresh(update)
 
-        [self.close_finger(i, velocity, force, False) for i in range(1, N_DOF)]
+        [self.close_finger(i, velocity, force, False, delay)
+         for i in range(1, N_DOF)]
 
     def close_all(self, velocity=None, force=True, update=True):
         """Closes all digits including thumb rotator at specified velocity.
@@ -317,27 +517,27 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``closing`` or ``stalled
             close``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
 
         Notes
         -----
-        When ```update`` is ``True``, the finger status in queried once for all
-        fingers before any finger specific commands are issued. The serial
-        finger commands are then issued with ``update=False``.
+        When ```update`` is not ``False``, the finger status in queried once
+        for all fingers before any finger specific commands are issued. The
+        serial finger commands are then issued with ``update=False``.
         """
         velocity = self.def_vel if velocity is None else int(velocity)
-        if not force and update:
-            self.__update_fingers()
+        if not force:
+            self.__refresh(update)
 
         self.close_finger(6, velocity=velocity, force=force, update=False)
-        threading.Timer(
-            0.5,
-            self.close_fingers,
-            [velocity, force, False]).start()
+        delay = self.profile_.rotator_delay(ACTIONS['close'], velocity)
+        self.close_fingers(velocity, force, False, delay=delay)
 
     def stop_fingers(self, force=True, update=True):
         """Stops movement for all digits except thumb rotator.
@@ -347,21 +547,25 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``stop`` or ``stalled
             open`` or ``stalled close``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
 
         Notes
         -----
-        When ```update`` is ``True``, the finger status in queried once for all
-        fingers before any finger specific commands are issued. The serial
-        finger commands are then issued with ``update=False``.
+        When ```update`` is not ``False``, the finger status in queried once
+        for all fingers before any finger specific commands are issued. The
+        serial finger commands are then issued with ``update=False``.
         """
-        if not force and update:
-            self.__update_fingers()
-        [self.stop_finger(i, force, False) for i in range(1, N_DOF)]
+        if not force:
+            self.__refresh(update)
+        self.__stop_command([i for i in range(1, N_DOF)
+                             if force or not self.__state.has_status(
+                                 i, STOP_DONE)])
 
     def stop_all(self, force=True, update=True):
         """Stops movement for all digits including thumb rotator.
@@ -371,21 +575,25 @@ class RoboLimbCAN(object):
         force : boolean, optional (default: True)
             If ``False`` and the finger status is ``stop`` or ``stalled
             open`` or ``stalled close``, the command will not be sent.
-        update : boolean, optional (default: True)
-            When set to ``True``, the finger status will be queried. When set
-            to ``False``, it is assumed that the finger status has been
-            recently queried and the ``__finger_status`` attribute is up to
-            date. When ``force`` is set to ``True``, this will be ignored.
+        update : boolean or float, optional (default: True)
+            When true, the finger status will be queried if the cached
+            status is older than ``max_age``. A float sets the maximum age (in
+            seconds) explicitly; other values, e.g. ``1`` or ``0``, are truth
+            values. When false, it is assumed that the stored finger status is
+            up to date. When ``force`` is set to ``True``, this will be
+            ignored.
 
         Notes
         -----
-        When ```update`` is ``True``, the finger status in queried once for all
-        fingers before any finger specific commands are issued. The serial
-        finger commands are then issued with ``update=False``.
+        When ```update`` is not ``False``, the finger status in queried once
+        for all fingers before any finger specific commands are issued. The
+        serial finger commands are then issued with ``update=False``.
         """
-        if not force and update:
-            self.__update_fingers()
-        [self.stop_finger(i, force, False) for i in range(1, N_DOF + 1)]
+        if not force:
+            self.__refresh(update)
+        self.__stop_command([i for i in range(1, N_DOF + 1)
+                             if force or not self.__state.has_status(
+                                 i, STOP_DONE)])
 
     def quick_grip(self, grip):
         """Performs quick grip.
@@ -406,34 +614,643 @@ class RoboLimbCAN(object):
         msg = ['0', '0', '0', QUICK_GRIPS[grip]]
         can_msg = self.__can_message(id, msg)
 
-        self.bus.Write(self.channel, can_msg)
+        self.__scheduler.submit(can_msg)
+        self.__grip = grip
+        self.__events.quick_grip(grip, time.monotonic())
 
-    def get_serial_number(self):
+    def get_serial_number(self, timeout=None):
         """Queries the device serial number.
 
+        Parameters
+        ----------
+        timeout : float, optional (default: None)
+            Maximum time to wait for the response in seconds. If not
+            provided, the ``query_timeout`` attribute is used.
+
         Returns
         -------
-        sn : str
-            Device serial number.
+        sn : str or None
+            Device serial number, ``None`` if the query timed out.
         """
         id = int('0x402', 16)
         msg = ['0', '0', '0', '0']
         can_msg = self.__can_message(id, msg)
 
-        # Reset queue such that first received message is the query response
-        self.reset_bus()
-        self.bus.Write(self.channel, can_msg)
-        sn_msg = self.__read_messages(num_messages=1)[0]
+        sn_msg = self.__query(
+            can_msg, self.query_timeout if timeout is None else timeout, id)
+        if sn_msg is None:
+            return None
         # See manual p.14 for message format
         letters = hex(sn_msg[1].DATA[0])[2:] + hex(sn_msg[1].DATA[1])[2:]
         numbers = hex(sn_msg[1].DATA[2])[2:] + hex(sn_msg[1].DATA[3])[2:]
         sn = bytearray.fromhex(letters).decode() + str(int(numbers, 16))
         return sn
 
+    def get_finger_status(self, max_age=None):
+        """Returns the digits status, querying the bus only if the cached
+        status is too old.
+
+        Parameters
+        ----------
+        max_age : float, optional (default: None)
+            Maximum age (in seconds) of the cached status. If not provided,
+            the ``max_age`` attribute is used.
+
+        Returns
+        -------
+        finger_status : list
+                List of status with one element per digit.
+        """
+        self.__refresh(True if max_age is None else float(max_age))
+        return self.__state.labels()
+
+    def get_state(self, max_age=None):
+        """Returns the hand state, querying the bus only if the cached status
+        is too old.
+
+        Parameters
+        ----------
+        max_age : float, optional (default: None)
+            Maximum age (in seconds) of the cached status. If not provided,
+            the ``max_age`` attribute is used.
+
+        Returns
+        -------
+        state : HandState
+            Hand state with integer status codes and bitmask predicates.
+        """
+        self.__refresh(True if max_age is None else float(max_age))
+        return self.__state
+
+    def get_finger_current(self, max_age=None):
+        """Returns the digits currents, querying the bus only if the cached
+        currents are too old.
+
+        Parameters
+        ----------
+        max_age : float, optional (default: None)
+            Maximum age (in seconds) of the cached currents. If not provided,
+            the ``max_age`` attribute is used.
+
+        Returns
+        -------
+        finger_current : list
+                List of currents with one element per digit.
+        """
+        self.__refresh(True if max_age is None else float(max_age))
+        return self.__state.currents()
+
+    def get_rotator_edge(self, max_age=None):
+        """Returns the thumb rotator edge, querying the bus only if the
+        cached status is too old.
+
+        Parameters
+        ----------
+        max_age : float, optional (default: None)
+            Maximum age (in seconds) of the cached status. If not provided,
+            the ``max_age`` attribute is used.
+
+        Returns
+        -------
+        thumb_edge : bool
+            `True` when thumb rotator is fully palmar or lateral.
+        """
+        self.__refresh(True if max_age is None else float(max_age), [N_DOF])
+        return self.__state.rotator_edge
+
+    def any_moving(self, max_age=None):
+        """Returns `True` if at least one digit is opening or closing,
+        querying the bus only if the cached status is too old.
+
+        Parameters
+        ----------
+        max_age : float, optional (default: None)
+            Maximum age (in seconds) of the cached status. If not provided,
+            the ``max_age`` attribute is used.
+        """
+        self.__refresh(True if max_age is None else float(max_age))
+        return self.__state.any_moving()
+
+    def poll_feedback(self, timeout=0.):
+        """Reads the feedback received since the last call and updates the
+        cached state with every frame.
+
+        Unlike the status queries, the receive queue is not reset, such that
+        no feedback frame is missed. This is meant for control loops reacting
+        to individual frames; the status should not be queried from other
+        threads meanwhile, nor should the connection be listening. Frames
+        other than feedback are passed on to pending queries.
+
+        Parameters
+        ----------
+        timeout : float, optional (default: 0.)
+            Maximum time in seconds to wait for feedback when none is
+            available.
+
+        Returns
+        -------
+        feedback : list of Feedback
+            Feedback frames in order of arrival.
+        """
+        deadline = time.monotonic() + timeout
+        feedback = []
+        while True:
+            for msg in self.__read_messages():
+                if FEEDBACK_BASE_ID < msg[1].ID <= FEEDBACK_BASE_ID + N_DOF \
+                        and msg[1].DATA[1] <= MAX_STATUS:
+                    fb = self.__process_feedback_message(msg)
+                    self.__latency.feedback(fb.finger_id, fb.status,
+                                            fb.timestamp)
+                    tracer = self.__tracer
+                    if tracer is not None:
+                        tracer.instant(fb.status.label, fb.finger_id,
+                                       fb.timestamp)
+                    self.__apply_feedback(fb)
+                    feedback.append(fb)
+                else:
+                    try:
+                        self.__responses.put_nowait(msg)
+                    except queue.Full:
+                        pass
+            if feedback or time.monotonic() >= deadline:
+                break
+            # Sleep rather than spin, such that real-time threads of equal
+            # priority on the same core are not starved
+            time.sleep(1e-4)
+        if feedback:
+            with self.__drain_lock:
+                self.__publish_state(feedback[-1].timestamp)
+        return feedback
+
+    def drain(self, out=None):
+        """Reads all queued frames in bulk into a buffer of raw frames.
+
+        Frames are read without allocating Python objects per frame and
+        decoded at once. The cached state is updated with the latest
+        feedback of each digit and older frames are shed, see
+        ``get_cycle``; events are dispatched for every frame when
+        there are subscriptions. Frames other than feedback are passed on to
+        pending queries. Same restrictions as ``poll_feedback``.
+
+        Parameters
+        ----------
+        out : numpy.ndarray, optional (default: None)
+            Buffer of ``robolimb.drain.FRAME_DTYPE``. Reading stops when it
+            is full. If not provided, an internal buffer of
+            ``DRAIN_BUFFER_SIZE`` frames is used, which is overwritten by the
+            next call.
+
+        Returns
+        -------
+        frames : numpy.ndarray
+            View of the frames read, with the ``time`` field in seconds of
+            ``time.monotonic()``.
+        """
+        with self.__drain_lock:
+            return self.__drain(self.__frames if out is None else out)
+
+    def __drain(self, out):
+        """Reads and processes queued frames. The drain lock must be
+        held."""
+        tracer = self.__tracer
+        if tracer is not None:
+            t_drain = time.monotonic()
+        n = self.__reader.read(out)
+        self.__check(self.__reader.status_)
+        frames = out[:n]
+        if not n:
+            return frames
+        times = self.__clock.convert_array(frame_hw_seconds(frames),
+                                           time.monotonic())
+        frames['time'] = times
+        ids = frames['msg']['ID']
+        data = frames['msg']['DATA']
+        recorder = self.__recorder
+        if recorder is not None:
+            recorder.extend(times, ids, data, RX, frames['msg']['LEN'])
+
+        decoded = decode(ids, data)
+        # Query responses may share IDs with feedback, but not status codes
+        feedback = is_feedback(ids, data)
+        fb = np.flatnonzero(feedback)
+        d = decoded[fb]
+        self.__frame_counts += np.bincount(d['finger'], minlength=N_DOF + 1)
+        self.__frame_counts[0] += n - len(fb)
+        self.__latency.feedback_array(d['finger'], d['status'], times[fb])
+        if tracer is not None:
+            tracer.instants(self.__trace_status[d['status']], d['finger'],
+                            times[fb])
+        latest = fb[self.__assembler.add(d['finger'], d['status'],
+                                         d['current'], d['edge'], times[fb])]
+        rows = fb if self.__events.active else latest
+        for k in rows.tolist():
+            finger = int(decoded['finger'][k])
+            edge = bool(decoded['edge'][k]) if finger == N_DOF else None
+            fb_ = Feedback(finger, Status(int(decoded['status'][k])), edge,
+                           float(decoded['current'][k]), float(times[k]))
+            self.__apply_feedback(fb_)
+        for k in np.flatnonzero(~feedback).tolist():
+            msg = TPCANMsg.from_buffer_copy(frames['msg'][k].tobytes())
+            try:
+                self.__responses.put_nowait((PCAN_ERROR_OK, msg, times[k]))
+            except queue.Full:
+                pass
+        if len(fb):
+            self.__publish_state(float(times[fb[-1]]))
+        if tracer is not None:
+            tracer.span('drain', RECEIVE, t_drain, time.monotonic(), n)
+        return frames
+
+    def get_cycle(self):
+        """Drains the receive queue and returns the current hand state.
+
+        However long the backlog, only the newest frame of each digit is
+        kept. The call returns once every digit has reported since the
+        previous cycle, or after ``cycle_timeout`` with the last known values
+        of the silent digits. Same restrictions as ``poll_feedback``.
+
+        Returns
+        -------
+        cycle : Cycle
+            Hand state, see ``robolimb.assembler.Cycle``.
+        """
+        while True:
+            # Process the whole backlog before looking at the cycle
+            while len(self.drain()) == DRAIN_BUFFER_SIZE:
+                pass
+            cycle = self.__assembler.cycle()
+            if cycle is not None:
+                return cycle
+            time.sleep(1e-4)
+
+    def share_state(self, name=None):
+        """Publishes the hand state into a shared-memory block.
+
+        After this call, every status update is written into the block and
+        can be read from other processes with
+        ``robolimb.shared_state.SharedStateReader``. The block is removed when
+        the connection is stopped.
+
+        Parameters
+        ----------
+        name : str, optional (default: None)
+            Name of the shared-memory block. If not provided, a unique name
+            is generated.
+
+        Returns
+        -------
+        name : str
+            Name of the shared-memory block.
+        """
+        from .shared_state import SharedStateWriter
+        with self.__drain_lock:
+            if self.__state_writer is None:
+                self.__state_writer = SharedStateWriter(name)
+                self.__publish_state(time.monotonic())
+            return self.__state_writer.name
+
+    def record(self, path, **kwargs):
+        """Records all incoming and outgoing CAN messages to a session file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the session file.
+        kwargs : dict
+            Additional arguments passed to
+            ``robolimb.session.SessionWriter``.
+        """
+        from .session import SessionWriter
+        self.stop_recording()
+        self.__recorder = SessionWriter(path, **kwargs)
+
+    def stop_recording(self):
+        """Stops recording and writes the session file.
+
+        Returns
+        -------
+        n_frames : int or None
+            Number of frames written to the session file, ``None`` if not
+            recording.
+        """
+        recorder, self.__recorder = self.__recorder, None
+        if recorder is None:
+            return None
+        recorder.close()
+        return len(recorder)
+
+    def teach(self):
+        """Starts capturing the motor commands written to the bus.
+
+        Commands are captured with their write time, whichever method issued
+        them, until ``stop_teaching`` is called. See ``robolimb.teach``.
+        """
+        from .teach import TrajectoryRecorder
+        self.__teacher = TrajectoryRecorder()
+
+    def stop_teaching(self):
+        """Stops capturing motor commands.
+
+        Returns
+        -------
+        trajectory : Trajectory or None
+            Captured commands, ``None`` if not teaching.
+        """
+        teacher, self.__teacher = self.__teacher, None
+        return None if teacher is None else teacher.trajectory()
+
+    def trace(self, size=65536):
+        """Starts recording a timeline of the connection.
+
+        Writes (per digit for motor commands), timed commands becoming due,
+        drained batches, feedback frames (per digit, with their status) and
+        the spans opened with ``trace_span`` are recorded into a bounded
+        buffer. See ``robolimb.trace``.
+
+        Parameters
+        ----------
+        size : int, optional (default: 65536)
+            Number of events kept.
+
+        Returns
+        -------
+        tracer : Tracer
+            Trace buffer, which can be exported with ``Tracer.export``.
+        """
+        tracer = Tracer(size)
+        self.__trace_status = np.array([tracer.intern(s.label)
+                                        for s in Status])
+        self.__tracer = tracer
+        if self.__started:
+            self.__scheduler.tracer = tracer
+        return tracer
+
+    def stop_tracing(self):
+        """Stops recording the timeline.
+
+        Returns
+        -------
+        tracer : Tracer or None
+            Trace buffer, ``None`` if not tracing.
+        """
+        tracer, self.__tracer = self.__tracer, None
+        if self.__started:
+            self.__scheduler.tracer = None
+        return tracer
+
+    def trace_span(self, name, finger=None):
+        """Returns a context manager recording its body as a span of the
+        timeline, e.g. a phase of a grip. Does nothing if not tracing.
+
+        Parameters
+        ----------
+        name : str
+            Span name.
+        finger : int, optional (default: None)
+            Finger ID of the track. If not provided, the hand track is used.
+        """
+        tracer = self.__tracer
+        if tracer is None:
+            return contextlib.nullcontext()
+        return tracer.region(name, 0 if finger is None else finger)
+
+    def schedule(self, commands, start):
+        """Queues timed motor commands at absolute times.
+
+        All commands are queued at once with their due time, such that their
+        timing does not depend on when this thread gets to run.
+
+        Parameters
+        ----------
+        commands : iterable
+            ``(time, finger, action, velocity)`` records, e.g. the commands of
+            a ``robolimb.teach.Trajectory``, with times in seconds relative
+            to ``start``. Actions are codes of ``ACTIONS``.
+        start : float
+            Time of the first command, in seconds of ``time.monotonic()``.
+
+        Returns
+        -------
+        handles : list of Command
+            Handles of the queued commands, in the given order.
+        """
+        handles = []
+        for t, finger, action, velocity in commands:
+            finger = int(finger)
+            can_msg = self.__can_message(*self.__motor_message(
+                finger, int(action), int(velocity)))
+            handles.append(self.__scheduler.submit(can_msg, finger,
+                                                   at=start + float(t)))
+        return handles
+
+    def subscribe(self, callback=None, kinds=None, fingers=None,
+                  threshold=None, maxsize=256):
+        """Subscribes to state-change events.
+
+        Events are generated whenever feedback is processed, i.e. on status
+        queries, or continuously while the connection is listening (see
+        ``listen``).
+
+        Parameters
+        ----------
+        callback : callable, optional (default: None)
+            Function called with each ``robolimb.events.Event`` on a
+            dedicated thread. If not provided, events are retrieved with the
+            ``get`` method of the returned subscription.
+        kinds : sequence of str, optional (default: None)
+            Event kinds among ``'status'``, ``'edge'``, ``'current'`` and
+            ``'quick_grip'``. If not provided, all kinds are delivered.
+        fingers : sequence of int, optional (default: None)
+            Finger IDs of interest. If not provided, all digits.
+        threshold : float, optional (default: None)
+            Current (in Amps) whose crossings generate ``'current'`` events.
+        maxsize : int, optional (default: 256)
+            Capacity of the event queue. When the subscriber falls behind,
+            the oldest events are dropped.
+
+        Returns
+        -------
+        subscription : Subscription
+            Subscription handle.
+        """
+        return self.__events.subscribe(callback, kinds, fingers, threshold,
+                                       maxsize)
+
+    def unsubscribe(self, subscription):
+        """Cancels a subscription returned by ``subscribe``."""
+        self.__events.unsubscribe(subscription)
+
+    def listen(self):
+        """Starts a background thread processing every incoming frame.
+
+        While listening, the cached state is kept up to date from the
+        feedback stream: status queries no longer access the bus, and events
+        are dispatched as frames arrive. Responses to serial number and quick
+        grip queries are routed back to the querying thread.
+        """
+        if self.__listener is not None:
+            return
+        self.__listening = True
+        self.__listener = threading.Thread(target=self.__listen,
+                                           name='robolimb-receive',
+                                           daemon=True)
+        self.__listener.start()
+
+    def stop_listening(self):
+        """Stops the background receive thread."""
+        listener, self.__listener = self.__listener, None
+        self.__listening = False
+        if listener is not None:
+            listener.join()
+
     def reset_bus(self):
         """Resets the receive and transmit queues of the PCAN channel."""
         self.bus.Reset(self.channel)
 
+    def filter_messages(self, from_id, to_id, mode=PCAN_MODE_STANDARD):
+        """Restricts the reception to a range of CAN IDs.
+
+        Filters are restored when the connection is re-initialized.
+
+        Parameters
+        ----------
+        from_id, to_id : int
+            First and last CAN ID of the range.
+        mode : pcan definition, optional (default: PCAN_MODE_STANDARD)
+            Standard or extended IDs.
+        """
+        self.__filters.append((from_id, to_id, mode))
+        self.bus.FilterMessages(self.channel, from_id, to_id, mode)
+
+    def supervise(self, period=0.05, backoff=0.005, max_backoff=0.5):
+        """Starts a background thread recovering from failures.
+
+        Failures are detected from the status of reads and writes and from
+        the channel status, polled periodically. The connection is then
+        restored with ``reconnect``.
+
+        Parameters
+        ----------
+        period : float, optional (default: 0.05)
+            Polling period of the channel status in seconds.
+        backoff, max_backoff : float, optional (default: 0.005, 0.5)
+            Initial and maximum delay between initialization attempts in
+            seconds.
+        """
+        if self.__supervisor is not None:
+            return
+        self.__halt.clear()
+        self.__supervisor = threading.Thread(
+            target=self.__supervise, args=(period, backoff, max_backoff),
+            name='robolimb-supervisor', daemon=True)
+        self.__supervisor.start()
+
+    def stop_supervising(self):
+        """Stops the supervisor thread, aborting any reconnection."""
+        supervisor, self.__supervisor = self.__supervisor, None
+        if supervisor is not None:
+            self.__halt.set()
+            supervisor.join()
+            self.__halt.clear()
+
+    def reconnect(self, backoff=0.005, max_backoff=0.5, timeout=None):
+        """Re-initializes the channel and resynchronizes the state.
+
+        The channel is initialized again until it succeeds, with
+        exponentially increasing delays between attempts. Message filters
+        and the quick grip are then restored and the state cache is rebuilt
+        from the first complete feedback cycle. Commands written during the
+        outage are lost.
+
+        Parameters
+        ----------
+        backoff, max_backoff : float, optional (default: 0.005, 0.5)
+            Initial and maximum delay between initialization attempts in
+            seconds.
+        timeout : float, optional (default: None)
+            Maximum time in seconds to wait for the channel to initialize. If
+            not provided, waits until it succeeds or supervision is stopped.
+
+        Returns
+        -------
+        outage : Outage or None
+            Recovered failure with its downtime, measured from detection (or
+            from the call, if no failure was detected) to resynchronization.
+            ``None`` if the channel could not be initialized.
+        """
+        with self.__reconnect_lock:
+            now = time.monotonic()
+            status, detected = self.__failure if self.__failed.is_set() \
+                else (PCAN_ERROR_OK, now)
+            deadline = None if timeout is None else now + timeout
+            attempts = 0
+            for delay in backoff_delays(backoff, max_backoff):
+                self.bus.Uninitialize(Channel=self.channel)
+                attempts += 1
+                if self.__initialize() == PCAN_ERROR_OK:
+                    break
+                if deadline is not None and time.monotonic() + delay > \
+                        deadline:
+                    return None
+                if self.__halt.wait(delay):
+                    return None
+
+            for from_id, to_id, mode in self.__filters:
+                self.bus.FilterMessages(self.channel, from_id, to_id, mode)
+            # The adapter clock restarts, and so do the feedback cycles
+            self.__clock.reset()
+            self.__assembler.reset()
+            self.__failed.clear()
+            if self.__grip is not None:
+                self.quick_grip(self.__grip)
+            self.__resync()
+            restored = time.monotonic()
+            outage = Outage(status, detected, restored, restored - detected,
+                            attempts)
+            self.outages_.append(outage)
+            self.__events.link(True, restored)
+            return outage
+
+    def __initialize(self):
+        """Initializes the PCAN channel and returns the status."""
+        return self.bus.Initialize(
+            Channel=self.channel,
+            Btr0Btr1=self.b_rate,
+            HwType=self.hw_type,
+            IOPort=self.io_port,
+            Interrupt=self.interrupt)
+
+    def __check(self, status):
+        """Signals a failure if a PCAN status requires re-initializing the
+        channel."""
+        if not is_failure(status):
+            return
+        with self.__failure_lock:
+            if self.__failed.is_set():
+                return
+            self.__failure = (status, time.monotonic())
+            self.__failed.set()
+        self.__events.link(False, self.__failure[1])
+
+    def __resync(self):
+        """Waits for feedback from every digit after a re-initialization.
+        Gives up after ``RESYNC_TIMEOUT``."""
+        deadline = time.monotonic() + RESYNC_TIMEOUT
+        while not self.__assembler.complete and \
+                time.monotonic() < deadline and not self.__failed.is_set():
+            # While listening, the receive thread drains the queue
+            if not self.__listening:
+                self.drain()
+            time.sleep(1e-4)
+
+    def __supervise(self, period, backoff, max_backoff):
+        """Supervisor thread loop."""
+        while not self.__halt.is_set():
+            if self.__failed.wait(period):
+                self.reconnect(backoff, max_backoff)
+            else:
+                self.__check(self.bus.GetStatus(self.channel))
+
     def __can_message(self, id, data):
         """Creates a CAN message from corresponding CAN ID and data.
 
@@ -459,7 +1276,54 @@ class RoboLimbCAN(object):
 
         return can_msg
 
-    def __motor_command(self, finger, action, velocity):
+    def __write(self, can_msg):
+        """Writes a CAN message to the bus. Only called from the scheduler
+        thread."""
+        tracer = self.__tracer
+        if tracer is not None:
+            t_write = time.monotonic()
+        self.__check(self.bus.Write(self.channel, can_msg))
+        t = time.monotonic()
+        recorder = self.__recorder
+        if recorder is not None:
+            recorder.append(t, can_msg.ID, can_msg.DATA[:can_msg.LEN], TX)
+        if COMMAND_BASE_ID < can_msg.ID <= COMMAND_BASE_ID + N_DOF:
+            finger = can_msg.ID - COMMAND_BASE_ID
+            self.__latency.command(finger, can_msg.DATA[1], t)
+            teacher = self.__teacher
+            if teacher is not None:
+                teacher.append(t, finger, can_msg.DATA[1],
+                               (can_msg.DATA[2] << 8) | can_msg.DATA[3])
+            if tracer is not None and can_msg.DATA[1] < len(ACTION_NAMES):
+                tracer.span(ACTION_NAMES[can_msg.DATA[1]], finger, t_write, t,
+                            (can_msg.DATA[2] << 8) | can_msg.DATA[3])
+        elif tracer is not None:
+            tracer.span('write 0x{:03x}'.format(can_msg.ID), SCHEDULER,
+                        t_write, t)
+
+    def __stop_command(self, fingers):
+        """Issues stop commands through the preempting path of the scheduler.
+
+        Pending and scheduled commands for the specified digits are
+        cancelled and the stop commands are sent ahead of any other command.
+
+        Parameters
+        ----------
+        fingers : list of int
+            Finger IDs.
+
+        Returns
+        -------
+        commands : list of Command
+            Handles of the stop commands.
+        """
+        if not fingers:
+            return []
+        msgs = [self.__can_message(*self.__motor_message(
+            f, ACTIONS['stop'], 297)) for f in fingers]
+        return self.__scheduler.preempt(msgs, fingers)
+
+    def __motor_command(self, finger, action, velocity, delay=0.):
         """Issues a low-level finger command.
 
         Parameters
@@ -471,10 +1335,17 @@ class RoboLimbCAN(object):
         velocity : int, optional
             Desired velocity.  Allowed range is (10,297). If not provided, the
             default velocity will be used.
+        delay : float, optional (default: 0.)
+            Time in seconds after which the command is sent.
+
+        Returns
+        -------
+        command : Command
+            Handle of the queued command.
         """
         id, data = self.__motor_message(finger, action, velocity)
         can_msg = self.__can_message(id, data)
-        self.bus.Write(self.channel, can_msg)
+        return self.__scheduler.submit(can_msg, finger, delay=delay)
 
     def __motor_message(self, finger, action, velocity):
         """Creates CAN message ID and data for a motor command.
@@ -505,7 +1376,7 @@ class RoboLimbCAN(object):
         data[3] = velocity[2:4]
         return id, data
 
-    def __read_messages(self, num_messages=None):
+    def __read_messages(self, num_messages=None, timeout=None):
         """Reads either a specified number of messages or all available
         messages from the queue.
 
@@ -514,103 +1385,287 @@ class RoboLimbCAN(object):
         num_messages : int, optional (default: None)
             Number of messages to read. If ``None``, read all messages unti
             queue is empty.
+        timeout : float, optional (default: None)
+            Maximum time in seconds to wait for the specified number of
+            messages. If ``None``, waits indefinitely.
 
         Returns
         -------
         messages : list
-            List of incoming CAN messages.
+            List of incoming CAN messages. Each message is a tuple of read
+            status, CAN message and hardware receive time converted to
+            ``time.monotonic()``.
 
         Notes
         -----
-        When the number of messages is specified, the method will block
-        execution until the messages become available, i.e., there is no
-        timeout implementation. If, for any reason, CAN messages do not arrive
-        in the queue, the program may not exit the loop.
+        When the number of messages is specified and no timeout is given, the
+        method will block execution until the messages become available. If,
+        for any reason, CAN messages do not arrive in the queue, the program
+        may not exit the loop.
         """
         messages = []
         if num_messages:
+            deadline = None if timeout is None else time.monotonic() + timeout
             while len(messages) < num_messages:
-                can_msg = self.bus.Read(self.channel)
-                if can_msg[0] == PCAN_ERROR_OK:
-                    messages.append(can_msg)
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                res, msg, ts = self.bus.Read(self.channel)
+                if res == PCAN_ERROR_OK:
+                    messages.append(self.__received(res, msg, ts))
+                elif is_failure(res):
+                    self.__check(res)
+                    break
         else:
             res = 0
             while res != PCAN_ERROR_QRCVEMPTY:
-                can_msg = self.bus.Read(self.channel)
-                res = can_msg[0]
+                res, msg, ts = self.bus.Read(self.channel)
                 if res == PCAN_ERROR_OK:
-                    messages.append(can_msg)
+                    messages.append(self.__received(res, msg, ts))
+                elif is_failure(res):
+                    self.__check(res)
+                    break
 
         return messages
 
+    def __received(self, res, msg, ts):
+        """Timestamps and records an incoming CAN message."""
+        t = self.__clock.convert(hw_seconds(ts), time.monotonic())
+        recorder = self.__recorder
+        if recorder is not None:
+            recorder.append(t, msg.ID, msg.DATA[:msg.LEN], RX)
+        if FEEDBACK_BASE_ID < msg.ID <= FEEDBACK_BASE_ID + N_DOF and \
+                msg.DATA[1] <= MAX_STATUS:
+            self.__frame_counts[msg.ID - FEEDBACK_BASE_ID] += 1
+        else:
+            self.__frame_counts[0] += 1
+        return (res, msg, t)
+
     def __process_feedback_message(self, can_msg):
         """Processes an incoming CAN feedback message.
 
         Parameters
         ----------
-        can_msg : pcan definition
-            CAN message.
+        can_msg : tuple
+            Incoming CAN message as returned by ``__read_messages``.
 
         Returns
         -------
+        feedback : Feedback
+            Named tuple with the following fields.
         finger_id : int
             Finger ID.
-        status : str
-            Finger status.
+        status : Status
+            Finger status code.
         thumb_edge : bool
             ``True when thumb rotator is fully palmar or lateral. For all other
             digits ``None`` will be returned.
         current : float
             Motor current (in Amps).
+        timestamp : float
+            Hardware receive time, in seconds of ``time.monotonic()``.
         """
         finger_id = self.__can_to_finger_id(hex(can_msg[1].ID))
         if finger_id == 6:
             thumb_edge = bool(int(hex(can_msg[1].DATA[0]), 16))
         else:
             thumb_edge = None
-        status = STATUS[can_msg[1].DATA[1]]
-        current_hex = '0x' + hex(can_msg[1].DATA[2])[2:] + \
-            hex(can_msg[1].DATA[3])[2:]
+        status = Status(can_msg[1].DATA[1])
         # See p. 11 of robo-limb manual for conversion to Amps
-        current = int(current_hex, 16) / 21.825
+        current = current_amps(can_msg[1].DATA[2], can_msg[1].DATA[3])
+
+        return Feedback(finger_id, status, thumb_edge, current, can_msg[2])
 
-        return (finger_id, status, thumb_edge, current)
+    def __apply_feedback(self, fb):
+        """Stores a processed feedback message and dispatches the resulting
+        events."""
+        self.__state.set(fb.finger_id, fb.status, fb.current, fb.thumb_edge,
+                         fb.timestamp)
+        self.__events.feedback(fb.finger_id, fb.status, fb.current,
+                               fb.thumb_edge, fb.timestamp)
 
     def __update_fingers(self):
-        """Requests 6 CAN feedback messages and updates finger status and
-        currents."""
+        """Resets the receive queue and updates finger status and currents
+        from the next feedback cycle."""
         self.reset_bus()
-        msgs = self.__read_messages(num_messages=6)
-        for msg in msgs:
-            result = self.__process_feedback_message(msg)
-            f_id, f_status, thumb_edge, f_current = result
-            self.__finger_status[f_id - 1] = f_status
-            self.__finger_current[f_id - 1] = f_current
-            if f_id == 6:
-                self.__rotator_edge = thumb_edge
+        self.__assembler.reset()
+        return self.get_cycle()
+
+    def __listen(self):
+        """Receive thread loop."""
+        if self.realtime is not None:
+            self.realtime.apply()
+        while self.__listening:
+            if not len(self.drain()):
+                time.sleep(0.001)
+
+    def __probe(self, duration):
+        """Measures the link characteristics.
+
+        Feedback is drained for ``duration`` seconds, then
+        ``PROBE_QUERIES`` serial number queries are timed from queueing to
+        write and from write to response.
+
+        Returns
+        -------
+        link : LinkProfile
+            Link characteristics.
+        """
+        fingers, times, rtt, write = [], [], [], []
+
+        def collect():
+            frames = self.drain()
+            ids = frames['msg']['ID']
+            fb = is_feedback(ids, frames['msg']['DATA'])
+            fingers.append(ids[fb] - FEEDBACK_BASE_ID)
+            times.append(frames['time'][fb])
+            return len(frames)
+
+        self.reset_bus()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            if not collect():
+                time.sleep(0.001)
+
+        can_msg = self.__can_message(int('0x402', 16), ['0', '0', '0', '0'])
+        for _ in range(PROBE_QUERIES):
+            while not self.__responses.empty():
+                self.__responses.get_nowait()
+            cmd = self.__scheduler.submit(can_msg)
+            if not cmd.wait():
+                # The write failed, there is neither latency nor response
+                continue
+            write.append(cmd.sent - cmd.submitted)
+            deadline = cmd.sent + PROBE_QUERY_TIMEOUT
+            while time.monotonic() < deadline:
+                collect()
+                try:
+                    _, _, t = self.__responses.get_nowait()
+                except queue.Empty:
+                    time.sleep(1e-4)
+                    continue
+                rtt.append(t - cmd.sent)
+                break
+        return measure_link(np.concatenate(fingers), np.concatenate(times),
+                            rtt, write)
+
+    def __query(self, can_msg, timeout=None, response_id=None):
+        """Sends a query and returns the first response received afterwards.
+
+        Feedback frames, and messages with another ID than ``response_id``,
+        are not responses.
+
+        Parameters
+        ----------
+        can_msg : pcan definition
+            Query CAN message.
+        timeout : float, optional (default: None)
+            Maximum time to wait for the response in seconds. If not
+            provided, waits indefinitely.
+        response_id : int, optional (default: None)
+            CAN ID of the response. If not provided, any message other than
+            feedback is a response.
+
+        Returns
+        -------
+        message : tuple or None
+            Response as returned by ``__read_messages``, ``None`` on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.__listener is not None:
+            # Drop stale responses, then wait for the receive thread
+            while not self.__responses.empty():
+                self.__responses.get_nowait()
+            self.__scheduler.submit(can_msg).wait()
+        else:
+            # Reset queue such that older messages are not taken as response
+            self.reset_bus()
+            self.__scheduler.submit(can_msg).wait()
+        while True:
+            remaining = None if deadline is None \
+                else max(deadline - time.monotonic(), 0.)
+            if self.__listener is not None:
+                try:
+                    msg = self.__responses.get(timeout=remaining)
+                except queue.Empty:
+                    return None
+            else:
+                msgs = self.__read_messages(num_messages=1, timeout=remaining)
+                if not msgs:
+                    return None
+                msg = msgs[0]
+            can_msg_ = msg[1]
+            if FEEDBACK_BASE_ID < can_msg_.ID <= FEEDBACK_BASE_ID + N_DOF \
+                    and can_msg_.DATA[1] <= MAX_STATUS:
+                continue
+            if response_id is None or can_msg_.ID == response_id:
+                return msg
+
+    def __refresh(self, update=True, fingers=None):
+        """Updates the digits status if the cached status is too old.
+
+        Parameters
+        ----------
+        update : boolean or float, optional (default: True)
+            A float is used as the maximum age (in seconds). Other values are
+            truth values: true to use the ``max_age`` attribute as the maximum
+            age, false to never query the status.
+        fingers : list of int, optional (default: None)
+            Finger IDs whose status is needed. If not provided, all digits are
+            considered.
+        """
+        # While listening, the cache follows the feedback stream
+        if self.__listening:
+            return
+        # Only floats are ages, such that e.g. ``update=1`` still means True.
+        # The getters convert their ``max_age`` argument to float.
+        if isinstance(update, float):
+            max_age = update
+        elif update:
+            max_age = self.max_age
+        else:
+            return
+        fingers = range(1, N_DOF + 1) if fingers is None else fingers
+        oldest = min(self.__state.timestamp[f - 1] for f in fingers)
+        # NaN timestamps, i.e. digits without feedback, fail the comparison
+        if not time.monotonic() - oldest <= max_age:
+            self.__update_fingers()
+
+    def __publish_state(self, timestamp):
+        """Writes the current state into the shared-memory block, if any.
+        The drain lock must be held, such that the block has a single
+        writer."""
+        if self.__state_writer is None:
+            return
+        state = self.__state
+        self.__state_writer.publish(state.status, state.current,
+                                    state.rotator_edge, timestamp)
 
     def __get_quick_grip(self):
         """Queries quick grip.
 
         Returns
         -------
-        grip : str
-            Quick grip.
+        grip : str or None
+            Quick grip, ``None`` if the hand does not answer within
+            ``query_timeout`` (1 s if not set) or with an unknown code.
         """
         id = int('0x302', 16)
         msg = ['0', '0', '0', '0']
         can_msg = self.__can_message(id, msg)
 
-        # Reset queue such that first received message is the query response
-        self.reset_bus()
-        self.bus.Write(self.channel, can_msg)
-        grip_msg = self.__read_messages(num_messages=1)[0]
+        grip_msg = self.__query(
+            can_msg, 1. if self.query_timeout is None else self.query_timeout)
+        if grip_msg is None:
+            return None
         # Grip codes have two digits, fill with zeros if needed
         code = hex(grip_msg[1].DATA[3])[2:].zfill(2)
+        grip = None
         for grip_, code_ in QUICK_GRIPS.items():
             if code_ == code:
                 grip = grip_
 
+        if grip is not None:
+            self.__events.quick_grip(grip, grip_msg[2])
         return grip
 
     def __get_finger_id(self, finger):
@@ -626,51 +1681,143 @@ class RoboLimbCAN(object):
         return int(id_string[4])
 
     def __del__(self):
-        """Stops CAN bus connection upon destruction."""
+        """Stops CAN bus connection upon destruction, unless already
+        stopped."""
         self.stop()
 
     @property
     def is_moving_(self):
-        """Updates the digits status and returns `True` if at least one digit
-        is opening or closing."""
-        self.__update_fingers()
-        return any(x in ['opening', 'closing'] for x in self.__finger_status)
+        """Updates the digits status if older than ``max_age`` and returns
+        `True` if at least one digit is opening or closing."""
+        return self.any_moving()
+
+    @property
+    def state_(self):
+        """Updates the digits status if older than ``max_age`` and returns the
+        hand state.
+
+        Returns
+        -------
+        state : HandState
+            Hand state with integer status codes and bitmask predicates.
+        """
+        return self.get_state()
 
     @property
     def finger_status_(self):
-        """Updates the digits status and returns the result.
+        """Updates the digits status if older than ``max_age`` and returns the
+        result.
 
         Returns
         -------
         finger_status : list
                 List of status with one element per digit.
         """
-        self.__update_fingers()
-        return self.__finger_status
+        return self.get_finger_status()
 
     @property
     def rotator_edge_(self):
-        """Updates the thumb rotator status and returns the result.
+        """Updates the thumb rotator status if older than ``max_age`` and
+        returns the result.
 
         Returns
         -------
         thumb_edge : bool
             `True` when thumb rotator is fully palmar or lateral.
         """
-        self.__update_fingers()
-        return self.__rotator_edge
+        return self.get_rotator_edge()
+
+    @property
+    def finger_timestamp_(self):
+        """Updates the digits status if older than ``max_age`` and returns the
+        time of the latest feedback of each digit.
+
+        Returns
+        -------
+        finger_timestamp : list
+                Hardware receive time per digit, in seconds of
+                ``time.monotonic()``.
+        """
+        self.__refresh()
+        return list(self.__state.timestamp)
+
+    @property
+    def finger_age_(self):
+        """Returns the age of the cached status of each digit without
+        querying the bus.
+
+        Returns
+        -------
+        finger_age : list
+                Time in seconds since the latest feedback per digit, NaN for
+                digits without feedback.
+        """
+        now = time.monotonic()
+        return [now - t for t in self.__state.timestamp]
 
     @property
     def finger_current_(self):
-        """Updates the digits currents and returns the result.
+        """Updates the digits currents if older than ``max_age`` and returns
+        the result.
 
         Returns
         -------
         finger_current : list
                 List of currents with one element per digit.
         """
-        self.__update_fingers()
-        return self.__finger_current
+        return self.get_finger_current()
+
+    @property
+    def stop_latency_(self):
+        """Returns the enqueue-to-wire latency statistics of stop commands.
+
+        Returns
+        -------
+        stats : dict
+            Number of stop commands sent and mean, worst-case and last
+            latency (in seconds).
+        """
+        return self.__scheduler.stop_latency.as_dict()
+
+    @property
+    def connected_(self):
+        """``False`` while the connection has failed."""
+        return not self.__failed.is_set()
+
+    @property
+    def tracing_(self):
+        """``True`` while a timeline is recorded."""
+        return self.__tracer is not None
+
+    @property
+    def command_latency_(self):
+        """Returns the command-to-feedback latency statistics.
+
+        Returns
+        -------
+        stats : dict
+            Distribution per finger ID and action, see
+            ``robolimb.latency.LatencyCorrelator.stats``.
+        """
+        return self.__latency.stats()
+
+    @property
+    def frame_counts_(self):
+        """Number of frames received per digit since the creation of the
+        connection, indexed by finger ID. Index 0 counts all other
+        frames."""
+        return self.__frame_counts.copy()
+
+    @property
+    def pending_commands_(self):
+        """Number of queued and scheduled commands."""
+        return self.__scheduler.pending()
+
+    @property
+    def shed_frames_(self):
+        """Number of feedback frames discarded in favor of newer frames of
+        the same digit."""
+        return self.__assembler.shed_
 
     @property
     def quick_grip_(self):
@@ -678,7 +1825,7 @@ class RoboLimbCAN(object):
 
         Returns
         -------
-        grip : str
-                Current quick grip.
+        grip : str or None
+                Current quick grip, ``None`` if the hand does not answer.
         """
         return self.__get_quick_grip()
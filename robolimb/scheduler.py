@@ -0,0 +1,296 @@
+""" Single-writer command pipeline.
+
+All CAN frames of a connection are written by one scheduler thread. Frames
+are queued with a priority and an optional delay, so that commands issued
+from different threads can never overtake each other. Stop commands use a
+preempting path: they flush pending and scheduled commands of the same
+digits and are written ahead of everything else.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from .trace import SCHEDULER
+
+# Lower values are written first
+STOP = 0
+NORMAL = 1
+
+
+class LatencyStats(object):
+    """ Running latency statistics.
+
+    Attributes
+    ----------
+    count : int
+        Number of samples.
+    mean : float
+        Mean latency (in seconds).
+    max : float
+        Worst-case latency (in seconds).
+    last : float
+        Most recent latency (in seconds).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self.max = 0.
+        self.last = None
+
+    def add(self, latency):
+        """Adds a latency sample (in seconds)."""
+        self.count += 1
+        self.mean += (latency - self.mean) / self.count
+        self.max = max(self.max, latency)
+        self.last = latency
+
+    def as_dict(self):
+        """Returns the statistics as a dictionary."""
+        return {'count': self.count, 'mean': self.mean, 'max': self.max,
+                'last': self.last}
+
+
+class Command(object):
+    """ Handle of a queued CAN frame.
+
+    Attributes
+    ----------
+    can_msg : pcan definition
+        CAN message.
+    finger : int or None
+        Finger ID for motor commands, ``None`` otherwise.
+    priority : int
+        Command priority.
+    due : float
+        Time at which the command becomes eligible, in seconds of
+        ``time.monotonic()``.
+    submitted : float
+        Time at which the command was queued.
+    sent : float or None
+        Time at which the command was written, ``None`` until then.
+    error : Exception or None
+        Exception raised while writing the command, which is then
+        cancelled.
+    """
+
+    __slots__ = ('can_msg', 'finger', 'priority', 'due', 'submitted', 'sent',
+                 'cancelled', 'error', '__done')
+
+    def __init__(self, can_msg, finger, priority, due, submitted):
+        self.can_msg = can_msg
+        self.finger = finger
+        self.priority = priority
+        self.due = due
+        self.submitted = submitted
+        self.sent = None
+        self.cancelled = False
+        self.error = None
+        self.__done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Blocks until the command has been written or cancelled.
+
+        Returns
+        -------
+        sent : bool
+            ``True`` if the command has been written.
+        """
+        self.__done.wait(timeout)
+        return self.sent is not None
+
+    def _finish(self, sent=None):
+        self.sent = sent
+        self.cancelled = sent is None
+        self.__done.set()
+
+
+class CommandScheduler(object):
+    """ Priority queue of CAN frames served by a single writer thread.
+
+    Parameters
+    ----------
+    write : callable
+        Function writing a CAN message to the bus.
+    on_start : callable, optional (default: None)
+        Function called by the writer thread when it starts, e.g. to apply a
+        ``RealtimePolicy``.
+
+    Attributes
+    ----------
+    tracer : Tracer or None
+        When set, each delayed command becoming due is recorded as a
+        ``'timer'`` event on the scheduler track, with its lateness in
+        seconds.
+    """
+
+    def __init__(self, write, on_start=None):
+        self.__write = write
+        self.__on_start = on_start
+        self.__cond = threading.Condition()
+        self.__ready = []  # (priority, seq, command)
+        self.__timed = []  # (due, seq, command)
+        self.__seq = itertools.count()
+        self.__thread = None
+        self.__running = False
+        self.stop_latency = LatencyStats()
+        self.tracer = None
+
+    def start(self):
+        """Starts the writer thread."""
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run,
+                                         name='robolimb-scheduler',
+                                         daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Stops the writer thread.
+
+        Commands that are due, e.g. stops issued right before, are written
+        first. Commands scheduled for later are cancelled.
+        """
+        with self.__cond:
+            self.__running = False
+            self.__promote(time.monotonic())
+            for _, _, cmd in self.__timed:
+                cmd._finish()
+            del self.__timed[:]
+            self.__cond.notify()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        # Without a writer thread, nothing queued can be written any more
+        with self.__cond:
+            self.__flush(lambda cmd: True)
+
+    def submit(self, can_msg, finger=None, priority=NORMAL, delay=0.,
+               at=None):
+        """Queues a CAN frame.
+
+        Parameters
+        ----------
+        can_msg : pcan definition
+            CAN message.
+        finger : int, optional (default: None)
+            Finger ID for motor commands. Used to select the commands that
+            are flushed by a stop.
+        priority : int, optional (default: NORMAL)
+            Command priority. Lower values are written first.
+        delay : float, optional (default: 0.)
+            Time in seconds after which the command becomes eligible.
+        at : float, optional (default: None)
+            Time at which the command becomes eligible, in seconds of
+            ``time.monotonic()``. Overrides ``delay``.
+
+        Returns
+        -------
+        command : Command
+            Handle that can be waited on.
+        """
+        now = time.monotonic()
+        due = now + delay if at is None else at
+        cmd = Command(can_msg, finger, priority, due, now)
+        with self.__cond:
+            if due > now:
+                heapq.heappush(self.__timed, (cmd.due, next(self.__seq), cmd))
+            else:
+                heapq.heappush(self.__ready,
+                               (priority, next(self.__seq), cmd))
+            self.__cond.notify()
+        return cmd
+
+    def preempt(self, can_msgs, fingers):
+        """Queues stop frames ahead of everything else.
+
+        Pending and scheduled commands of lower priority for the given digits
+        are cancelled.
+
+        Parameters
+        ----------
+        can_msgs : list of pcan definition
+            Stop CAN messages.
+        fingers : list of int
+            Finger ID of each message.
+
+        Returns
+        -------
+        commands : list of Command
+            Handles of the stop commands.
+        """
+        now = time.monotonic()
+        fingers_ = set(fingers)
+        cmds = [Command(msg, f, STOP, now, now)
+                for msg, f in zip(can_msgs, fingers)]
+        with self.__cond:
+            self.__flush(lambda cmd: cmd.priority > STOP and
+                         cmd.finger in fingers_)
+            for cmd in cmds:
+                heapq.heappush(self.__ready, (STOP, next(self.__seq), cmd))
+            self.__cond.notify()
+        return cmds
+
+    def pending(self):
+        """Returns the number of queued and scheduled commands."""
+        with self.__cond:
+            return len(self.__ready) + len(self.__timed)
+
+    def __flush(self, predicate):
+        """Cancels queued commands matching ``predicate``. The lock must be
+        held by the caller."""
+        for queue in (self.__ready, self.__timed):
+            kept = []
+            for entry in queue:
+                if predicate(entry[2]):
+                    entry[2]._finish()
+                else:
+                    kept.append(entry)
+            heapq.heapify(kept)
+            queue[:] = kept
+
+    def __promote(self, now):
+        """Moves the scheduled commands that are due to the ready queue.
+        The lock must be held by the caller."""
+        while self.__timed and self.__timed[0][0] <= now:
+            _, seq, cmd = heapq.heappop(self.__timed)
+            heapq.heappush(self.__ready, (cmd.priority, seq, cmd))
+
+    def __next_command(self):
+        """Waits for and pops the next eligible command, ``None`` when the
+        scheduler is stopped and no command is ready."""
+        with self.__cond:
+            while True:
+                now = time.monotonic()
+                self.__promote(now)
+                if self.__ready:
+                    return heapq.heappop(self.__ready)[2]
+                if not self.__running:
+                    return None
+                timeout = self.__timed[0][0] - now if self.__timed else None
+                self.__cond.wait(timeout)
+
+    def __run(self):
+        """Writer thread loop."""
+        if self.__on_start is not None:
+            self.__on_start()
+        while True:
+            cmd = self.__next_command()
+            if cmd is None:
+                return
+            tracer = self.tracer
+            if tracer is not None and cmd.due > cmd.submitted:
+                now = time.monotonic()
+                tracer.instant('timer', SCHEDULER, now, now - cmd.due)
+            try:
+                self.__write(cmd.can_msg)
+            except Exception as e:
+                # The writer thread must survive, later commands are waited on
+                cmd.error = e
+                cmd._finish()
+                continue
+            sent = time.monotonic()
+            if cmd.priority == STOP:
+                self.stop_latency.add(sent - cmd.submitted)
+            cmd._finish(sent)
@@ -0,0 +1,399 @@
+""" Indexed, columnar on-disk format for recorded CAN traffic.
+
+A session file stores one column per field, each contiguous and aligned, so
+that a reader can memory-map the columns as NumPy arrays without parsing or
+copying. The layout is::
+
+    magic (8 bytes) | header length (uint32) | JSON header | columns...
+
+Timestamps are delta-encoded as microseconds since the previous frame
+(``dt``). Absolute times are kept in a sparse time index, every
+``index_stride`` frames, which allows seeking by time without scanning the
+whole session.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+from .protocol import DECODED_DTYPE, decode
+
+MAGIC = b'RLSESS01'
+ALIGNMENT = 64
+
+COLUMNS = {
+    'dt': (np.uint32, ()),
+    'id': (np.uint16, ()),
+    'dlc': (np.uint8, ()),
+    'data': (np.uint8, (8,)),
+    'direction': (np.uint8, ())
+}
+COLUMNS.update({name: (DECODED_DTYPE[name], ())
+                for name in DECODED_DTYPE.names})
+
+_MAX_DT = np.iinfo(np.uint32).max
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SessionWriter(object):
+    """ Writes CAN traffic into a session file.
+
+    Frames are buffered in fixed-size chunks. Full chunks are decoded and
+    appended to temporary per-column files, which are assembled into the
+    session file on ``close``. Frames appended after ``close`` are discarded,
+    such that threads still recording while another thread closes the
+    writer neither fail nor write to closed files.
+
+    Parameters
+    ----------
+    path : str
+        Path of the session file.
+    index_stride : int, optional (default: 1024)
+        Number of frames between time index entries.
+    chunk_size : int, optional (default: 65536)
+        Number of frames buffered in memory.
+    metadata : dict, optional (default: None)
+        JSON-serializable metadata stored in the header.
+    """
+
+    def __init__(self, path, index_stride=1024, chunk_size=65536,
+                 metadata=None):
+        self.path = path
+        self.index_stride = index_stride
+        self.chunk_size = chunk_size
+        self.metadata = {} if metadata is None else metadata
+        self.__lock = threading.Lock()
+        self.__tmpdir = tempfile.mkdtemp(
+            prefix='.robolimb-', dir=os.path.dirname(os.path.abspath(path)))
+        self.__files = {name: open(os.path.join(self.__tmpdir, name), 'wb')
+                        for name in COLUMNS}
+        self.__time = np.empty(chunk_size, dtype=np.float64)
+        self.__ids = np.empty(chunk_size, dtype=np.uint16)
+        self.__dlc = np.empty(chunk_size, dtype=np.uint8)
+        self.__data = np.zeros((chunk_size, 8), dtype=np.uint8)
+        self.__direction = np.empty(chunk_size, dtype=np.uint8)
+        self.__n = 0
+        self.__rows = 0
+        self.__closed = False
+        self.__last_time = None
+        self.__index_row = []
+        self.__index_time = []
+
+    def append(self, timestamp, can_id, data, direction):
+        """Appends one frame.
+
+        Parameters
+        ----------
+        timestamp : float
+            Frame time in seconds.
+        can_id : int
+            CAN ID.
+        data : sequence of int
+            Data bytes (up to 8).
+        direction : int
+            ``protocol.RX`` or ``protocol.TX``.
+        """
+        with self.__lock:
+            if self.__closed:
+                return
+            n = self.__n
+            self.__time[n] = timestamp
+            self.__ids[n] = can_id
+            self.__dlc[n] = len(data)
+            self.__data[n, :len(data)] = data
+            self.__data[n, len(data):] = 0
+            self.__direction[n] = direction
+            self.__n = n + 1
+            if self.__n == self.chunk_size:
+                self.__flush()
+
+    def extend(self, timestamps, ids, data, direction, dlc=None):
+        """Appends arrays of frames.
+
+        Parameters
+        ----------
+        timestamps : array-like, shape (n_frames,)
+            Frame times in seconds.
+        ids : array-like, shape (n_frames,)
+            CAN IDs.
+        data : array-like, shape (n_frames, 8)
+            Data bytes.
+        direction : int or array-like
+            ``protocol.RX`` or ``protocol.TX`` per frame.
+        dlc : array-like, shape (n_frames,), optional (default: None)
+            Number of data bytes per frame. If not provided, the width of
+            ``data`` is used.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        ids = np.asarray(ids)
+        data = np.asarray(data)
+        direction = np.broadcast_to(direction, timestamps.shape)
+        dlc = np.broadcast_to(data.shape[1] if dlc is None else dlc,
+                              timestamps.shape)
+        with self.__lock:
+            if self.__closed:
+                return
+            start = 0
+            while start < len(timestamps):
+                n = self.__n
+                k = min(self.chunk_size - n, len(timestamps) - start)
+                sl = slice(start, start + k)
+                self.__time[n:n + k] = timestamps[sl]
+                self.__ids[n:n + k] = ids[sl]
+                self.__dlc[n:n + k] = dlc[sl]
+                self.__data[n:n + k, :data.shape[1]] = data[sl]
+                self.__direction[n:n + k] = direction[sl]
+                self.__n = n + k
+                start += k
+                if self.__n == self.chunk_size:
+                    self.__flush()
+
+    def __flush(self):
+        """Encodes and writes the buffered chunk. The lock must be held."""
+        n = self.__n
+        if n == 0:
+            return
+        # Quantize absolute times such that rounding errors do not accumulate
+        t = np.round(self.__time[:n] * 1e6).astype(np.int64)
+        prev = np.empty(n, dtype=np.int64)
+        prev[0] = t[0] if self.__last_time is None else self.__last_time
+        prev[1:] = t[:-1]
+        dt = t - prev
+        rows = self.__rows + np.arange(n)
+        # Index entries at regular strides and wherever the delta overflows
+        index = (rows % self.index_stride == 0) | (dt < 0) | (dt > _MAX_DT)
+        dt[index] = 0
+        self.__index_row.extend(rows[index].tolist())
+        self.__index_time.extend((t[index] * 1e-6).tolist())
+
+        decoded = decode(self.__ids[:n], self.__data[:n],
+                         self.__direction[:n])
+        columns = {
+            'dt': dt.astype(np.uint32),
+            'id': self.__ids[:n],
+            'dlc': self.__dlc[:n],
+            'data': self.__data[:n],
+            'direction': self.__direction[:n]
+        }
+        for name in DECODED_DTYPE.names:
+            columns[name] = decoded[name]
+        for name, values in columns.items():
+            self.__files[name].write(
+                np.ascontiguousarray(values, dtype=COLUMNS[name][0]).data)
+        self.__last_time = int(t[-1])
+        self.__rows += n
+        self.__n = 0
+
+    def __len__(self):
+        with self.__lock:
+            return self.__rows + self.__n
+
+    def close(self):
+        """Writes the session file and removes temporary files."""
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__flush()
+            for f in self.__files.values():
+                f.close()
+            header = {
+                'version': 1,
+                'n_rows': self.__rows,
+                'metadata': self.metadata,
+                'columns': {},
+            }
+            offset = 0
+            for name, (dtype, shape) in COLUMNS.items():
+                size = os.path.getsize(os.path.join(self.__tmpdir, name))
+                header['columns'][name] = {
+                    'dtype': np.dtype(dtype).str, 'shape': list(shape),
+                    'offset': offset}
+                offset = _align(offset + size)
+            index_row = np.asarray(self.__index_row, dtype=np.int64)
+            index_time = np.asarray(self.__index_time, dtype=np.float64)
+            header['index'] = {'n': len(index_row), 'offset': offset}
+
+            header_bytes = json.dumps(header).encode()
+            base = _align(len(MAGIC) + 4 + len(header_bytes))
+            with open(self.path, 'wb') as out:
+                out.write(MAGIC)
+                out.write(struct.pack('<I', len(header_bytes)))
+                out.write(header_bytes)
+                for name in COLUMNS:
+                    out.seek(base + header['columns'][name]['offset'])
+                    with open(os.path.join(self.__tmpdir, name), 'rb') as f:
+                        shutil.copyfileobj(f, out, 1 << 20)
+                out.seek(base + header['index']['offset'])
+                out.write(index_row.tobytes())
+                out.write(index_time.tobytes())
+                # Seeking does not extend the file, e.g. without any frame
+                out.truncate(base + header['index']['offset'] +
+                             16 * len(index_row))
+            shutil.rmtree(self.__tmpdir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SessionReader(object):
+    """ Memory-mapped reader of a session file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the session file.
+
+    Attributes
+    ----------
+    n_rows : int
+        Number of frames.
+    metadata : dict
+        Metadata stored by the writer.
+    index_row, index_time : numpy.ndarray
+        Time index: row numbers and their absolute times.
+
+    Notes
+    -----
+    Columns are returned as read-only views of the file mapping. Only the
+    pages that are accessed are loaded into memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__file = open(path, 'rb')
+        self.__mm = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.__mm[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a robolimb session file.")
+        n = struct.unpack_from('<I', self.__mm, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        self.header = json.loads(self.__mm[start:start + n].decode())
+        self.__base = _align(start + n)
+        self.n_rows = self.header['n_rows']
+        self.metadata = self.header['metadata']
+        index = self.header['index']
+        offset = self.__base + index['offset']
+        self.index_row = np.frombuffer(self.__mm, np.int64, index['n'],
+                                       offset)
+        self.index_time = np.frombuffer(self.__mm, np.float64, index['n'],
+                                        offset + 8 * index['n'])
+
+    def __len__(self):
+        return self.n_rows
+
+    def column(self, name):
+        """Returns a column as a memory-mapped array.
+
+        Parameters
+        ----------
+        name : str
+            Column name, one of ``COLUMNS``.
+        """
+        info = self.header['columns'][name]
+        dtype = np.dtype((np.dtype(info['dtype']), tuple(info['shape'])))
+        return np.frombuffer(self.__mm, dtype, self.n_rows,
+                             self.__base + info['offset'])
+
+    def timestamps(self, start=0, stop=None):
+        """Returns the absolute times of a range of frames.
+
+        Parameters
+        ----------
+        start, stop : int, optional
+            Row range. By default, all frames.
+
+        Returns
+        -------
+        timestamps : numpy.ndarray
+            Frame times in seconds.
+        """
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+        if start >= stop:
+            return np.empty(0)
+        dt = self.column('dt')
+        first = np.searchsorted(self.index_row, start, side='right') - 1
+        last = np.searchsorted(self.index_row, stop, side='left')
+        out = np.empty(stop - start)
+        for b in range(first, last):
+            r0 = self.index_row[b]
+            r1 = self.index_row[b + 1] if b + 1 < len(self.index_row) \
+                else self.n_rows
+            r1 = min(r1, stop)
+            t = self.index_time[b] + np.cumsum(dt[r0:r1], dtype=np.int64) \
+                * 1e-6
+            lo = max(r0, start)
+            out[lo - start:r1 - start] = t[lo - r0:]
+        return out
+
+    def seek(self, t):
+        """Returns the first row at or after time ``t``."""
+        b = np.searchsorted(self.index_time, t, side='right') - 1
+        if b < 0:
+            return 0
+        r0 = int(self.index_row[b])
+        r1 = int(self.index_row[b + 1]) if b + 1 < len(self.index_row) \
+            else self.n_rows
+        times = self.timestamps(r0, r1)
+        return r0 + int(np.searchsorted(times, t, side='left'))
+
+    def time_slice(self, t_start=None, t_stop=None):
+        """Returns the row range of a time interval.
+
+        Parameters
+        ----------
+        t_start, t_stop : float, optional
+            Interval limits in seconds. By default, the session start and
+            end.
+
+        Returns
+        -------
+        rows : slice
+            Rows with ``t_start <= t < t_stop``.
+        """
+        start = 0 if t_start is None else self.seek(t_start)
+        stop = self.n_rows if t_stop is None else self.seek(t_stop)
+        return slice(start, stop)
+
+    def read(self, rows=None):
+        """Returns all columns of a row range.
+
+        Parameters
+        ----------
+        rows : slice, optional (default: None)
+            Row range, e.g. as returned by ``time_slice``. By default, all
+            frames.
+
+        Returns
+        -------
+        frames : dict
+            Column arrays, plus absolute times under ``'time'``.
+        """
+        rows = slice(None) if rows is None else rows
+        start, stop, _ = rows.indices(self.n_rows)
+        frames = {name: self.column(name)[start:stop] for name in COLUMNS}
+        frames['time'] = self.timestamps(start, stop)
+        return frames
+
+    def close(self):
+        """Closes the file mapping."""
+        self.index_row = self.index_time = None
+        self.__mm.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,168 @@
+""" Shared-memory publication of the hand state.
+
+The state of a connection is published into a ``multiprocessing``
+shared-memory block so that other processes can read the latest finger
+status, currents and rotator edge without sockets or pickling.
+
+The block holds a 64-byte header followed by two record slots. The header
+starts with a sequence counter that is used as a seqlock: the writer makes it
+odd before writing a record and even again when done, alternating between the
+two slots. Readers therefore always find the newest complete record in the
+slot that is not being written and can use it in place, without copying and
+without ever blocking the writer.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .state import N_DOF
+
+STATE_DTYPE = np.dtype([
+    ('status', np.int8, (N_DOF,)),
+    ('current', np.float64, (N_DOF,)),
+    ('rotator_edge', np.int8),
+    ('timestamp', np.float64)
+])
+
+_HEADER_SIZE = 64
+_N_SLOTS = 2
+
+
+def _layout(buf):
+    """Returns the sequence counter and the record slots of a block."""
+    seq = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=0)
+    slots = np.ndarray((_N_SLOTS,), dtype=STATE_DTYPE, buffer=buf,
+                       offset=_HEADER_SIZE)
+    return seq, slots
+
+
+class SharedStateWriter(object):
+    """ Publishes the hand state into a shared-memory block.
+
+    Parameters
+    ----------
+    name : str, optional (default: None)
+        Name of the shared-memory block. If not provided, a unique name is
+        generated.
+
+    Attributes
+    ----------
+    name : str
+        Name of the shared-memory block, to be passed to the readers.
+    """
+
+    def __init__(self, name=None):
+        size = _HEADER_SIZE + _N_SLOTS * STATE_DTYPE.itemsize
+        self.__shm = shared_memory.SharedMemory(name=name, create=True,
+                                                size=size)
+        self.name = self.__shm.name
+        self.__seq, self.__slots = _layout(self.__shm.buf)
+        self.__seq[0] = 0
+        self.__slots[:] = np.zeros(_N_SLOTS, dtype=STATE_DTYPE)
+        self.__slots['status'] = -1
+
+    def publish(self, status, current, rotator_edge, timestamp):
+        """Writes a new state record.
+
+        Parameters
+        ----------
+        status : sequence of int
+            Status code per digit (see ``STATUS``). Unknown status is -1.
+        current : sequence of float
+            Motor current per digit (in Amps). Unknown current is NaN.
+        rotator_edge : bool or None
+            ``True`` when thumb rotator is fully palmar or lateral. ``None``
+            is stored as -1.
+        timestamp : float
+            Time of the state, in seconds of ``time.monotonic()``.
+        """
+        seq = int(self.__seq[0])
+        slot = self.__slots[(seq // 2 + 1) % _N_SLOTS, ...]
+        self.__seq[0] = seq + 1
+        slot['status'] = status
+        slot['current'] = current
+        slot['rotator_edge'] = -1 if rotator_edge is None else rotator_edge
+        slot['timestamp'] = timestamp
+        self.__seq[0] = seq + 2
+
+    def close(self, unlink=True):
+        """Releases the block and, by default, removes it from the system."""
+        del self.__seq, self.__slots
+        self.__shm.close()
+        if unlink:
+            self.__shm.unlink()
+
+
+class SharedStateReader(object):
+    """ Reads the hand state published by a ``SharedStateWriter``.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared-memory block.
+
+    Notes
+    -----
+    ``read`` returns a view into shared memory. The view is guaranteed to be
+    consistent until the writer has started two further publications, which
+    can be checked after use with ``validate``. Use ``snapshot`` when a copy
+    that remains valid indefinitely is preferred.
+    """
+
+    def __init__(self, name):
+        try:
+            self.__shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 registers attached blocks with the resource
+            # tracker, which would unlink them when the reader exits.
+            from multiprocessing import resource_tracker
+            self.__shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.__shm._name, 'shared_memory')
+        self.name = name
+        self.__seq, self.__slots = _layout(self.__shm.buf)
+
+    def read(self):
+        """Returns the newest complete state record without copying.
+
+        Returns
+        -------
+        state : numpy.ndarray
+            Zero-dimensional view with fields ``status``, ``current``,
+            ``rotator_edge`` and ``timestamp``.
+        version : int
+            Number of publications up to and including this record. Zero
+            means that nothing has been published yet.
+        """
+        version = int(self.__seq[0]) // 2
+        return self.__slots[version % _N_SLOTS, ...], version
+
+    def validate(self, version):
+        """Returns ``True`` if the record of ``version`` has not been
+        overwritten since it was read."""
+        return int(self.__seq[0]) < 2 * version + 3
+
+    def snapshot(self):
+        """Returns a consistent copy of the newest state record.
+
+        Returns
+        -------
+        state : numpy.ndarray
+            Copy of the newest record.
+        version : int
+            Publication number of the record.
+        """
+        while True:
+            state, version = self.read()
+            state = state.copy()
+            if self.validate(version):
+                return state, version
+
+    def version(self):
+        """Returns the number of publications so far."""
+        return int(self.__seq[0]) // 2
+
+    def close(self):
+        """Detaches from the shared-memory block."""
+        del self.__seq, self.__slots
+        self.__shm.close()
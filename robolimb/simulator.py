@@ -0,0 +1,430 @@
+""" Simulated hand for development without hardware.
+
+Two simulators share the same kinematic model, in which every digit moves
+at a constant rate between its open (0) and closed (1) ends, with full travel
+times taken from a ``DeviceProfile``:
+
+* ``SimulatedBus`` implements the subset of the ``PCANBasic`` interface used
+  by ``RoboLimbCAN`` in real time. It is passed to the connection with
+  ``RoboLimbCAN(bus_class=SimulatedBus)``.
+* ``simulate`` runs many executions of a command sequence at once on a time
+  grid, with randomized digit speeds, command latencies and feedback delays.
+  It is used by ``robolimb.optimizer``.
+"""
+
+import collections
+import ctypes
+import threading
+import time
+
+import numpy as np
+from can.interfaces.pcan.basic import (PCAN_ERROR_ILLHW, PCAN_ERROR_OK,
+                                       PCAN_ERROR_QRCVEMPTY,
+                                       PCAN_MESSAGE_STANDARD, TPCANMsg,
+                                       TPCANTimestamp)
+
+from .profile import DeviceProfile
+from .protocol import COMMAND_BASE_ID, CURRENT_SCALE, FEEDBACK_BASE_ID
+from .state import N_DOF, Status
+
+_CLOSE = 1
+_OPEN = 2
+
+# The thumb has to be open this far while the rotator moves
+THUMB_CLEARANCE = 0.2
+
+# Motor current (in Amps) while moving, and current at which a digit blocked
+# by an object stalls
+MOVING_CURRENT = 0.3
+STALL_CURRENT = 2.
+
+
+class HandModel(object):
+    """ Kinematic model of one hand, advanced in continuous time.
+
+    Parameters
+    ----------
+    profile : DeviceProfile, optional (default: None)
+        Travel times. If not provided, default timings are used.
+    positions : sequence of float, optional (default: None)
+        Initial position per digit. By default, the hand is open and the
+        rotator lateral.
+    contacts : dict, optional (default: None)
+        Position per finger ID at which an object blocks the digit while
+        closing. The current of a blocked digit then rises at ``ramp`` until
+        the digit stalls.
+    ramp : float, optional (default: 10.)
+        Current rise of blocked digits in Amps per second.
+    """
+
+    def __init__(self, profile=None, positions=None, contacts=None,
+                 ramp=10.):
+        self.profile = DeviceProfile() if profile is None else profile
+        self.position = [0.] * N_DOF if positions is None \
+            else list(positions)
+        self.contacts = {} if contacts is None else dict(contacts)
+        self.ramp = ramp
+        self.status = [Status.STALLED_OPEN if p <= 0. else
+                       Status.STALLED_CLOSE if p >= 1. else Status.STOP
+                       for p in self.position]
+        self.current = [0.] * N_DOF
+        self.__rate = [0.] * N_DOF
+        self.__blocked = [None] * N_DOF
+        self.__time = None
+
+    def command(self, t, finger, action, velocity):
+        """Applies a motor command at time ``t`` (in seconds)."""
+        self.update(t)
+        i = finger - 1
+        self.__blocked[i] = None
+        if action == _CLOSE:
+            self.status[i] = Status.CLOSING
+        elif action == _OPEN:
+            self.status[i] = Status.OPENING
+        else:
+            self.status[i] = Status.STOP
+            self.current[i] = 0.
+            return
+        self.__rate[i] = 1. / self.profile.travel_time(finger, action,
+                                                       max(velocity, 1))
+        self.current[i] = MOVING_CURRENT
+
+    def update(self, t):
+        """Advances the model to time ``t`` (in seconds)."""
+        if self.__time is None or t <= self.__time:
+            self.__time = t if self.__time is None else self.__time
+            return
+        dt = t - self.__time
+        self.__time = t
+        for i in range(N_DOF):
+            status = self.status[i]
+            if status == Status.CLOSING:
+                if self.__blocked[i] is not None:
+                    self.current[i] = MOVING_CURRENT + self.ramp * (
+                        t - self.__blocked[i])
+                    if self.current[i] >= STALL_CURRENT:
+                        self.status[i] = Status.STALLED_CLOSE
+                        self.current[i] = 0.
+                    continue
+                end = self.contacts.get(i + 1, 1.)
+                p = self.position[i] + self.__rate[i] * dt
+                if p >= end:
+                    self.position[i] = end
+                    if end < 1.:
+                        self.__blocked[i] = t - (p - end) / self.__rate[i]
+                    else:
+                        self.status[i] = Status.STALLED_CLOSE
+                        self.current[i] = 0.
+                else:
+                    self.position[i] = p
+            elif status == Status.OPENING:
+                p = self.position[i] - self.__rate[i] * dt
+                if p <= 0.:
+                    self.position[i] = 0.
+                    self.status[i] = Status.STALLED_OPEN
+                    self.current[i] = 0.
+                else:
+                    self.position[i] = p
+
+    @property
+    def rotator_edge(self):
+        """``True`` when the rotator is fully palmar or lateral."""
+        return self.position[N_DOF - 1] in (0., 1.)
+
+
+class SimulatedBus(object):
+    """ Simulated hand behind a ``PCANBasic``-compatible interface.
+
+    Feedback frames of all digits are generated every ``period`` and queued
+    like on the adapter. Serial number and quick grip queries are answered
+    with a frame carrying the ID of the query. Adapter and bus failures can
+    be injected with ``fail``.
+
+    Parameters
+    ----------
+    model : HandModel, optional (default: None)
+        Simulated hand. If not provided, a model with default timings is
+        used.
+    period : float, optional (default: 0.01)
+        Feedback period in seconds.
+    latency : float, optional (default: 0.002)
+        Delay in seconds between a command being written and the hand
+        reacting to it.
+    serial : str, optional (default: 'RL9029')
+        Serial number: two letters followed by a number.
+    queue_size : int, optional (default: 32768)
+        Capacity of the receive queue. The oldest frames are lost when it
+        overflows.
+    """
+
+    def __init__(self, model=None, period=0.01, latency=0.002,
+                 serial='RL9029', queue_size=32768):
+        self.model = HandModel() if model is None else model
+        self.period = period
+        self.latency = latency
+        self.serial = serial
+        self.grip = 0
+        self.__lock = threading.Lock()
+        self.__queue = collections.deque(maxlen=queue_size)
+        self.__pending = []
+        self.__t0 = time.monotonic()
+        self.__next = self.__t0
+        self.__failure = PCAN_ERROR_OK
+        self.__failure_end = 0.
+
+    def __len__(self):
+        """Number of frames in the receive queue."""
+        return len(self.__queue)
+
+    def fail(self, status=PCAN_ERROR_ILLHW, duration=0.):
+        """Simulates a failure, e.g. ``PCAN_ERROR_ILLHW`` for an unplugged
+        adapter or ``PCAN_ERROR_BUSOFF``.
+
+        All functions return ``status`` until the channel is initialized
+        again, which fails for ``duration`` seconds. Queued frames are lost.
+        """
+        with self.__lock:
+            self.__failure = status
+            self.__failure_end = time.monotonic() + duration
+
+    def Initialize(self, *args, **kwargs):
+        now = time.monotonic()
+        with self.__lock:
+            if self.__failure != PCAN_ERROR_OK:
+                if now < self.__failure_end:
+                    return self.__failure
+                self.__failure = PCAN_ERROR_OK
+            self.__generate(now)
+            self.__queue.clear()
+            # The adapter clock restarts
+            self.__t0 = now
+        return PCAN_ERROR_OK
+
+    def Uninitialize(self, Channel):
+        return PCAN_ERROR_OK
+
+    def Reset(self, Channel):
+        with self.__lock:
+            self.__generate(time.monotonic())
+            self.__queue.clear()
+        return PCAN_ERROR_OK
+
+    def GetStatus(self, Channel):
+        return self.__failure
+
+    def FilterMessages(self, *args, **kwargs):
+        return PCAN_ERROR_OK
+
+    def Write(self, Channel, MessageBuffer):
+        now = time.monotonic()
+        msg = MessageBuffer
+        data = list(msg.DATA[:msg.LEN])
+        with self.__lock:
+            if self.__failure != PCAN_ERROR_OK:
+                return self.__failure
+            self.__generate(now)
+            if COMMAND_BASE_ID < msg.ID <= COMMAND_BASE_ID + N_DOF:
+                self.__pending.append(
+                    (now + self.latency, msg.ID - COMMAND_BASE_ID, data[1],
+                     (data[2] << 8) | data[3]))
+            elif msg.ID == 0x301:
+                self.grip = data[3]
+            elif msg.ID == 0x302:
+                self.__push(msg.ID, [0, 0, 0, self.grip], now)
+            elif msg.ID == 0x402:
+                letters = self.serial[:2].encode()
+                number = int(self.serial[2:])
+                self.__push(msg.ID, [letters[0], letters[1], number >> 8,
+                                     number & 0xFF], now)
+        return PCAN_ERROR_OK
+
+    def Read(self, Channel):
+        with self.__lock:
+            if self.__failure != PCAN_ERROR_OK:
+                return self.__failure, TPCANMsg(), TPCANTimestamp()
+            self.__generate(time.monotonic())
+            if self.__queue:
+                msg, ts = self.__queue.popleft()
+                return PCAN_ERROR_OK, msg, ts
+        return PCAN_ERROR_QRCVEMPTY, TPCANMsg(), TPCANTimestamp()
+
+    def read_into(self, Channel, msg, timestamp):
+        """Reads the next frame into the given structures, see
+        ``robolimb.drain.BulkReader``."""
+        with self.__lock:
+            if self.__failure != PCAN_ERROR_OK:
+                return self.__failure
+            self.__generate(time.monotonic())
+            if not self.__queue:
+                return PCAN_ERROR_QRCVEMPTY
+            msg_, ts_ = self.__queue.popleft()
+        ctypes.memmove(ctypes.addressof(msg), ctypes.addressof(msg_),
+                       ctypes.sizeof(msg_))
+        ctypes.memmove(ctypes.addressof(timestamp), ctypes.addressof(ts_),
+                       ctypes.sizeof(ts_))
+        return PCAN_ERROR_OK
+
+    def __push(self, can_id, data, t):
+        """Queues a frame received at time ``t``."""
+        msg = TPCANMsg()
+        msg.ID = can_id
+        msg.LEN = len(data)
+        msg.MSGTYPE = PCAN_MESSAGE_STANDARD
+        for i, d in enumerate(data):
+            msg.DATA[i] = d
+        micros = int((t - self.__t0) * 1e6)
+        ts = TPCANTimestamp()
+        ts.millis = (micros // 1000) & 0xFFFFFFFF
+        ts.millis_overflow = (micros // 1000) >> 32
+        ts.micros = micros % 1000
+        self.__queue.append((msg, ts))
+
+    def __generate(self, now):
+        """Applies due commands and queues the feedback frames due until
+        ``now``."""
+        model = self.model
+        while self.__next <= now:
+            t = self.__next
+            for cmd in sorted(c for c in self.__pending if c[0] <= t):
+                model.command(*cmd)
+            self.__pending = [c for c in self.__pending if c[0] > t]
+            model.update(t)
+            for i in range(N_DOF):
+                current = int(round(model.current[i] * CURRENT_SCALE))
+                current = min(current, 0xFFFF)
+                edge = int(model.rotator_edge) if i == N_DOF - 1 else 0
+                self.__push(FEEDBACK_BASE_ID + i + 1,
+                            [edge, int(model.status[i]), current >> 8,
+                             current & 0xFF], t)
+            self.__next += self.period
+
+
+SimulationResult = collections.namedtuple(
+    'SimulationResult', ['stall_time', 'detected', 'status', 'position',
+                         'violation'])
+SimulationResult.__doc__ = """Outcome of ``simulate``.
+
+stall_time : numpy.ndarray, shape (n_trials, 6)
+    Time at which each digit last stalled, NaN if it is not stalled at the
+    end of the simulation.
+detected : numpy.ndarray, shape (n_trials, 6)
+    Time at which the stall is reported by feedback.
+status : numpy.ndarray, shape (n_trials, 6)
+    Final status codes.
+position : numpy.ndarray, shape (n_trials, 6)
+    Final positions.
+violation : numpy.ndarray, shape (n_trials,)
+    ``True`` for trials in which the thumb was not clear of the fingers
+    while the rotator moved.
+"""
+
+
+def simulate(steps, n_trials=1000, profile=None, positions=None,
+             speed_sd=0.05, latency=0.005, feedback_delay=0.01, period=0.01,
+             dt=0.002, horizon=4., clearance=THUMB_CLEARANCE, seed=None):
+    """Simulates many executions of a command sequence.
+
+    Parameters
+    ----------
+    steps : sequence of Step
+        Commands as ``robolimb.planner.Step`` tuples of time (in seconds),
+        finger ID, action and velocity.
+    n_trials : int, optional (default: 1000)
+        Number of executions.
+    profile : DeviceProfile, optional (default: None)
+        Nominal travel times. If not provided, default timings are used.
+    positions : sequence of float, optional (default: None)
+        Initial position per digit. By default, the hand is open and the
+        rotator lateral.
+    speed_sd : float, optional (default: 0.05)
+        Standard deviation of the log speed factor of each digit and trial.
+    latency : float, optional (default: 0.005)
+        Maximum command latency in seconds; latencies are drawn uniformly
+        per command and trial.
+    feedback_delay : float, optional (default: 0.01)
+        Maximum delay in seconds between a stall and its report, in
+        addition to the feedback period.
+    period : float, optional (default: 0.01)
+        Feedback period in seconds.
+    dt : float, optional (default: 0.002)
+        Simulation time step in seconds.
+    horizon : float, optional (default: 4.)
+        Simulated duration after the last command in seconds.
+    clearance : float, optional (default: THUMB_CLEARANCE)
+        Maximum thumb position while the rotator moves.
+    seed : int, optional (default: None)
+        Seed of the random generator. Using the same seed for different
+        command sequences compares them under identical conditions.
+
+    Returns
+    -------
+    result : SimulationResult
+        Per-trial outcome.
+    """
+    profile = DeviceProfile() if profile is None else profile
+    rng = np.random.default_rng(seed)
+    steps = sorted(steps, key=lambda s: s.time)
+    n = n_trials
+    fingers = np.array([s.finger for s in steps], dtype=int) - 1
+    actions = np.array([s.action for s in steps], dtype=int)
+
+    speed = np.exp(rng.normal(0., speed_sd, (n, N_DOF)))
+    # Grid step at which each command takes effect, per trial
+    fire = np.array([s.time for s in steps]) + \
+        rng.uniform(0., latency, (n, len(steps)))
+    fire = np.ceil(fire / dt).astype(int)
+    # Travel rate of each command, per trial
+    rate = np.empty((n, len(steps)))
+    for k, s in enumerate(steps):
+        if s.action in (_CLOSE, _OPEN):
+            rate[:, k] = speed[:, s.finger - 1] / profile.travel_time(
+                s.finger, s.action, max(s.velocity, 1))
+        else:
+            rate[:, k] = 0.
+
+    position = np.zeros((n, N_DOF)) if positions is None else \
+        np.tile(np.asarray(positions, dtype=float), (n, 1))
+    status = np.where(position <= 0., Status.STALLED_OPEN,
+                      np.where(position >= 1., Status.STALLED_CLOSE,
+                               Status.STOP)).astype(np.int8)
+    direction = np.zeros((n, N_DOF))
+    velocity = np.zeros((n, N_DOF))
+    stall_time = np.full((n, N_DOF), np.nan)
+    violation = np.zeros(n, dtype=bool)
+    rows = np.arange(n)
+
+    n_steps = int(np.ceil(((steps[-1].time if steps else 0.) + latency +
+                           horizon) / dt)) + 1
+    last_fire = fire.max() if steps else 0
+    for k in range(n_steps):
+        t = k * dt
+        if k > last_fire and not direction.any():
+            break
+        for j in np.unique(np.nonzero(fire == k)[1]) if steps else ():
+            sel = rows[fire[:, j] == k]
+            f = fingers[j]
+            a = actions[j]
+            direction[sel, f] = 1. if a == _CLOSE else \
+                -1. if a == _OPEN else 0.
+            velocity[sel, f] = rate[sel, j]
+            status[sel, f] = Status.CLOSING if a == _CLOSE else \
+                Status.OPENING if a == _OPEN else Status.STOP
+            stall_time[sel, f] = np.nan
+
+        position += direction * velocity * dt
+        closed = (direction > 0) & (position >= 1.)
+        opened = (direction < 0) & (position <= 0.)
+        position[closed] = 1.
+        position[opened] = 0.
+        status[closed] = Status.STALLED_CLOSE
+        status[opened] = Status.STALLED_OPEN
+        stall_time[closed | opened] = t
+        direction[closed | opened] = 0.
+
+        rotating = direction[:, N_DOF - 1] != 0.
+        violation |= rotating & (position[:, 0] > clearance)
+
+    # Stalls are reported by the next feedback frame, plus transport delay
+    detected = stall_time + rng.uniform(0., period, (n, N_DOF)) + \
+        rng.uniform(0., feedback_delay, (n, N_DOF))
+    return SimulationResult(stall_time, detected, status, position, violation)
@@ -0,0 +1,294 @@
+""" Long-running soak test against the simulated hand.
+
+The library is driven for hours at a realistic command rate: single-digit
+commands, whole-hand commands and serial number queries, with the receive
+thread and an event subscriber running. At a fixed interval, the process
+resources (resident memory, threads, objects tracked by the garbage
+collector and collections), the queue depths (scheduled commands, receive
+queue, event queue) and the latency percentiles (command write lateness and
+feedback age) are sampled.
+
+After a warm-up period, the samples are checked for monotonic growth of
+memory, objects and queues, for any additional thread, and for a drift of
+the latency percentiles between the start and the end of the run.
+
+Run with ``python -m robolimb.soak --help``.
+"""
+
+import argparse
+import collections
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .robolimb import RoboLimbCAN
+from .simulator import SimulatedBus
+
+SAMPLE_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('rss', np.float64),
+    ('threads', np.int32),
+    ('objects', np.int64),
+    ('collections', np.int64, 3),
+    ('garbage', np.int32),
+    ('pending_commands', np.int32),
+    ('receive_queue', np.int32),
+    ('event_queue', np.int32),
+    ('events_dropped', np.int64),
+    ('commands', np.int32),
+    ('latency_median', np.float64),
+    ('latency_p99', np.float64),
+    ('latency_max', np.float64),
+    ('age_median', np.float64),
+    ('age_p99', np.float64),
+    ('age_max', np.float64)
+])
+
+# Series checked for monotonic growth, and for drift
+GROWTH = ('rss', 'objects', 'pending_commands', 'receive_queue',
+          'event_queue')
+DRIFT = ('latency_median', 'latency_p99', 'age_median', 'age_p99')
+
+SoakReport = collections.namedtuple('SoakReport', ['samples', 'failures'])
+SoakReport.__doc__ = """Result of a soak test.
+
+samples : numpy.ndarray
+    Samples of ``SAMPLE_DTYPE``. Times in seconds since the start, memory in
+    bytes and latencies in milliseconds.
+failures : list of str
+    Description of each failed check, empty if the run passed.
+"""
+
+
+def _rss():
+    """Returns the resident set size of the process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Peak rather than current size, in kB on Linux and bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _percentiles(values):
+    """Returns median, 99th percentile and maximum in milliseconds."""
+    if not len(values):
+        return np.nan, np.nan, np.nan
+    values = np.asarray(values) * 1e3
+    return np.median(values), np.percentile(values, 99), values.max()
+
+
+def _trend(t, y):
+    """Returns the growth of a linear fit over the samples and the
+    correlation coefficient with time."""
+    if np.ptp(y) == 0:
+        return 0., 0.
+    slope = np.polyfit(t, y, 1)[0]
+    return slope * (t[-1] - t[0]), np.corrcoef(t, y)[0, 1]
+
+
+def check(samples, warmup=0.2, growth=0.1, queue_growth=50, drift=1.,
+          relative_drift=0.5, correlation=0.8):
+    """Checks soak samples for growth and drift.
+
+    Parameters
+    ----------
+    samples : numpy.ndarray
+        Samples of ``SAMPLE_DTYPE``.
+    warmup : float, optional (default: 0.2)
+        Fraction of the samples ignored at the start of the run.
+    growth : float, optional (default: 0.1)
+        Maximum relative growth of memory and tracked objects.
+    queue_growth : int, optional (default: 50)
+        Maximum growth of the queue depths.
+    drift : float, optional (default: 1.)
+        Latency drift in milliseconds that is always tolerated.
+    relative_drift : float, optional (default: 0.5)
+        Latency drift relative to the start of the run that is tolerated.
+    correlation : float, optional (default: 0.8)
+        Correlation with time above which a growth counts as monotonic.
+
+    Returns
+    -------
+    failures : list of str
+        Description of each failed check.
+    """
+    samples = samples[int(len(samples) * warmup):]
+    if len(samples) < 6:
+        return ["Not enough samples after warm-up ({}).".format(len(samples))]
+    t = samples['time']
+    failures = []
+    for name in GROWTH:
+        y = samples[name].astype(np.float64)
+        increase, r = _trend(t, y)
+        limit = growth * y[0] if name in ('rss', 'objects') \
+            else queue_growth
+        if r > correlation and increase > limit:
+            failures.append(
+                "{} grows: +{:.4g} over the run (r={:.2f}).".format(
+                    name, increase, r))
+    if samples['threads'].max() > samples['threads'][0]:
+        failures.append("Thread count grows: {} -> {}.".format(
+            samples['threads'][0], samples['threads'].max()))
+    third = len(samples) // 3
+    for name in DRIFT:
+        first = np.nanmedian(samples[name][:third])
+        last = np.nanmedian(samples[name][-third:])
+        if last - first > max(drift, relative_drift * first):
+            failures.append("{} drifts: {:.3f} -> {:.3f} ms.".format(
+                name, first, last))
+    return failures
+
+
+def soak(hours=1., rate=5., interval=60., seed=0, callback=None, **kwargs):
+    """Drives a connection to a simulated hand and samples its resources.
+
+    Parameters
+    ----------
+    hours : float, optional (default: 1.)
+        Duration of the run in hours.
+    rate : float, optional (default: 5.)
+        Number of commands per second.
+    interval : float, optional (default: 60.)
+        Sampling interval in seconds.
+    seed : int, optional (default: 0)
+        Seed of the random command sequence.
+    callback : callable, optional (default: None)
+        Function called with each sample, e.g. to report progress.
+    kwargs : dict
+        Additional arguments passed to ``check``.
+
+    Returns
+    -------
+    report : SoakReport
+        Samples and failed checks.
+    """
+    rng = np.random.default_rng(seed)
+    bus = SimulatedBus()
+    hand = RoboLimbCAN(profile=None, bus_class=lambda: bus)
+    hand.start()
+    hand.listen()
+    subscription = hand.subscribe(lambda event: None)
+
+    samples = []
+    handles = []
+    ages = []
+    gc_collections = [s['collections'] for s in gc.get_stats()]
+    t0 = time.monotonic()
+    end = t0 + hours * 3600.
+    next_command = t0
+    next_sample = t0 + interval
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                break
+            if now < next_command and now < next_sample:
+                time.sleep(min(next_command, next_sample) - now)
+                continue
+            if now >= next_command:
+                next_command += 1. / rate
+                handles.extend(_command(hand, rng))
+                timestamps = np.array(hand.finger_timestamp_)
+                if np.isfinite(timestamps).any():
+                    ages.append(now - np.nanmax(timestamps))
+
+            if now >= next_sample:
+                next_sample += interval
+                hand.get_serial_number(timeout=1.)
+                sent = [c for c in handles if c.sent is not None]
+                handles = [c for c in handles
+                           if c.sent is None and not c.cancelled]
+                sample = np.zeros((), dtype=SAMPLE_DTYPE)
+                sample['time'] = now - t0
+                sample['rss'] = _rss()
+                sample['threads'] = threading.active_count()
+                sample['objects'] = len(gc.get_objects())
+                sample['collections'] = [
+                    s['collections'] - c0
+                    for s, c0 in zip(gc.get_stats(), gc_collections)]
+                sample['garbage'] = len(gc.garbage)
+                sample['pending_commands'] = hand.pending_commands_
+                sample['receive_queue'] = len(bus)
+                sample['event_queue'] = len(subscription)
+                sample['events_dropped'] = subscription.dropped
+                sample['commands'] = len(sent)
+                sample['latency_median'], sample['latency_p99'], \
+                    sample['latency_max'] = _percentiles(
+                        [c.sent - c.due for c in sent])
+                sample['age_median'], sample['age_p99'], \
+                    sample['age_max'] = _percentiles(ages)
+                ages = []
+                samples.append(sample)
+                if callback is not None:
+                    callback(sample)
+    finally:
+        hand.stop()
+    samples = np.array(samples, dtype=SAMPLE_DTYPE)
+    return SoakReport(samples, check(samples, **kwargs))
+
+
+def _command(hand, rng):
+    """Issues a random command and returns the handles of the single-digit
+    commands."""
+    finger = int(rng.integers(1, 7))
+    velocity = int(rng.integers(50, 298))
+    choice = rng.random()
+    if choice < 0.4:
+        cmd = hand.close_finger(finger, velocity)
+    elif choice < 0.8:
+        cmd = hand.open_finger(finger, velocity)
+    elif choice < 0.9:
+        cmd = hand.stop_finger(finger)
+    elif choice < 0.95:
+        cmd = hand.close_all(velocity)
+    else:
+        cmd = hand.open_all(velocity)
+    return [] if cmd is None else [cmd]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m robolimb.soak',
+        description="Soak test against the simulated hand.")
+    parser.add_argument('--hours', type=float, default=1.,
+                        help="Duration in hours.")
+    parser.add_argument('--rate', type=float, default=5.,
+                        help="Commands per second.")
+    parser.add_argument('--interval', type=float, default=60.,
+                        help="Sampling interval in seconds.")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the command sequence.")
+    parser.add_argument('--output', help="Path of a .npy file for the "
+                                         "samples.")
+    args = parser.parse_args(argv)
+
+    print("{:>8} {:>8} {:>4} {:>8} {:>5} {:>5} {:>8} {:>8}".format(
+        'time s', 'rss MB', 'thr', 'objects', 'cmdq', 'rxq', 'lat p99',
+        'age p99'))
+
+    def progress(s):
+        print("{:8.0f} {:8.1f} {:4d} {:8d} {:5d} {:5d} {:8.3f} {:8.3f}".format(
+            float(s['time']), s['rss'] / 2 ** 20, int(s['threads']),
+            int(s['objects']), int(s['pending_commands']),
+            int(s['receive_queue']), float(s['latency_p99']),
+            float(s['age_p99'])), flush=True)
+
+    report = soak(args.hours, args.rate, args.interval, args.seed, progress)
+    if args.output:
+        np.save(args.output, report.samples)
+    for failure in report.failures:
+        print("FAIL: " + failure)
+    if not report.failures:
+        print("PASS")
+    return 1 if report.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
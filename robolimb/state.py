@@ -0,0 +1,150 @@
+""" Compact representation of the hand state.
+
+Finger status is stored as small integer codes in fixed arrays and indexed by
+per-status digit bitmasks, so that hand-level predicates such as "any digit
+moving" take constant time.
+"""
+
+from array import array
+from enum import IntEnum
+
+N_DOF = 6
+ALL_DIGITS = (1 << N_DOF) - 1
+UNKNOWN = -1
+
+
+class Status(IntEnum):
+    """Finger status codes as reported in CAN feedback messages."""
+    STOP = 0
+    CLOSING = 1
+    OPENING = 2
+    STALLED_CLOSE = 3
+    STALLED_OPEN = 4
+
+    @property
+    def label(self):
+        """Status name as used throughout the package, e.g.
+        ``'stalled close'``."""
+        return self.name.lower().replace('_', ' ')
+
+
+def status_mask(*status):
+    """Returns a bitmask with one bit set per status code."""
+    mask = 0
+    for s in status:
+        mask |= 1 << s
+    return mask
+
+
+def digit_mask(fingers):
+    """Returns a bitmask with one bit set per finger ID (1-6)."""
+    mask = 0
+    for f in fingers:
+        mask |= 1 << (f - 1)
+    return mask
+
+
+MOVING = status_mask(Status.CLOSING, Status.OPENING)
+STALLED = status_mask(Status.STALLED_CLOSE, Status.STALLED_OPEN)
+OPEN_DONE = status_mask(Status.OPENING, Status.STALLED_OPEN)
+CLOSE_DONE = status_mask(Status.CLOSING, Status.STALLED_CLOSE)
+STOP_DONE = status_mask(Status.STOP, Status.STALLED_OPEN,
+                        Status.STALLED_CLOSE)
+
+
+class HandState(object):
+    """ Per-hand state stored in fixed arrays.
+
+    Attributes
+    ----------
+    status : array.array
+        Status code per digit, ``-1`` when unknown.
+    current : array.array
+        Motor current per digit (in Amps), NaN when unknown.
+    rotator_edge : bool or None
+        ``True`` when thumb rotator is fully palmar or lateral.
+    timestamp : array.array
+        Time of the latest feedback per digit, in seconds of
+        ``time.monotonic()``. NaN when unknown.
+    """
+
+    __slots__ = ('status', 'current', 'rotator_edge', 'timestamp', '__digits')
+
+    def __init__(self):
+        self.status = array('b', [UNKNOWN] * N_DOF)
+        self.current = array('d', [float('nan')] * N_DOF)
+        self.rotator_edge = None
+        self.timestamp = array('d', [float('nan')] * N_DOF)
+        # Bitmask of the digits in each status, indexed by status code
+        self.__digits = [0] * len(Status)
+
+    def set(self, finger, status, current, thumb_edge=None, timestamp=None):
+        """Stores the feedback of one digit.
+
+        Parameters
+        ----------
+        finger : int
+            Finger ID.
+        status : int
+            Status code.
+        current : float
+            Motor current (in Amps).
+        thumb_edge : bool, optional
+            Thumb rotator edge. Only used when ``finger`` is 6.
+        timestamp : float, optional
+            Time of the feedback, in seconds of ``time.monotonic()``.
+        """
+        i = finger - 1
+        bit = 1 << i
+        old = self.status[i]
+        if old != status:
+            if old != UNKNOWN:
+                self.__digits[old] &= ~bit
+            self.__digits[status] |= bit
+            self.status[i] = status
+        self.current[i] = current
+        if timestamp is not None:
+            self.timestamp[i] = timestamp
+        if finger == N_DOF:
+            self.rotator_edge = thumb_edge
+
+    def digits(self, statuses):
+        """Returns the bitmask of digits whose status is in ``statuses``.
+
+        Parameters
+        ----------
+        statuses : int
+            Status bitmask, e.g. ``MOVING``.
+        """
+        mask = 0
+        for code, digits in enumerate(self.__digits):
+            if (statuses >> code) & 1:
+                mask |= digits
+        return mask
+
+    def has_status(self, finger, statuses):
+        """Returns ``True`` if the status of a digit is in ``statuses``."""
+        code = self.status[finger - 1]
+        return code != UNKNOWN and bool((statuses >> code) & 1)
+
+    def any_moving(self):
+        """Returns ``True`` if at least one digit is opening or closing."""
+        return bool(self.__digits[Status.CLOSING] |
+                    self.__digits[Status.OPENING])
+
+    def all_stalled(self, fingers=ALL_DIGITS):
+        """Returns ``True`` if all digits in the ``fingers`` bitmask are
+        stalled open or closed."""
+        stalled = (self.__digits[Status.STALLED_CLOSE] |
+                   self.__digits[Status.STALLED_OPEN])
+        return stalled & fingers == fingers
+
+    def labels(self):
+        """Returns the status of each digit as a string, ``None`` when
+        unknown."""
+        return [None if code == UNKNOWN else Status(code).label
+                for code in self.status]
+
+    def currents(self):
+        """Returns the current of each digit, ``None`` when unknown."""
+        return [None if c != c else c for c in self.current]
@@ -0,0 +1,159 @@
+""" Teach-and-replay of motor command sequences.
+
+While teaching, every motor command written to the bus is captured with its
+write time, whichever method issued it (``open_finger``, ``close_finger``,
+``stop_finger``, grips, ...). The result is a ``Trajectory``: one compact
+record of time, finger, action and velocity per command.
+
+A trajectory is replayed through the command scheduler, optionally faster or
+slower. Velocities are scaled with the playback speed, such that digits
+travel the same distance between commands, and clamped to the allowed
+range. The replay reports the timing error of every command with respect to
+the scaled recording.
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+from .robolimb import ACTIONS
+
+TRAJECTORY_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('finger', np.int8),
+    ('action', np.int8),
+    ('velocity', np.int16)
+])
+
+MIN_SPEED = 0.5
+MAX_SPEED = 2.
+MIN_VELOCITY = 10
+MAX_VELOCITY = 297
+
+ReplayReport = collections.namedtuple(
+    'ReplayReport', ['commands', 'error', 'mean_error', 'max_error'])
+ReplayReport.__doc__ = """Timing of a replay.
+
+commands : list of Command
+    Scheduler handles of the replayed commands.
+error : numpy.ndarray
+    Write time of each command minus its scaled recorded time, in seconds.
+    NaN for commands that were not written.
+mean_error, max_error : float
+    Mean and worst-case absolute timing error in seconds.
+"""
+
+
+class Trajectory(object):
+    """ Timed sequence of motor commands.
+
+    Parameters
+    ----------
+    commands : numpy.ndarray, optional (default: None)
+        Structured array of ``TRAJECTORY_DTYPE``, with times in seconds
+        relative to the first command.
+    """
+
+    def __init__(self, commands=None):
+        self.commands = np.zeros(0, dtype=TRAJECTORY_DTYPE) \
+            if commands is None else np.asarray(commands, TRAJECTORY_DTYPE)
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __iter__(self):
+        return iter(self.commands)
+
+    @property
+    def duration(self):
+        """Time of the last command in seconds."""
+        return float(self.commands['time'][-1]) if len(self) else 0.
+
+    def save(self, path):
+        """Writes the trajectory to a ``.npy`` file."""
+        np.save(path, self.commands)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a trajectory written by ``save``."""
+        return cls(np.load(path))
+
+
+class TrajectoryRecorder(object):
+    """ Accumulates written commands into a trajectory. """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__rows = []
+
+    def append(self, timestamp, finger, action, velocity):
+        """Adds a command written at ``timestamp`` (in seconds)."""
+        with self.__lock:
+            self.__rows.append((timestamp, finger, action, velocity))
+
+    def trajectory(self):
+        """Returns the commands recorded so far as a ``Trajectory``."""
+        with self.__lock:
+            commands = np.array(self.__rows, dtype=TRAJECTORY_DTYPE)
+        if len(commands):
+            commands['time'] -= commands['time'][0]
+        return Trajectory(commands)
+
+
+def replay(hand, trajectory, speed=1., velocity_scale=None, lead=None,
+           wait=True):
+    """Replays a trajectory through the command scheduler.
+
+    Parameters
+    ----------
+    hand : RoboLimbCAN
+        Started hand connection.
+    trajectory : Trajectory
+        Recorded commands.
+    speed : float, optional (default: 1.)
+        Playback speed, between ``MIN_SPEED`` (0.5) and ``MAX_SPEED`` (2).
+        Command times are divided by ``speed``.
+    velocity_scale : float, optional (default: None)
+        Factor applied to the recorded velocities, clamped to the range
+        (10,297). If not provided, ``speed`` is used.
+    lead : float, optional (default: None)
+        Time in seconds between the call and the first command, such that
+        all commands are queued before the first one is due. If not
+        provided, the ``schedule_lead`` attribute of the hand is used.
+    wait : boolean, optional (default: True)
+        If ``True``, blocks until all commands have been written and returns
+        the timing errors. Otherwise, errors are NaN.
+
+    Returns
+    -------
+    report : ReplayReport
+        Command handles and timing errors.
+    """
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise ValueError("Speed must be between {} and {}.".format(
+            MIN_SPEED, MAX_SPEED))
+    scale = speed if velocity_scale is None else velocity_scale
+    commands = np.array(trajectory.commands, dtype=TRAJECTORY_DTYPE)
+    commands['time'] /= speed
+    moving = commands['action'] != ACTIONS['stop']
+    commands['velocity'][moving] = np.clip(
+        np.rint(commands['velocity'][moving] * scale), MIN_VELOCITY,
+        MAX_VELOCITY)
+    commands['velocity'][~moving] = 297
+
+    t0 = time.monotonic() + (hand.schedule_lead if lead is None else lead)
+    targets = t0 + commands['time']
+    handles = hand.schedule(commands, t0)
+
+    error = np.full(len(handles), np.nan)
+    if wait:
+        for k, cmd in enumerate(handles):
+            if cmd.wait():
+                error[k] = cmd.sent - targets[k]
+    abs_error = np.abs(error)
+    valid = np.isfinite(abs_error)
+    mean_error = abs_error[valid].mean() if valid.any() else np.nan
+    max_error = abs_error[valid].max() if valid.any() else np.nan
+    return ReplayReport(handles, error, mean_error, max_error)
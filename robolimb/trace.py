@@ -0,0 +1,195 @@
+""" Timeline tracing of commands, feedback and scheduling.
+
+While tracing, a connection records spans (e.g. the ``Write`` call of each
+frame, the processing of each drained batch, the phases of a grip) and
+instant events (e.g. each feedback frame, each timed command becoming due)
+into a fixed-size ring buffer of ``TRACE_DTYPE`` records. Recording a record
+takes a lock and a few field assignments; names are interned, such that no
+string is stored per event.
+
+The buffer is exported in the Chrome trace-event JSON format, which can be
+opened in Perfetto (https://ui.perfetto.dev) or ``chrome://tracing``. Each
+digit has its own track, next to the hand, scheduler and receive tracks.
+"""
+
+import contextlib
+import json
+import math
+import threading
+import time
+
+import numpy as np
+
+from .state import N_DOF
+
+# Tracks, digits use their finger ID
+HAND = 0
+SCHEDULER = N_DOF + 1
+RECEIVE = N_DOF + 2
+
+# Digit names as in ``robolimb.FINGERS``
+TRACK_NAMES = ('hand', 'thumb', 'index', 'middle', 'ring', 'little',
+               'rotator', 'scheduler', 'receive')
+
+TRACE_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('duration', np.float64),  # NaN for instant events
+    ('name', np.int32),
+    ('track', np.int8),
+    ('value', np.float64)  # NaN when the event has no value
+])
+
+
+class Tracer(object):
+    """ Bounded in-memory trace buffer.
+
+    Parameters
+    ----------
+    size : int, optional (default: 65536)
+        Number of events kept. Once full, the oldest events are overwritten.
+
+    Attributes
+    ----------
+    dropped_ : int
+        Number of events overwritten.
+    """
+
+    def __init__(self, size=65536):
+        if size < 1:
+            raise ValueError("The trace buffer size must be positive.")
+        self.size = size
+        self.__lock = threading.Lock()
+        self.__events = np.zeros(size, dtype=TRACE_DTYPE)
+        self.__count = 0
+        self.__names = []
+        self.__ids = {}
+
+    def intern(self, name):
+        """Returns the ID of an event name, to be passed to ``instants``."""
+        id = self.__ids.get(name)
+        if id is None:
+            with self.__lock:
+                id = self.__ids.setdefault(name, len(self.__names))
+                if id == len(self.__names):
+                    self.__names.append(name)
+        return id
+
+    def span(self, name, track, start, end, value=np.nan):
+        """Records an event lasting from ``start`` to ``end``, in seconds of
+        ``time.monotonic()``."""
+        self.__record(start, end - start, self.intern(name), track, value)
+
+    def instant(self, name, track, timestamp=None, value=np.nan):
+        """Records an instant event, by default at the current time."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.__record(timestamp, np.nan, self.intern(name), track, value)
+
+    def __record(self, start, duration, id, track, value):
+        """Stores an event."""
+        with self.__lock:
+            self.__events[self.__count % self.size] = (start, duration, id,
+                                                       track, value)
+            self.__count += 1
+
+    def instants(self, names, tracks, timestamps, values=np.nan):
+        """Records instant events in bulk.
+
+        Parameters
+        ----------
+        names : int or numpy.ndarray
+            Event name IDs, see ``intern``.
+        tracks, timestamps : numpy.ndarray
+            Track and time of each event.
+        values : float or numpy.ndarray, optional (default: NaN)
+            Value of each event.
+        """
+        n = len(timestamps)
+        if not n:
+            return
+        k = min(n, self.size)
+        with self.__lock:
+            rows = (self.__count + n - k + np.arange(k)) % self.size
+            events = self.__events
+            events['time'][rows] = timestamps[n - k:]
+            events['duration'][rows] = np.nan
+            events['name'][rows] = np.broadcast_to(names, n)[n - k:]
+            events['track'][rows] = tracks[n - k:]
+            events['value'][rows] = np.broadcast_to(values, n)[n - k:]
+            self.__count += n
+
+    @contextlib.contextmanager
+    def region(self, name, track=HAND):
+        """Context manager recording its body as a span."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.span(name, track, start, time.monotonic())
+
+    @property
+    def dropped_(self):
+        """Number of events overwritten."""
+        return max(self.__count - self.size, 0)
+
+    def clear(self):
+        """Discards all events."""
+        with self.__lock:
+            self.__count = 0
+
+    def events(self):
+        """Returns the recorded events in order of recording.
+
+        Returns
+        -------
+        events : numpy.ndarray
+            Events of ``TRACE_DTYPE``.
+        """
+        with self.__lock:
+            if self.__count <= self.size:
+                return self.__events[:self.__count].copy()
+            start = self.__count % self.size
+            return np.concatenate([self.__events[start:],
+                                   self.__events[:start]])
+
+    def names(self):
+        """Returns the event names, indexed by name ID."""
+        with self.__lock:
+            return list(self.__names)
+
+    def to_chrome(self):
+        """Returns the events in the Chrome trace-event format.
+
+        Returns
+        -------
+        trace : dict
+            JSON-serializable trace, with timestamps in microseconds of
+            ``time.monotonic()``.
+        """
+        events = self.events()
+        names = self.names()
+        trace = [{'name': 'process_name', 'ph': 'M', 'pid': 1,
+                  'args': {'name': 'robolimb'}}]
+        for track, name in enumerate(TRACK_NAMES):
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': 1,
+                          'tid': track, 'args': {'name': name}})
+            trace.append({'name': 'thread_sort_index', 'ph': 'M', 'pid': 1,
+                          'tid': track, 'args': {'sort_index': track}})
+        ts = (events['time'] * 1e6).tolist()
+        dur = (events['duration'] * 1e6).tolist()
+        for k, e in enumerate(events.tolist()):
+            event = {'name': names[e[2]], 'cat': 'robolimb', 'pid': 1,
+                     'tid': e[3], 'ts': ts[k]}
+            if not math.isnan(dur[k]):
+                event.update(ph='X', dur=dur[k])
+            else:
+                event.update(ph='i', s='t')
+            if not math.isnan(e[4]):
+                event['args'] = {'value': e[4]}
+            trace.append(event)
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        """Writes the events to a Chrome trace-event JSON file."""
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome(), f)
@@ -0,0 +1,71 @@
+import itertools
+import threading
+
+from can.interfaces.pcan.basic import (PCAN_ERROR_BUSOFF, PCAN_ERROR_ILLHW,
+                                       PCAN_ERROR_OK, PCAN_ERROR_QRCVEMPTY)
+
+from robolimb.connection import backoff, is_failure
+from robolimb.events import LINK
+from robolimb.robolimb import RoboLimbCAN
+from robolimb.simulator import SimulatedBus
+
+
+def test_is_failure():
+    assert is_failure(PCAN_ERROR_ILLHW)
+    assert is_failure(PCAN_ERROR_BUSOFF)
+    assert not is_failure(PCAN_ERROR_OK)
+    assert not is_failure(PCAN_ERROR_QRCVEMPTY)
+
+
+def test_backoff():
+    assert list(itertools.islice(backoff(0.01, 0.05), 5)) == \
+        [0.01, 0.02, 0.04, 0.05, 0.05]
+
+
+def _hand():
+    bus = SimulatedBus()
+    hand = RoboLimbCAN(profile=None, bus_class=lambda: bus)
+    hand.start()
+    return hand, bus
+
+
+def test_supervised_reconnect_resyncs_state():
+    hand, bus = _hand()
+    restored = threading.Event()
+    links = []
+
+    def on_link(event):
+        links.append(event.new)
+        if event.new:
+            restored.set()
+
+    try:
+        hand.listen()
+        hand.quick_grip('standard_tripod_closed')
+        hand.supervise(period=0.01, backoff=0.005)
+        hand.subscribe(on_link, kinds=[LINK])
+        bus.fail(PCAN_ERROR_ILLHW, duration=0.05)
+        # The hand lost its quick grip, e.g. after a power cycle
+        bus.grip = 0
+        assert restored.wait(2.)
+        outage, = hand.outages_
+        assert outage.status == PCAN_ERROR_ILLHW
+        assert outage.attempts > 1
+        assert outage.downtime >= 0.05
+        assert links == [False, True]
+        assert bus.grip == 2
+        cycle = hand.get_cycle()
+        assert cycle.complete
+        assert hand.close_finger(2).wait(1.)
+    finally:
+        hand.stop()
+
+
+def test_reconnect_times_out():
+    hand, bus = _hand()
+    try:
+        bus.fail(PCAN_ERROR_ILLHW, duration=10.)
+        assert hand.reconnect(backoff=0.005, timeout=0.05) is None
+        assert hand.outages_ == []
+    finally:
+        hand.stop()
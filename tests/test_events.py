@@ -0,0 +1,81 @@
+import threading
+
+from robolimb.events import CURRENT, EDGE, STATUS, EventDispatcher
+from robolimb.robolimb import RoboLimbCAN
+from robolimb.simulator import SimulatedBus
+from robolimb.state import Status
+
+
+def _drain(sub):
+    events = []
+    while len(sub):
+        events.append(sub.get(0.))
+    return events
+
+
+def test_events_only_on_change():
+    dispatcher = EventDispatcher()
+    sub = dispatcher.subscribe()
+    for t in range(3):
+        dispatcher.feedback(2, Status.STALLED_OPEN, 0., None, float(t))
+    dispatcher.feedback(2, Status.CLOSING, 0.5, None, 3.)
+    dispatcher.feedback(6, Status.STOP, 0., False, 4.)
+    dispatcher.feedback(6, Status.STOP, 0., True, 5.)
+    dispatcher.feedback(6, Status.STOP, 0., True, 6.)
+    events = _drain(sub)
+    assert [(e.kind, e.finger, e.old, e.new, e.timestamp)
+            for e in events] == [
+        (STATUS, 2, None, Status.STALLED_OPEN, 0.),
+        (STATUS, 2, Status.STALLED_OPEN, Status.CLOSING, 3.),
+        (STATUS, 6, None, Status.STOP, 4.),
+        (EDGE, 6, None, False, 4.),
+        (EDGE, 6, False, True, 5.)]
+
+
+def test_current_threshold_crossings():
+    dispatcher = EventDispatcher()
+    sub = dispatcher.subscribe(kinds=[CURRENT], threshold=1.)
+    for t, current in enumerate([0.2, 0.5, 1.2, 1.5, 0.8, 0.3]):
+        dispatcher.feedback(1, Status.CLOSING, current, None, float(t))
+    assert [(e.old, e.new) for e in _drain(sub)] == [(0.5, 1.2), (1.5, 0.8)]
+
+
+def test_filters():
+    dispatcher = EventDispatcher()
+    sub = dispatcher.subscribe(kinds=[STATUS], fingers=[3])
+    dispatcher.feedback(2, Status.CLOSING, 0., None, 0.)
+    dispatcher.feedback(3, Status.CLOSING, 0., None, 0.)
+    dispatcher.feedback(6, Status.CLOSING, 0., True, 0.)
+    dispatcher.quick_grip('normal', 0.)
+    assert [e.finger for e in _drain(sub)] == [3]
+
+
+def test_overflow_drops_oldest_events():
+    dispatcher = EventDispatcher()
+    sub = dispatcher.subscribe(kinds=[STATUS], maxsize=4)
+    statuses = [Status.CLOSING, Status.STOP] * 5
+    for t, status in enumerate(statuses):
+        dispatcher.feedback(1, status, 0., None, float(t))
+    assert sub.dropped == 6
+    assert [e.timestamp for e in _drain(sub)] == [6., 7., 8., 9.]
+
+
+def test_callback_on_simulated_hand():
+    hand = RoboLimbCAN(profile=None, bus_class=SimulatedBus)
+    hand.start()
+    received = []
+    closing = threading.Event()
+
+    def callback(event):
+        received.append(event)
+        if event.new == Status.CLOSING:
+            closing.set()
+
+    try:
+        hand.listen()
+        hand.subscribe(callback, kinds=[STATUS], fingers=[2])
+        hand.close_finger(2)
+        assert closing.wait(1.)
+        assert all(e.finger == 2 for e in received)
+    finally:
+        hand.stop()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from robolimb.importers import _parse_text, import_log
+from robolimb.session import SessionReader
+
+
+def test_trc_versions():
+    trc20 = b"""
+      1         1.900 DT     0401 Rx 4    00 02 00 05
+"""
+    trc21 = b"""
+      1         1.900 DT     1      0401 Rx -  4    00 02 00 05
+"""
+    for block in (trc20, trc21):
+        t, ids, dlc, data, direction = _parse_text(block, 'trc')
+        assert np.allclose(t, [0.0019])
+        assert ids.tolist() == [0x401] and dlc.tolist() == [4]
+        assert data[0, :4].tolist() == [0, 2, 0, 5]
+
+
+def test_candump_console_without_timestamp_is_skipped():
+    block = b"""  can0  401   [4]  00 02 00 05
+ (1436509052.249713)  can0  402   [4]  00 01 00 05
+"""
+    t, ids, dlc, data, direction = _parse_text(block, 'candump')
+    assert np.isfinite(t).all()
+    assert ids.tolist() == [0x402]
+
+
+def test_import_log_keeps_caller_metadata(tmp_path):
+    log = tmp_path / 'hand.log'
+    log.write_bytes(b"(1436509052.249713) can0 401#00020005\n")
+    metadata = {'subject': 1}
+    assert import_log(str(log), str(tmp_path / 'hand.rls'),
+                      metadata=metadata) == 1
+    assert metadata == {'subject': 1}
+    with SessionReader(str(tmp_path / 'hand.rls')) as reader:
+        assert reader.metadata == {'subject': 1, 'source': 'hand.log',
+                                   'format': 'candump'}
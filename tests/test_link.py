@@ -0,0 +1,49 @@
+import numpy as np
+from can.interfaces.pcan.basic import PCAN_ERROR_OK
+
+from robolimb.link import CYCLE_MARGIN, MIN_SCHEDULE_LEAD, tune
+from robolimb.robolimb import RoboLimbCAN
+from robolimb.simulator import SimulatedBus
+
+
+class SilentBus(SimulatedBus):
+    """Simulated hand ignoring quick grip queries and failing to write
+    serial number queries."""
+
+    def Write(self, Channel, MessageBuffer):
+        if MessageBuffer.ID == 0x302:
+            return PCAN_ERROR_OK
+        if MessageBuffer.ID == 0x402:
+            raise IOError("write failed")
+        return super(SilentBus, self).Write(Channel, MessageBuffer)
+
+
+def test_probe_derives_timeouts():
+    bus = SimulatedBus(period=0.01)
+    hand = RoboLimbCAN(profile=None, bus_class=lambda: bus)
+    hand.start(probe=0.2)
+    try:
+        link = hand.link_
+        np.testing.assert_allclose(link.feedback_period, 0.01, rtol=0.1)
+        assert np.isfinite(link.query_rtt) and np.isfinite(link.write_latency)
+        assert hand.max_age == np.max(link.feedback_period)
+        assert hand.cycle_timeout >= CYCLE_MARGIN * hand.max_age
+        assert hand.query_timeout >= link.query_rtt_max
+        assert hand.schedule_lead >= MIN_SCHEDULE_LEAD
+        assert hand.quick_grip_ == 'normal'
+    finally:
+        hand.stop()
+
+
+def test_tune_skips_missing_measurements():
+    hand = RoboLimbCAN(profile=None, bus_class=SilentBus, query_timeout=0.05)
+    hand.start(probe=0.1)
+    try:
+        assert np.isnan(hand.link_.write_latency)
+        assert np.isnan(hand.link_.query_rtt)
+        assert 'query_timeout' not in tune(hand.link_)
+        assert hand.query_timeout == 0.05
+        hand.listen()
+        assert hand.quick_grip_ is None
+    finally:
+        hand.stop()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from robolimb.optimizer import (TEMPLATES, evaluate, load_grips, optimize,
+                                save_grips)
+from robolimb.planner import Step
+from robolimb.profile import DeviceProfile
+from robolimb.simulator import simulate
+from robolimb.state import Status
+
+CLOSE = 1
+
+
+def test_simulate_nominal_travel():
+    travel = DeviceProfile().travel_time(2, CLOSE, 297)
+    result = simulate([Step(0., 2, CLOSE, 297)], n_trials=3, speed_sd=0.,
+                      latency=0., feedback_delay=0.)
+    np.testing.assert_allclose(result.stall_time[:, 1], travel, atol=0.01)
+    assert (result.detected[:, 1] >= result.stall_time[:, 1]).all()
+    assert (result.status[:, 1] == Status.STALLED_CLOSE).all()
+    assert (result.status[:, 2] == Status.STALLED_OPEN).all()
+    assert not result.violation.any()
+
+
+def test_simulate_detects_thumb_violation():
+    steps = [Step(0., 1, CLOSE, 297), Step(0., 6, CLOSE, 297)]
+    result = simulate(steps, n_trials=3, positions=(1., 0., 0., 0., 0., 0.))
+    assert result.violation.all()
+
+
+def test_simulate_is_reproducible():
+    steps = [Step(0., 2, CLOSE, 297), Step(0.1, 3, CLOSE, 297)]
+    a = simulate(steps, n_trials=20, seed=3)
+    b = simulate(steps, n_trials=20, seed=3)
+    np.testing.assert_array_equal(a.detected, b.detected)
+
+
+def test_optimize_and_save(tmp_path):
+    template = TEMPLATES['cylindrical']
+    success, baseline = evaluate(template, template.timings, n_trials=100,
+                                 seed=0)
+    assert success >= 0.95 and np.isfinite(baseline)
+    result = optimize('cylindrical', n_trials=100, population=6,
+                      iterations=2, processes=2)
+    assert result.timings[0] == 0.
+    assert result.success >= 0.95 and np.isfinite(result.completion)
+    path = str(tmp_path / 'grips.json')
+    save_grips({'cylindrical': result}, path)
+    plan = load_grips(path)['cylindrical']
+    assert plan.steps == result.plan.steps
+    assert plan.target == result.plan.target
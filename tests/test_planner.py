@@ -0,0 +1,65 @@
+from robolimb.planner import GripPlanner
+from robolimb.robolimb import ACTIONS, RoboLimbCAN
+from robolimb.simulator import SimulatedBus
+from robolimb.state import N_DOF
+
+OPEN_HAND = {f: 0. for f in range(1, N_DOF + 1)}
+
+
+def _hand():
+    hand = RoboLimbCAN(profile=None, bus_class=SimulatedBus)
+    hand.start()
+    return hand
+
+
+def test_plan_cache():
+    hand = _hand()
+    try:
+        planner = GripPlanner(hand, cache_size=2)
+        plan = planner.plan('tripod', OPEN_HAND)
+        # Positions are rounded, such that estimation noise still hits
+        assert planner.plan('tripod', {**OPEN_HAND, 2: 0.001}) is plan
+        assert planner.plan('tripod', OPEN_HAND, grasp=True) is not plan
+        planner.plan('lateral', OPEN_HAND)
+        assert planner.plan('tripod', OPEN_HAND) is not plan
+    finally:
+        hand.stop()
+
+
+def test_closing_digits_follow_the_rotator():
+    hand = _hand()
+    try:
+        plan = GripPlanner(hand).plan('tripod', OPEN_HAND)
+        start = {s.finger: s.time for s in plan.steps}
+        assert start[N_DOF] == 0.
+        assert start[4] == start[5] > 0.
+        assert all(s.action == ACTIONS['close'] for s in plan.steps)
+    finally:
+        hand.stop()
+
+
+def test_opening_digits_lead_the_rotator():
+    hand = _hand()
+    try:
+        source = {**OPEN_HAND, 2: 1., 3: 1., 4: 1., 5: 1.}
+        plan = GripPlanner(hand).plan('cylindrical', source)
+        opening = [s for s in plan.steps if s.action == ACTIONS['open']]
+        rotator, = [s for s in plan.steps if s.finger == N_DOF]
+        assert sorted(s.finger for s in opening) == [2, 3, 4, 5]
+        assert all(s.time == 0. for s in opening)
+        assert rotator.time > 0.
+    finally:
+        hand.stop()
+
+
+def test_execute_reaches_grip():
+    hand = _hand()
+    try:
+        planner = GripPlanner(hand)
+        plan = planner.execute('tripod')
+        assert planner.positions_ == plan.target
+        status = hand.get_finger_status(max_age=0.)
+        assert status[3:] == ['stalled close'] * 3
+        assert status[:3] == ['stalled open'] * 3
+    finally:
+        hand.stop()
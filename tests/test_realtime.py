@@ -0,0 +1,65 @@
+import gc
+import os
+import threading
+
+import pytest
+
+from robolimb.realtime import RealtimePolicy
+from robolimb.robolimb import RoboLimbCAN
+from robolimb.simulator import SimulatedBus
+
+
+def test_unsupported_settings_are_reported():
+    # Priority 0 is invalid for SCHED_FIFO, with or without privileges
+    policy = RealtimePolicy(priority=0)
+    assert policy.apply() == []
+    assert 'fifo' in policy.errors_
+    assert policy.applied_[threading.current_thread().name] == []
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'),
+                    reason="CPU affinity is not supported")
+def test_threads_apply_policy():
+    affinity = os.sched_getaffinity(0)
+    cpus = sorted(affinity)[:1]
+    policy = RealtimePolicy(cpus=cpus, gc_freeze=False)
+    hand = RoboLimbCAN(profile=None, bus_class=SimulatedBus,
+                       realtime=policy)
+    hand.start()
+    try:
+        hand.listen()
+        hand.close_finger(2).wait(1.)
+    finally:
+        hand.stop()
+    assert policy.applied_['robolimb-scheduler'] == ['affinity']
+    assert policy.applied_['robolimb-receive'] == ['affinity']
+    # Only the internal threads are pinned
+    assert os.sched_getaffinity(0) == affinity
+
+
+def test_critical_blocks_nest():
+    policy = RealtimePolicy()
+    enabled = gc.isenabled()
+    gc.enable()
+    try:
+        with policy.critical():
+            with policy.critical():
+                assert not gc.isenabled()
+            assert not gc.isenabled()
+        assert gc.isenabled()
+    finally:
+        if not enabled:
+            gc.disable()
+
+
+def test_critical_keeps_gc_disabled():
+    policy = RealtimePolicy()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with policy.critical():
+            pass
+        assert not gc.isenabled()
+    finally:
+        if enabled:
+            gc.enable()
@@ -0,0 +1,68 @@
+import time
+
+from can.interfaces.pcan.basic import PCAN_ERROR_OK
+
+from robolimb.robolimb import RoboLimbCAN
+from robolimb.simulator import SimulatedBus
+
+
+def _hand(**kwargs):
+    hand = RoboLimbCAN(profile=None, bus_class=SimulatedBus, **kwargs)
+    hand.start()
+    return hand
+
+
+def test_integer_max_age():
+    hand = _hand(max_age=0.)
+    try:
+        assert hand.get_finger_status(max_age=0) == ['stalled open'] * 6
+        hand.close_finger(2)
+        time.sleep(0.1)
+        # A cached status younger than an hour is kept, not ``max_age``
+        assert hand.get_finger_status(max_age=3600)[1] == 'stalled open'
+        assert hand.get_finger_status(max_age=0)[1] == 'closing'
+    finally:
+        hand.stop()
+
+
+def test_stop_recording_while_writing(tmp_path):
+    hand = _hand()
+    try:
+        hand.listen()
+        for _ in range(20):
+            hand.record(str(tmp_path / 'session.rls'))
+            cmds = [hand.close_finger(f) for f in range(1, 6)]
+            hand.stop_recording()
+            assert all(cmd.wait(1.) for cmd in cmds)
+    finally:
+        hand.stop()
+
+
+class QuietBus(SimulatedBus):
+    """Simulated hand that does not answer serial number queries."""
+
+    def Write(self, Channel, MessageBuffer):
+        if MessageBuffer.ID == 0x402:
+            return PCAN_ERROR_OK
+        return super(QuietBus, self).Write(Channel, MessageBuffer)
+
+
+def test_serial_number_ignores_feedback():
+    bus = SimulatedBus(latency=0.05)
+    hand = RoboLimbCAN(profile=None, bus_class=lambda: bus)
+    hand.start()
+    try:
+        for _ in range(5):
+            hand.close_finger(2)
+            assert hand.get_serial_number(timeout=1.) == bus.serial
+    finally:
+        hand.stop()
+
+
+def test_serial_number_times_out_without_response():
+    hand = RoboLimbCAN(profile=None, bus_class=QuietBus)
+    hand.start()
+    try:
+        assert hand.get_serial_number(timeout=0.05) is None
+    finally:
+        hand.stop()
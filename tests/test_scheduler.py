@@ -0,0 +1,97 @@
+import threading
+import time
+
+from robolimb.robolimb import RoboLimbCAN
+from robolimb.scheduler import STOP, CommandScheduler
+from robolimb.simulator import SimulatedBus
+
+
+class RecordingBus(SimulatedBus):
+    """Simulated bus keeping the ID and action byte of written frames."""
+
+    def __init__(self):
+        super(RecordingBus, self).__init__()
+        self.written = []
+
+    def Write(self, Channel, MessageBuffer):
+        self.written.append((MessageBuffer.ID, MessageBuffer.DATA[1]))
+        return super(RecordingBus, self).Write(Channel, MessageBuffer)
+
+
+def _hand():
+    bus = RecordingBus()
+    hand = RoboLimbCAN(profile=None, bus_class=lambda: bus)
+    hand.start()
+    return hand, bus
+
+
+def test_stop_writes_pending_stops():
+    for _ in range(5):
+        hand, bus = _hand()
+        hand.stop_all()
+        hand.stop()
+        assert sorted(bus.written) == [(0x100 + f, 0) for f in range(1, 7)]
+
+
+def test_stop_writes_pending_motor_commands():
+    hand, bus = _hand()
+    hand.close_finger(2)
+    hand.open_finger(3)
+    hand.stop()
+    assert bus.written == [(0x102, 1), (0x103, 2)]
+
+
+def test_stop_cancels_future_commands():
+    hand, bus = _hand()
+    cmd = hand.close_finger(2, delay=10.)
+    hand.stop()
+    assert cmd.cancelled
+    assert bus.written == []
+
+
+def test_preempt_cancels_commands_of_same_digits():
+    written = []
+    scheduler = CommandScheduler(written.append)
+    later = scheduler.submit('close 2', finger=2, delay=10.)
+    other = scheduler.submit('close 3', finger=3, delay=10.)
+    stop, = scheduler.preempt(['stop 2'], [2])
+    scheduler.start()
+    assert stop.wait(1.)
+    assert later.cancelled and not other.cancelled
+    assert stop.priority == STOP
+    scheduler.stop()
+    assert written == ['stop 2']
+    assert other.cancelled
+
+
+def test_preempt_is_written_ahead_of_queued_commands():
+    written = []
+    gate = threading.Event()
+
+    def write(msg):
+        gate.wait(1.)
+        written.append(msg)
+
+    scheduler = CommandScheduler(write)
+    scheduler.start()
+    scheduler.submit('first', finger=1)
+    time.sleep(0.01)  # 'first' is being written
+    scheduler.submit('close 3', finger=3)
+    scheduler.preempt(['stop 2'], [2])
+    gate.set()
+    scheduler.stop()
+    assert written == ['first', 'stop 2', 'close 3']
+
+
+def test_write_error_does_not_kill_writer():
+    def write(msg):
+        if msg == 'bad':
+            raise IOError("bus error")
+
+    scheduler = CommandScheduler(write)
+    scheduler.start()
+    bad = scheduler.submit('bad')
+    good = scheduler.submit('good')
+    assert good.wait(1.)
+    assert bad.cancelled and isinstance(bad.error, IOError)
+    scheduler.stop()
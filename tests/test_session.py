@@ -0,0 +1,72 @@
+import numpy as np
+
+from robolimb.protocol import RX, TX
+from robolimb.session import SessionReader, SessionWriter
+
+
+def test_empty_session(tmp_path):
+    path = str(tmp_path / 'empty.rls')
+    SessionWriter(path).close()
+    with SessionReader(path) as reader:
+        assert len(reader) == 0
+        assert len(reader.column('id')) == 0
+        assert len(reader.timestamps()) == 0
+        assert reader.time_slice(0., 1.) == slice(0, 0)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'session.rls')
+    n = 5000
+    rng = np.random.default_rng(0)
+    t = 100. + np.cumsum(rng.uniform(0., 2e-3, n))
+    t = np.round(t * 1e6) * 1e-6
+    ids = np.where(np.arange(n) % 2, 0x402, 0x102).astype(np.uint16)
+    data = rng.integers(0, 5, (n, 8)).astype(np.uint8)
+    direction = np.where(ids == 0x402, RX, TX)
+    with SessionWriter(path, index_stride=100, chunk_size=777,
+                       metadata={'device': 'test'}) as writer:
+        writer.extend(t[:-1], ids[:-1], data[:-1], direction[:-1])
+        writer.append(t[-1], int(ids[-1]), data[-1].tolist(),
+                      int(direction[-1]))
+    assert len(writer) == n
+
+    with SessionReader(path) as reader:
+        assert len(reader) == n
+        assert reader.metadata == {'device': 'test'}
+        np.testing.assert_allclose(reader.timestamps(), t, atol=1e-9)
+        np.testing.assert_array_equal(reader.column('id'), ids)
+        np.testing.assert_array_equal(reader.column('data'), data)
+        np.testing.assert_array_equal(reader.column('direction'), direction)
+        fb = ids == 0x402
+        np.testing.assert_array_equal(reader.column('finger')[fb], 2)
+        np.testing.assert_array_equal(reader.column('status')[fb],
+                                      data[fb, 1])
+        np.testing.assert_array_equal(reader.column('action')[~fb],
+                                      data[~fb, 1])
+        rows = reader.time_slice(t[1000], t[2000])
+        assert rows == slice(1000, 2000)
+        np.testing.assert_allclose(reader.read(rows)['time'], t[1000:2000],
+                                   atol=1e-9)
+
+
+def test_serial_response_is_not_feedback(tmp_path):
+    path = str(tmp_path / 'serial.rls')
+    with SessionWriter(path) as writer:
+        writer.append(1., 0x402, [0x52, 0x4c, 0x23, 0x3d], RX)
+        writer.append(1.01, 0x402, [0, 2, 0, 5], RX)
+    with SessionReader(path) as reader:
+        np.testing.assert_array_equal(reader.column('finger'), [-1, 2])
+        np.testing.assert_array_equal(reader.column('status'), [-1, 2])
+
+
+def test_append_after_close_is_discarded(tmp_path):
+    path = str(tmp_path / 'closed.rls')
+    writer = SessionWriter(path)
+    writer.append(1., 0x401, [0, 2, 0, 5], RX)
+    writer.close()
+    writer.append(2., 0x401, [0, 2, 0, 5], RX)
+    writer.extend([3.], [0x401], [[0, 2, 0, 5]], RX)
+    writer.close()
+    assert len(writer) == 1
+    with SessionReader(path) as reader:
+        assert len(reader) == 1
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import numpy as np
+
+from robolimb.robolimb import RoboLimbCAN
+from robolimb.shared_state import SharedStateReader, SharedStateWriter
+from robolimb.simulator import SimulatedBus
+from robolimb.state import N_DOF, Status
+
+
+def test_round_trip():
+    writer = SharedStateWriter()
+    reader = SharedStateReader(writer.name)
+    try:
+        state, version = reader.read()
+        assert version == 0
+        assert (state['status'] == -1).all()
+        writer.publish([Status.CLOSING] * N_DOF, np.arange(N_DOF), None, 1.)
+        state, version = reader.snapshot()
+        assert version == 1
+        assert (state['status'] == Status.CLOSING).all()
+        np.testing.assert_array_equal(state['current'], np.arange(N_DOF))
+        assert state['rotator_edge'] == -1 and state['timestamp'] == 1.
+        writer.publish([Status.STOP] * N_DOF, np.zeros(N_DOF), True, 2.)
+        writer.publish([Status.STOP] * N_DOF, np.zeros(N_DOF), True, 3.)
+        # Overwritten two publications later
+        assert not reader.validate(1)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_readers_see_consistent_state_while_listening():
+    hand = RoboLimbCAN(profile=None, bus_class=SimulatedBus)
+    hand.start()
+    try:
+        hand.listen()
+        name = hand.share_state()
+        assert hand.share_state() == name
+        reader = SharedStateReader(name)
+        stop = threading.Event()
+
+        def command():
+            while not stop.is_set():
+                hand.close_all()
+                time.sleep(0.01)
+                hand.open_all()
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=command)
+        thread.start()
+        try:
+            versions = []
+            deadline = time.monotonic() + 0.3
+            while time.monotonic() < deadline:
+                state, version = reader.snapshot()
+                # Records are written by one thread, in order
+                assert not versions or version >= versions[-1]
+                assert np.isin(state['status'], list(Status) + [-1]).all()
+                versions.append(version)
+            assert versions[-1] > versions[0]
+        finally:
+            stop.set()
+            thread.join()
+            reader.close()
+    finally:
+        hand.stop()
@@ -0,0 +1,7 @@
+from robolimb.soak import soak
+
+
+def test_samples_between_commands():
+    # Samples are due more often than commands
+    report = soak(hours=1.5 / 3600., rate=3., interval=0.25)
+    assert len(report.samples) >= 4